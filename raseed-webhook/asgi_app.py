@@ -0,0 +1,698 @@
+"""
+Asyncio (ASGI) serving mode for the Raseed webhook service.
+
+Exposes the same routes as main.py on Quart. Gemini calls use a non-blocking
+httpx client, so a single process can hold thousands of in-flight chat
+requests. Receipt and Wallet calls reuse the existing blocking services and
+run in a thread pool off the event loop, so those routes are still limited
+to ASGI_BLOCKING_WORKERS concurrent calls per process, much as under gunicorn.
+
+Run with:
+    hypercorn asgi_app:app --bind 0.0.0.0:8080
+"""
+
+import asyncio
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+from quart import Quart, Request, Response, g, has_request_context, request, jsonify, send_from_directory
+from werkzeug.exceptions import RequestEntityTooLarge
+import main
+from main import (
+    GEMINI_MODEL,
+    RECEIPT_BATCH_MAX_CONTENT_LENGTH,
+    add_cors_headers,
+    answer_cache,
+    bulk_issuer,
+    cache_bypass_requested,
+    dialogflow_response,
+    extract_user_query,
+    gemini_error_event,
+    gemini_request,
+    parse_gemini_answer,
+    parse_gemini_stream_line,
+    points_updates,
+    profiler,
+    receipt_jobs,
+    receipt_service,
+    receipt_success_body,
+    sse_event,
+    static_assets,
+    traffic_recorder,
+    wallet_service
+)
+from async_http_client import async_upstream_client
+from single_flight import AsyncSingleFlight
+from receipt_jobs import FINISHED_STATUSES, RECEIPT_JOB_MAX_WAIT
+from startup_report import startup_report
+from profiler import PROFILE_HEADER
+from tracing import TRACE_ID_HEADER, tracer
+from metrics import METRICS_CONTENT_TYPE, render_metrics, request_closed, request_finished, request_started
+
+# Threads available for blocking Receipt/Wallet service calls
+BLOCKING_WORKERS = int(os.environ.get('ASGI_BLOCKING_WORKERS', '64'))
+
+class UploadRequest(Request):
+    """
+    Quart checks the body against the size limit as it arrives, before any
+    route runs, so a route can't raise the limit afterwards the way Flask's
+    can. Batch uploads get their larger limit here, when the request is built,
+    for both the body and the form parser.
+    """
+
+    def __init__(self, method, scheme, path, *args, max_content_length=None, **kwargs):
+        batch = path == '/receipt/process-batch'
+        if batch:
+            max_content_length = RECEIPT_BATCH_MAX_CONTENT_LENGTH
+        super().__init__(method, scheme, path, *args, max_content_length=max_content_length, **kwargs)
+        if batch:
+            self.max_content_length = RECEIPT_BATCH_MAX_CONTENT_LENGTH
+
+app = Quart(__name__, static_folder='static')
+app.config['MAX_CONTENT_LENGTH'] = main.app.config['MAX_CONTENT_LENGTH']
+app.request_class = UploadRequest
+
+gemini_flight = AsyncSingleFlight()
+blocking_executor = ThreadPoolExecutor(max_workers=BLOCKING_WORKERS, thread_name_prefix='blocking')
+
+async def run_blocking(fn, *args):
+    """Run a blocking service call in the thread pool, inside the caller's trace span"""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    label = g.get('profile_label') if has_request_context() else None
+    if label:
+        # Sample the pool thread too while it works for a profiled request
+        return await loop.run_in_executor(blocking_executor, context.run, profiled_call, label, fn, *args)
+    return await loop.run_in_executor(blocking_executor, context.run, fn, *args)
+
+def profiled_call(label, fn, *args):
+    ident = profiler.begin(label)
+    try:
+        return fn(*args)
+    finally:
+        profiler.end(ident)
+
+@app.before_serving
+async def start_background_services():
+    main.start_services()
+
+@app.after_serving
+async def stop_background_services():
+    # Flush pending points, drain receipt jobs and close pooled connections, as worker_exit does under gunicorn
+    await run_blocking(main.shutdown_services, 1)
+    await async_upstream_client.aclose()
+    blocking_executor.shutdown(wait=False)
+
+# CORS preflight handler
+@app.route('/', defaults={'path': ''}, methods=['OPTIONS'])
+@app.route('/<path:path>', methods=['OPTIONS'])
+async def handle_options(path):
+    response = jsonify({'status': 'ok'})
+    return add_cors_headers(response)
+
+class ClosingBody:
+    """
+    Wraps a response body to run a callback once the body has been sent.
+    Quart sends it after teardown, from a task that inherits the request's
+    context, so a streamed body's upstream calls still nest under the request
+    span. An error seen at teardown is passed on to the callback.
+    """
+
+    def __init__(self, body, on_close):
+        self.body = body
+        self.on_close = on_close
+        self.error = None
+
+    async def __aenter__(self):
+        return await self.body.__aenter__()
+
+    async def __aexit__(self, exc_type, exc_value, tb):
+        try:
+            return await self.body.__aexit__(exc_type, exc_value, tb)
+        finally:
+            self.on_close(exc_value or self.error)
+
+# Request metrics: latency is to the response headers, in-flight lasts until a streamed body ends
+@app.before_request
+async def start_request_metrics():
+    g.metrics_route = request.url_rule.rule if request.url_rule else 'unmatched'
+    g.metrics_started = request_started(g.metrics_route)
+
+@app.after_request
+async def record_request_metrics(response):
+    request_finished(
+        g.metrics_route, request.method, response.status_code, g.metrics_started,
+        request.content_length, response.content_length
+    )
+    route = g.metrics_route
+    g.metrics_body = ClosingBody(response.response, lambda error: request_closed(route, error))
+    response.response = g.metrics_body
+    return response
+
+@app.teardown_request
+async def close_request_metrics(error=None):
+    body = g.get('metrics_body')
+    if body is not None:
+        body.error = body.error or error
+    elif 'metrics_route' in g:
+        request_closed(g.metrics_route, error)
+
+if traffic_recorder:
+    traffic_recorder.init_quart_app(app)
+
+# Requests share the event loop thread, so its samples cover every coroutine running alongside
+@app.before_request
+async def start_profiling():
+    if profiler.wants(request.headers.get(PROFILE_HEADER)):
+        g.profile_label = f"{request.method} {g.metrics_route}"
+        g.profile_ident = profiler.begin(g.profile_label)
+
+@app.teardown_request
+async def stop_profiling(error=None):
+    ident = g.pop('profile_ident', None)
+    if ident is not None:
+        profiler.end(ident)
+
+# Span tracing; run_blocking carries the request span into the thread pool
+@app.before_request
+async def start_request_trace():
+    g.trace_span = tracer.start_request(
+        f"{request.method} {g.metrics_route}", request.path, request.headers,
+        {'http.method': request.method, 'http.route': g.metrics_route}
+    )
+
+@app.after_request
+async def tag_request_trace(response):
+    span = g.get('trace_span')
+    if span is not None:
+        span.set_attribute('http.status_code', response.status_code)
+        if response.status_code >= 500:
+            span.set_error(f"http_{response.status_code}")
+        if span.sampled:
+            response.headers[TRACE_ID_HEADER] = span.trace_id
+        response.response = ClosingBody(response.response, lambda error: end_request_span(span, error))
+        g.trace_closed_with_response = True
+    return response
+
+def end_request_span(span, error):
+    if error is not None:
+        span.set_error(error)
+    tracer.end_request(span)
+
+@app.teardown_request
+async def end_request_trace(error=None):
+    span = g.get('trace_span')
+    if span is None:
+        return
+    if error is not None:
+        span.set_error(error)
+    if not g.get('trace_closed_with_response'):
+        tracer.end_request(g.pop('trace_span'))
+
+@app.route('/')
+async def index():
+    return await static_files('index.html')
+
+@app.route('/<path:filename>')
+async def static_files(filename):
+    asset = static_assets.get(filename)
+    if asset is None:
+        response = await send_from_directory('static', filename)
+        return add_cors_headers(response)
+
+    # Fingerprinted, precompressed assets with prebuilt headers
+    status, headers, body = static_assets.respond(
+        asset, request.headers.get('Accept-Encoding', ''), request.headers.get('If-None-Match', '')
+    )
+    return Response(body, status=status, headers=headers)
+
+async def ask_gemini(user_query):
+    """Send a query to Gemini and return the answer text, or None on failure"""
+    gemini_url, headers, payload = gemini_request(user_query)
+    try:
+        gemini_resp = await async_upstream_client.post(
+            gemini_url, json=payload, headers=headers, upstream='gemini', operation='generate'
+        )
+    except httpx.HTTPError:
+        return None
+
+    if gemini_resp.status_code != 200:
+        return None
+
+    return parse_gemini_answer(gemini_resp.json())
+
+async def stream_gemini(user_query):
+    """Yield answer text chunks from Gemini's streaming endpoint"""
+    gemini_url, headers, payload = gemini_request(user_query, stream=True)
+    async with async_upstream_client.stream(
+        'POST', gemini_url, json=payload, headers=headers, upstream='gemini', operation='stream'
+    ) as gemini_resp:
+        gemini_resp.raise_for_status()
+        async for line in gemini_resp.aiter_lines():
+            for chunk in parse_gemini_stream_line(line):
+                yield chunk
+
+async def fetch_and_cache_answer(cache_key, user_query):
+    """Ask Gemini and cache a successful answer"""
+    answer = await ask_gemini(user_query)
+    if answer is not None:
+        answer_cache.set(cache_key, answer)
+    return answer
+
+@app.route('/webhook', methods=['POST'])
+async def webhook():
+    req_data = await request.get_json()
+    # Extract user query from Dialogflow CX request
+    user_query = extract_user_query(req_data)
+
+    # Serve repeated questions from the answer cache
+    bypass_cache = cache_bypass_requested(request.headers, req_data)
+    cache_key = answer_cache.make_key(GEMINI_MODEL, user_query)
+    answer = None if bypass_cache else answer_cache.get(cache_key)
+    tracer.current().set_attribute('answer_cache.hit', answer is not None)
+
+    if answer is None:
+        # Requests coalesced onto another one's Gemini call show this span without a gemini child
+        with tracer.span('gemini answer', attributes={'gemini.model': GEMINI_MODEL, 'answer_cache.bypass': bypass_cache}):
+            if bypass_cache:
+                answer = await ask_gemini(user_query)
+            else:
+                # Identical concurrent queries share a single upstream call
+                answer = await gemini_flight.do(cache_key, lambda: fetch_and_cache_answer(cache_key, user_query))
+        if answer is None:
+            answer = "Sorry, I couldn't get an answer from Gemini."
+
+    # Respond in Dialogflow CX webhook format
+    response = jsonify(dialogflow_response(answer))
+    return add_cors_headers(response)
+
+@app.route('/webhook/cache-stats', methods=['GET'])
+async def webhook_cache_stats():
+    """Report answer cache and request coalescing counters"""
+    stats = answer_cache.stats()
+    stats["coalescing"] = gemini_flight.stats()
+    response = jsonify(stats)
+    return add_cors_headers(response)
+
+@app.route('/startup-stats', methods=['GET'])
+async def startup_stats():
+    """Report startup phase timings and which lazy clients have been initialized"""
+    stats = startup_report.summary()
+    stats["wallet_initialized"] = wallet_service.initialized()
+    response = jsonify(stats)
+    return add_cors_headers(response)
+
+@app.route('/metrics', methods=['GET'])
+async def prometheus_metrics():
+    """Expose request and upstream call metrics in Prometheus text format"""
+    return Response(render_metrics(), content_type=METRICS_CONTENT_TYPE)
+
+@app.route('/debug/profiler', methods=['GET'])
+async def profiler_status():
+    """Report the sampling profiler's settings and this worker's sample counts"""
+    if not profiler.authorized(request.headers.get('X-Profiler-Token')):
+        response = jsonify({"error": "Not found"})
+        return add_cors_headers(response), 404
+    response = jsonify(profiler.status())
+    return add_cors_headers(response)
+
+@app.route('/debug/profiler', methods=['POST'])
+async def configure_profiler():
+    """Change the profiler sample rate for every worker, or start a fresh profile"""
+    if not profiler.authorized(request.headers.get('X-Profiler-Token')):
+        response = jsonify({"error": "Not found"})
+        return add_cors_headers(response), 404
+    try:
+        data = await request.get_json(silent=True) or {}
+        status = await run_blocking(profiler.configure, data.get('sample_rate'), bool(data.get('reset')))
+        response = jsonify(status)
+        return add_cors_headers(response)
+    except Exception as e:
+        response = jsonify({"error": str(e)})
+        return add_cors_headers(response), 500
+
+@app.route('/debug/profiler/collapsed', methods=['GET'])
+async def profiler_collapsed():
+    """Download the merged collapsed-stack profile (flamegraph.pl / speedscope input)"""
+    if not profiler.authorized(request.headers.get('X-Profiler-Token')):
+        response = jsonify({"error": "Not found"})
+        return add_cors_headers(response), 404
+    response = Response(await run_blocking(profiler.collapsed), mimetype='text/plain')
+    return add_cors_headers(response)
+
+@app.route('/chat/stream', methods=['POST'])
+async def chat_stream():
+    """Stream a Gemini answer to the browser as Server-Sent Events"""
+    req_data = await request.get_json(silent=True) or {}
+    user_query = req_data.get('text', '')
+
+    if not user_query:
+        response = jsonify({"error": "Text is required"})
+        return add_cors_headers(response), 400
+
+    bypass_cache = cache_bypass_requested(request.headers, req_data)
+    cache_key = answer_cache.make_key(GEMINI_MODEL, user_query)
+    cached_answer = None if bypass_cache else answer_cache.get(cache_key)
+
+    async def generate():
+        if cached_answer is not None:
+            yield sse_event({"text": cached_answer})
+            yield sse_event({}, event="done")
+            return
+
+        chunks = []
+        try:
+            async for chunk in stream_gemini(user_query):
+                chunks.append(chunk)
+                yield sse_event({"text": chunk})
+        except (httpx.HTTPError, ValueError) as e:
+            yield gemini_error_event(e)
+            return
+
+        if chunks and not bypass_cache:
+            answer_cache.set(cache_key, "".join(chunks))
+        yield sse_event({}, event="done")
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.timeout = None
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return add_cors_headers(response)
+
+# Google Wallet Endpoints
+@app.route('/wallet/create-card', methods=['POST'])
+async def create_wallet_card():
+    """Create a digital card for Google Wallet"""
+    try:
+        data = await request.get_json()
+        user_email = data.get('email')
+        user_name = data.get('name', 'User')
+        points_balance = data.get('points', 0)
+
+        if not user_email:
+            response = jsonify({"error": "Email is required"})
+            return add_cors_headers(response), 400
+
+        # Create the loyalty card and its save URL
+        result = await run_blocking(wallet_service.create_card, user_email, user_name, points_balance, data.get('mode'))
+
+        if result.get("success"):
+            if not result.get("existing"):
+                await run_blocking(points_updates.record_balance, result["object_id"], points_balance)
+            response = jsonify({
+                "success": True,
+                "card_id": result["object_id"],
+                "save_url": result["save_url"],
+                "existing": result.get("existing", False),
+                "message": "Digital card created successfully. Use the save_url to add it to your Google Wallet."
+            })
+            return add_cors_headers(response)
+
+        response = jsonify(result)
+        return add_cors_headers(response), 400
+
+    except Exception as e:
+        response = jsonify({"error": str(e)})
+        return add_cors_headers(response), 500
+
+@app.route('/wallet/create-class', methods=['POST'])
+async def create_wallet_class():
+    """Create a loyalty class for Google Wallet"""
+    try:
+        data = await request.get_json()
+        class_name = data.get('class_name', 'Loyalty Program')
+        program_name = data.get('program_name', 'Raseed Loyalty')
+        issuer_name = data.get('issuer_name', 'Raseed')
+
+        result = await run_blocking(wallet_service.create_loyalty_class, class_name, program_name, issuer_name)
+
+        if result.get("success"):
+            response = jsonify({
+                "success": True,
+                "class_id": result["class_id"],
+                "existing": result.get("existing", False),
+                "message": "Loyalty class already exists" if result.get("existing") else "Loyalty class created successfully"
+            })
+            return add_cors_headers(response)
+
+        response = jsonify(result)
+        return add_cors_headers(response), 400
+
+    except Exception as e:
+        response = jsonify({"error": str(e)})
+        return add_cors_headers(response), 500
+
+@app.route('/wallet/cards', methods=['GET'])
+async def find_wallet_cards():
+    """Look up the cards already issued to an email"""
+    try:
+        user_email = request.args.get('email')
+        if not user_email:
+            response = jsonify({"error": "Email is required"})
+            return add_cors_headers(response), 400
+
+        cards = await run_blocking(wallet_service.find_cards, user_email)
+        response = jsonify({"email": user_email, "cards": cards})
+        return add_cors_headers(response)
+
+    except Exception as e:
+        response = jsonify({"error": str(e)})
+        return add_cors_headers(response), 500
+
+@app.route('/wallet/token-stats', methods=['GET'])
+async def wallet_token_stats():
+    """Report Wallet API access token age and refresh latency"""
+    response = jsonify(wallet_service.token_stats())
+    return add_cors_headers(response)
+
+@app.route('/wallet/points', methods=['POST'])
+async def update_wallet_points():
+    """Queue a points change for a loyalty card; writes to the Wallet API are batched"""
+    try:
+        data = await request.get_json()
+        result = await run_blocking(points_updates.add, data.get('object_id'), data.get('delta'))
+
+        response = jsonify(result)
+        if result.get("success"):
+            return add_cors_headers(response), 202
+        return add_cors_headers(response), 400
+
+    except Exception as e:
+        response = jsonify({"error": str(e)})
+        return add_cors_headers(response), 500
+
+@app.route('/wallet/points/stats', methods=['GET'])
+async def wallet_points_stats():
+    """Report the points write-behind backlog and flush counters"""
+    response = jsonify(await run_blocking(points_updates.stats))
+    return add_cors_headers(response)
+
+@app.route('/wallet/bulk-issue', methods=['POST'])
+async def bulk_issue_wallet_cards():
+    """Issue loyalty cards for many members using batched Wallet API calls"""
+    try:
+        data = await request.get_json()
+        result = await run_blocking(bulk_issuer.submit, data.get('members', []))
+
+        response = jsonify(result)
+        if result.get("success"):
+            return add_cors_headers(response), 202
+        return add_cors_headers(response), 400
+
+    except Exception as e:
+        response = jsonify({"error": str(e)})
+        return add_cors_headers(response), 500
+
+@app.route('/wallet/bulk-issue/<job_id>', methods=['GET'])
+async def get_bulk_issue_job(job_id):
+    """Get bulk issuance progress and a page of per-member results"""
+    try:
+        offset = request.args.get('offset', 0, type=int)
+        limit = min(request.args.get('limit', 100, type=int), 1000)
+        job = await run_blocking(bulk_issuer.status, job_id, offset, limit)
+
+        if job is None:
+            response = jsonify({"error": "Job not found"})
+            return add_cors_headers(response), 404
+
+        response = jsonify(job)
+        return add_cors_headers(response)
+
+    except Exception as e:
+        response = jsonify({"error": str(e)})
+        return add_cors_headers(response), 500
+
+@app.route('/wallet/bulk-issue/<job_id>/resume', methods=['POST'])
+async def resume_bulk_issue_job(job_id):
+    """Resume issuing the pending cards of an interrupted bulk job"""
+    try:
+        result = await run_blocking(bulk_issuer.resume, job_id)
+
+        response = jsonify(result)
+        if result.get("success"):
+            return add_cors_headers(response), 202
+        return add_cors_headers(response), 404
+
+    except Exception as e:
+        response = jsonify({"error": str(e)})
+        return add_cors_headers(response), 500
+
+# Receipt Processing Endpoints
+@app.route('/receipt/process', methods=['POST'])
+async def process_receipt():
+    """Process a receipt by uploading a file"""
+    try:
+        files = await request.files
+        if 'file' not in files:
+            response = jsonify({"error": "No file provided"})
+            return add_cors_headers(response), 400
+
+        file = files['file']
+        if file.filename == '':
+            response = jsonify({"error": "No file selected"})
+            return add_cors_headers(response), 400
+
+        result = await run_blocking(receipt_service.process_receipt, file)
+
+        if result.get("success"):
+            response = jsonify(receipt_success_body(result))
+            return add_cors_headers(response)
+
+        response = jsonify(result)
+        return add_cors_headers(response), 400
+
+    except Exception as e:
+        response = jsonify({"error": str(e)})
+        return add_cors_headers(response), 500
+
+@app.route('/receipt/stats', methods=['GET'])
+async def receipt_stats():
+    """Report receipt result cache and image preprocessing counters"""
+    response = jsonify(receipt_service.stats())
+    return add_cors_headers(response)
+
+@app.route('/receipt/process-url', methods=['POST'])
+async def process_receipt_from_url():
+    """Process a receipt from a URL"""
+    try:
+        data = await request.get_json()
+        image_url = data.get('image_url')
+
+        if not image_url:
+            response = jsonify({"error": "Image URL is required"})
+            return add_cors_headers(response), 400
+
+        result = await run_blocking(receipt_service.process_receipt_from_url, image_url)
+
+        if result.get("success"):
+            response = jsonify(receipt_success_body(result))
+            return add_cors_headers(response)
+
+        response = jsonify(result)
+        return add_cors_headers(response), 400
+
+    except Exception as e:
+        response = jsonify({"error": str(e)})
+        return add_cors_headers(response), 500
+
+@app.route('/receipt/process-batch', methods=['POST'])
+async def process_receipt_batch():
+    """Process many receipt files and/or URLs concurrently"""
+    try:
+        if request.is_json:
+            data = await request.get_json() or {}
+            files = []
+            image_urls = data.get('image_urls', [])
+            concurrency = data.get('concurrency')
+        else:
+            uploaded = await request.files
+            form = await request.form
+            files = [file for file in uploaded.getlist('files') + uploaded.getlist('file') if file.filename]
+            image_urls = form.getlist('image_urls')
+            concurrency = form.get('concurrency', type=int)
+
+        result = await run_blocking(receipt_service.process_batch, files, image_urls, concurrency)
+
+        response = jsonify(result)
+        if result.get("success"):
+            return add_cors_headers(response)
+        return add_cors_headers(response), 400
+
+    except RequestEntityTooLarge:
+        response = jsonify({"error": f"Batch exceeds {RECEIPT_BATCH_MAX_CONTENT_LENGTH} bytes"})
+        return add_cors_headers(response), 413
+
+    except Exception as e:
+        response = jsonify({"error": str(e)})
+        return add_cors_headers(response), 500
+
+@app.route('/receipt/jobs', methods=['POST'])
+async def submit_receipt_job():
+    """Queue a receipt file or URL for background processing"""
+    try:
+        if request.is_json:
+            data = await request.get_json() or {}
+            image_url = data.get('image_url')
+
+            if not image_url:
+                response = jsonify({"error": "Image URL is required"})
+                return add_cors_headers(response), 400
+
+            job = await run_blocking(receipt_jobs.submit_url, image_url)
+        else:
+            files = await request.files
+            if 'file' not in files:
+                response = jsonify({"error": "No file provided"})
+                return add_cors_headers(response), 400
+
+            file = files['file']
+            if file.filename == '':
+                response = jsonify({"error": "No file selected"})
+                return add_cors_headers(response), 400
+
+            if not receipt_service.allowed_file(file.filename):
+                response = jsonify({"error": "Invalid file type. Please upload an image (PNG, JPG, JPEG, GIF) or PDF file."})
+                return add_cors_headers(response), 400
+
+            job = await run_blocking(receipt_jobs.submit_file, file)
+
+        response = jsonify({
+            "success": True,
+            "job_id": job["job_id"],
+            "status": job["status"],
+            "status_url": f"/receipt/jobs/{job['job_id']}",
+            "message": "Receipt queued for processing"
+        })
+        return add_cors_headers(response), 202
+
+    except Exception as e:
+        response = jsonify({"error": str(e)})
+        return add_cors_headers(response), 500
+
+@app.route('/receipt/jobs/<job_id>', methods=['GET'])
+async def get_receipt_job(job_id):
+    """Get a receipt job's status; ?wait=N long-polls up to N seconds for it to finish"""
+    try:
+        wait = min(request.args.get('wait', 0, type=float), RECEIPT_JOB_MAX_WAIT)
+        deadline = asyncio.get_running_loop().time() + wait
+
+        # Poll without holding a thread, so long-polls are cheap in this mode
+        job = await run_blocking(receipt_jobs.get, job_id)
+        while job is not None and job["status"] not in FINISHED_STATUSES and asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(0.25)
+            job = await run_blocking(receipt_jobs.get, job_id)
+
+        if job is None:
+            response = jsonify({"error": "Job not found"})
+            return add_cors_headers(response), 404
+
+        response = jsonify(job)
+        return add_cors_headers(response)
+
+    except Exception as e:
+        response = jsonify({"error": str(e)})
+        return add_cors_headers(response), 500
+
+if __name__ == '__main__':
+    app.run(host='0.0.0.0', port=int(os.environ.get('PORT', '8080')))
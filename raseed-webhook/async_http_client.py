@@ -0,0 +1,107 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+import httpx
+from http_client import (
+    BACKOFF_FACTOR,
+    CONNECT_TIMEOUT,
+    MAX_RETRIES,
+    READ_TIMEOUT,
+    TRACE_PROPAGATION_UPSTREAMS,
+    retry_statuses
+)
+from metrics import body_size, track_upstream
+from tracing import tracer
+
+# Connection limits for the asyncio serving mode (shared across all upstream hosts)
+ASYNC_MAX_CONNECTIONS = int(os.environ.get('ASYNC_UPSTREAM_MAX_CONNECTIONS', '1000'))
+ASYNC_MAX_KEEPALIVE = int(os.environ.get('ASYNC_UPSTREAM_MAX_KEEPALIVE', '100'))
+
+
+class AsyncUpstreamClient:
+    def __init__(self, max_connections=ASYNC_MAX_CONNECTIONS, max_keepalive=ASYNC_MAX_KEEPALIVE,
+                 max_retries=MAX_RETRIES, backoff_factor=BACKOFF_FACTOR,
+                 connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT):
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive
+        )
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self._client = None
+
+    @property
+    def client(self):
+        """The underlying httpx client, created on first use inside the running loop"""
+        if self._client is None:
+            # The transport retries failed connects; status retries happen in request()
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                transport=httpx.AsyncHTTPTransport(retries=self.max_retries, limits=self.limits)
+            )
+        return self._client
+
+    async def request(self, method, url, upstream='other', operation=None, **kwargs):
+        """Send a request, retrying with backoff on transient status codes"""
+        with track_upstream(upstream, operation or method.lower()) as call:
+            if upstream in TRACE_PROPAGATION_UPSTREAMS:
+                kwargs['headers'] = tracer.inject(kwargs.get('headers'))
+            for attempt in range(self.max_retries + 1):
+                response = await self.client.request(method, url, **kwargs)
+                if response.status_code not in retry_statuses(method) or attempt == self.max_retries:
+                    break
+
+                await response.aclose()
+                await asyncio.sleep(self._backoff(response, attempt))
+            call.status(response.status_code)
+            call.sent(self._request_size(response.request))
+            call.received(len(response.content))
+        return response
+
+    async def get(self, url, **kwargs):
+        """Send a GET request"""
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        """Send a POST request"""
+        return await self.request('POST', url, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, method, url, upstream='other', operation=None, **kwargs):
+        """Open a streaming response; use as an async context manager"""
+        with track_upstream(upstream, operation or method.lower()) as call:
+            if upstream in TRACE_PROPAGATION_UPSTREAMS:
+                kwargs['headers'] = tracer.inject(kwargs.get('headers'))
+            request = self.client.build_request(method, url, **kwargs)
+            response = await self.client.send(request, stream=True)
+            call.status(response.status_code)
+            call.sent(self._request_size(request))
+        try:
+            yield response
+        finally:
+            await response.aclose()
+
+    async def aclose(self):
+        """Close all pooled connections"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @staticmethod
+    def _request_size(request):
+        try:
+            return body_size(request.content)
+        except httpx.RequestNotRead:
+            # Streamed upload; its size isn't known without consuming it
+            return None
+
+    def _backoff(self, response, attempt):
+        retry_after = response.headers.get('Retry-After', '')
+        if retry_after.isdigit():
+            return float(retry_after)
+        return self.backoff_factor * (2 ** attempt)
+
+
+# Shared client used by every outbound call in the asyncio serving mode
+async_upstream_client = AsyncUpstreamClient()
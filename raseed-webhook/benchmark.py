@@ -0,0 +1,722 @@
+"""
+Load test and benchmark for the Raseed webhook service.
+
+Starts local stand-ins for Gemini, the receipt processing Cloud Function and
+the Google Wallet API (OAuth token endpoint and batch calls included), each
+with a configurable latency and error profile. The app is launched against
+them the way it runs in production, the chosen endpoints are driven at a
+target concurrency, and throughput and p50/p95/p99 latency are reported per
+scenario.
+
+Run with:
+    python benchmark.py --concurrency 32 --duration 30
+    python benchmark.py --server asgi --scenarios webhook=3,chat_stream
+    python benchmark.py --gemini-profile latency_ms=800,error_rate=0.05
+    python benchmark.py --save baseline.json
+    python benchmark.py --baseline baseline.json --max-regression 0.15
+
+A run compared against a baseline exits with status 1 if any scenario's p95
+latency grew, or its throughput dropped, by more than --max-regression.
+
+With --target the stand-ins are not started: the remote instance must already
+be configured with its own Gemini, receipt processing and Wallet upstreams, and
+receipt_process_url runs only if --image-url names a host it can reach.
+"""
+
+import abc
+import argparse
+import email.parser
+import itertools
+import json
+import os
+import random
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+import requests
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_SCENARIOS = (
+    'webhook,chat_stream,wallet_create_card,wallet_cards,wallet_points,receipt_process,receipt_process_url'
+)
+
+# Default upstream behaviour, roughly what production sees
+DEFAULT_PROFILES = {
+    'gemini': 'latency_ms=300,jitter_ms=100',
+    'receipt': 'latency_ms=800,jitter_ms=200',
+    'wallet': 'latency_ms=80,jitter_ms=20'
+}
+
+
+class UpstreamProfile:
+    """Latency and error behaviour of a stand-in upstream"""
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, error_status=503):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+
+    @classmethod
+    def parse(cls, text):
+        """Parse 'latency_ms=200,jitter_ms=50,error_rate=0.01,error_status=503'"""
+        values = {}
+        for part in filter(None, (part.strip() for part in (text or '').split(','))):
+            key, _, value = part.partition('=')
+            if key not in ('latency_ms', 'jitter_ms', 'error_rate', 'error_status'):
+                raise argparse.ArgumentTypeError(f"Unknown profile setting '{key}'")
+            values[key] = int(value) if key == 'error_status' else float(value)
+        return cls(**values)
+
+    def delay(self, rng):
+        """Seconds to wait before answering, uniform within latency ± jitter"""
+        return max(0.0, self.latency_ms + rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+
+    def fails(self, rng):
+        """Whether this call should be answered with error_status"""
+        return self.error_rate > 0 and rng.random() < self.error_rate
+
+    def describe(self):
+        return (f"{self.latency_ms:g}±{self.jitter_ms:g} ms, "
+                f"{self.error_rate:.1%} errors ({self.error_status})")
+
+
+class _StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def json_response(status, data):
+    return status, {'Content-Type': 'application/json'}, json.dumps(data).encode('utf-8')
+
+
+class FakeUpstream(abc.ABC):
+    """
+    A threaded HTTP server standing in for one upstream service. Subclasses
+    implement handle(method, path, query, headers, body) and return
+    (status, headers, body); the profile's latency and errors are applied
+    around it.
+    """
+
+    name = 'upstream'
+
+    def __init__(self, profile):
+        self.profile = profile
+        self.calls = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._rng = random.Random()
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _serve(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                status, headers, payload = upstream._dispatch(self.command, self.path, self.headers, body)
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_POST = do_PATCH = do_PUT = _serve
+
+            def log_message(self, *args):
+                pass
+
+        self.server = _StandInServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name=f"fake-{self.name}", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _dispatch(self, method, target, headers, body):
+        with self._lock:
+            self.calls += 1
+            delay = self.profile.delay(self._rng)
+            fails = self.profile.fails(self._rng)
+        time.sleep(delay)
+        if fails:
+            with self._lock:
+                self.errors += 1
+            return json_response(self.profile.error_status, {"error": {"message": "Injected by benchmark profile"}})
+
+        url = urlsplit(target)
+        try:
+            return self.handle(method, unquote(url.path), parse_qs(url.query), headers, body)
+        except Exception as e:
+            return json_response(500, {"error": {"message": f"Stand-in failed: {e}"}})
+
+    @abc.abstractmethod
+    def handle(self, method, path, query, headers, body):
+        """Answer one request with (status, headers, body)"""
+
+
+class FakeGemini(FakeUpstream):
+    """Answers generateContent and streamGenerateContent (SSE) calls"""
+
+    name = 'gemini'
+
+    def handle(self, method, path, query, headers, body):
+        question = json.loads(body or b'{}').get('contents', [{}])[0].get('parts', [{}])[0].get('text', '')
+        words = f"Benchmark answer to: {question}".split()
+        if path.endswith(':streamGenerateContent'):
+            frames = ''.join(
+                "data: " + json.dumps({"candidates": [{"content": {"parts": [{"text": word + ' '}]}}]}) + "\n\n"
+                for word in words
+            )
+            return 200, {'Content-Type': 'text/event-stream'}, frames.encode('utf-8')
+        if path.endswith(':generateContent'):
+            return json_response(200, {"candidates": [{"content": {"parts": [{"text": ' '.join(words)}]}}]})
+        return json_response(404, {"error": {"message": f"Unknown Gemini method {path}"}})
+
+
+class FakeReceiptProcessor(FakeUpstream):
+    """Accepts multipart receipt uploads and serves receipt images for /receipt/process-url"""
+
+    name = 'receipt'
+
+    def __init__(self, profile, image_pool):
+        super().__init__(profile)
+        self.image_pool = image_pool
+
+    def handle(self, method, path, query, headers, body):
+        if method == 'GET' and path.startswith('/images/'):
+            # Every URL gets distinct content so the app's result cache doesn't hide the upload
+            name = path[len('/images/'):]
+            image = self.image_pool.variant(name)
+            return 200, {'Content-Type': 'image/png'}, image
+        if method == 'POST' and path == '/process_receipt':
+            if b'filename=' not in body[:1024]:
+                return json_response(400, {"error": "No file in upload"})
+            return json_response(200, {
+                "merchant": "Benchmark Mart",
+                "total": 42.5,
+                "currency": "USD",
+                "items": [{"name": "Coffee", "price": 4.5}, {"name": "Bagel", "price": 38.0}],
+                "bytes": len(body)
+            })
+        return json_response(404, {"error": f"Unknown path {path}"})
+
+
+class FakeWallet(FakeUpstream):
+    """
+    In-memory loyalty classes and objects behind the Wallet REST paths, the
+    OAuth token endpoint from the service account key, and the batch endpoint.
+    """
+
+    name = 'wallet'
+    prefix = '/walletobjects/v1/'
+
+    def __init__(self, profile):
+        super().__init__(profile)
+        self.resources = {'loyaltyClass': {}, 'loyaltyObject': {}}
+        self._store_lock = threading.Lock()
+
+    def handle(self, method, path, query, headers, body):
+        if path == '/token':
+            return json_response(200, {"access_token": uuid.uuid4().hex, "expires_in": 3600, "token_type": "Bearer"})
+        if path == '/batch':
+            return self._batch(headers, body)
+        return self._resource(method, path, body)
+
+    def _resource(self, method, path, body):
+        if not path.startswith(self.prefix):
+            return json_response(404, {"error": {"code": 404, "message": f"Unknown path {path}"}})
+        kind, _, resource_id = path[len(self.prefix):].partition('/')
+        store = self.resources.get(kind)
+        if store is None:
+            return json_response(404, {"error": {"code": 404, "message": f"Unknown resource {kind}"}})
+
+        with self._store_lock:
+            if method == 'POST' and not resource_id:
+                resource = json.loads(body)
+                if resource.get('id') in store:
+                    return json_response(409, {"error": {"code": 409, "message": "Resource already exists"}})
+                store[resource['id']] = resource
+                return json_response(200, resource)
+            if resource_id not in store:
+                return json_response(404, {"error": {"code": 404, "message": f"{kind} {resource_id} not found"}})
+            if method == 'GET':
+                return json_response(200, store[resource_id])
+            if method in ('PATCH', 'PUT'):
+                store[resource_id].update(json.loads(body))
+                return json_response(200, store[resource_id])
+        return json_response(405, {"error": {"code": 405, "message": f"{method} not supported"}})
+
+    def _batch(self, headers, body):
+        # Parse the multipart/mixed batch, run each embedded request, answer in kind
+        message = email.parser.BytesParser().parsebytes(
+            f"Content-Type: {headers.get('Content-Type')}\r\n\r\n".encode('utf-8') + body
+        )
+        boundary = uuid.uuid4().hex
+        parts = []
+        for part in message.get_payload():
+            request_text = part.get_payload(decode=False)
+            head, _, part_body = request_text.replace('\r\n', '\n').partition('\n\n')
+            request_line = head.split('\n', 1)[0]
+            method, target, _ = request_line.split(' ', 2)
+            status, _, payload = self._resource(method, unquote(urlsplit(target).path), part_body.encode('utf-8'))
+            # Long Content-IDs arrive folded over several lines
+            content_id = ' '.join(part.get('Content-ID', '').split()).strip('<>')
+            parts.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 {status} {'OK' if status < 400 else 'Error'}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n"
+                f"{payload.decode('utf-8')}\r\n"
+            )
+        response = ''.join(parts) + f"--{boundary}--\r\n"
+        return 200, {'Content-Type': f'multipart/mixed; boundary={boundary}'}, response.encode('utf-8')
+
+
+class ImagePool:
+    """Receipt-like PNGs; each variant differs only in a text chunk, so it hashes differently"""
+
+    def __init__(self, width=600, height=1000, seed=1):
+        rng = random.Random(seed)
+        # Grey "paper" with darker rows standing in for printed lines
+        rows = []
+        for y in range(height):
+            shade = 60 if (y // 12) % 3 == 0 and rng.random() < 0.8 else 235
+            rows.append(b'\x00' + bytes(max(0, min(255, shade + rng.randint(-12, 12))) for _ in range(width)))
+        header = struct.pack('>IIBBBBB', width, height, 8, 0, 0, 0, 0)
+        self._head = b'\x89PNG\r\n\x1a\n' + self._chunk(b'IHDR', header)
+        self._tail = self._chunk(b'IDAT', zlib.compress(b''.join(rows), 6)) + self._chunk(b'IEND', b'')
+
+    def variant(self, name):
+        """PNG bytes unique to this name"""
+        return self._head + self._chunk(b'tEXt', b'Comment\x00' + name.encode('utf-8')) + self._tail
+
+    @staticmethod
+    def _chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+
+def write_service_account_key(path, token_uri):
+    """Write a throwaway service account key whose token endpoint is the Wallet stand-in"""
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode('utf-8')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({
+            "type": "service_account",
+            "project_id": "raseed-benchmark",
+            "private_key_id": "benchmark",
+            "private_key": pem,
+            "client_email": "benchmark@raseed-benchmark.iam.gserviceaccount.com",
+            "client_id": "1",
+            "token_uri": token_uri
+        }, f)
+
+
+class AppProcess:
+    """The app under test, started against the stand-ins with isolated local state"""
+
+    def __init__(self, server, workers, gemini, receipt, wallet, workdir):
+        self.workdir = workdir
+        self.port = self._free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.log_path = os.path.join(workdir, 'app.log')
+
+        key_path = os.path.join(workdir, 'service-account-key.json')
+        write_service_account_key(key_path, f"{wallet.url}/token")
+        env = dict(
+            os.environ,
+            PORT=str(self.port),
+            GEMINI_API_BASE=gemini.url,
+            GEMINI_API_KEY='benchmark',
+            RECEIPT_PROCESSING_URL=f"{receipt.url}/process_receipt",
+            GOOGLE_WALLET_API_ENDPOINT=wallet.url,
+            GOOGLE_WALLET_SERVICE_ACCOUNT_FILE=key_path,
+            WALLET_CARD_INDEX_DB=os.path.join(workdir, 'cards.db'),
+            WALLET_POINTS_DB=os.path.join(workdir, 'points.db'),
+            WALLET_BULK_DB=os.path.join(workdir, 'bulk.db'),
+            RECEIPT_JOBS_DIR=os.path.join(workdir, 'receipt-jobs'),
+            RECEIPT_CACHE_DIR=os.path.join(workdir, 'receipt-cache'),
+            PROMETHEUS_MULTIPROC_DIR=os.path.join(workdir, 'prometheus'),
+            GUNICORN_ACCESS_LOG=''
+        )
+        os.makedirs(env['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+        if server == 'asgi':
+            command = [sys.executable, '-m', 'hypercorn', 'asgi_app:app', '--bind', f"127.0.0.1:{self.port}"]
+            if workers:
+                command += ['--workers', str(workers)]
+        else:
+            if workers:
+                env['WEB_CONCURRENCY'] = str(workers)
+            command = [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py', 'main:app']
+
+        self._log = open(self.log_path, 'wb')
+        self.process = subprocess.Popen(command, cwd=APP_DIR, env=env, stdout=self._log, stderr=subprocess.STDOUT)
+
+    def wait_ready(self, timeout=60):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                break
+            try:
+                if requests.get(f"{self.url}/startup-stats", timeout=1).status_code == 200:
+                    return
+            except requests.exceptions.RequestException:
+                pass
+            time.sleep(0.2)
+        self.stop()
+        with open(self.log_path, 'r', errors='replace') as f:
+            sys.stderr.write(f.read()[-4000:])
+        raise RuntimeError(f"App did not become ready; log at {self.log_path}")
+
+    def stop(self):
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self._log.close()
+
+    @staticmethod
+    def _free_port():
+        import socket
+
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            return s.getsockname()[1]
+
+
+class ScenarioContext:
+    """What scenarios need to build requests: URLs, test images and cards issued during setup"""
+
+    def __init__(self, base_url, image_url, image_pool):
+        self.base_url = base_url
+        self.image_url = image_url
+        self.image_pool = image_pool
+        self.cards = []
+        self._ids = itertools.count()
+
+    def unique(self):
+        return f"{os.getpid()}-{next(self._ids)}"
+
+
+def scenario_webhook(session, ctx, rng):
+    return session.post(f"{ctx.base_url}/webhook", json={"text": f"How many points do I have? #{ctx.unique()}"})
+
+
+def scenario_webhook_cached(session, ctx, rng):
+    return session.post(f"{ctx.base_url}/webhook", json={"text": f"What is Raseed? #{rng.randint(1, 20)}"})
+
+
+def scenario_chat_stream(session, ctx, rng):
+    response = session.post(f"{ctx.base_url}/chat/stream", json={"text": f"Summarize my spending #{ctx.unique()}"},
+                            stream=True)
+    for _ in response.iter_content(chunk_size=None):
+        pass
+    return response
+
+
+def scenario_wallet_create_card(session, ctx, rng):
+    return session.post(f"{ctx.base_url}/wallet/create-card", json={
+        "email": f"bench-{ctx.unique()}@example.com", "name": "Bench User", "points": 100, "mode": "api"
+    })
+
+
+def scenario_wallet_create_card_repeat(session, ctx, rng):
+    email, _ = rng.choice(ctx.cards)
+    return session.post(f"{ctx.base_url}/wallet/create-card", json={
+        "email": email, "name": "Bench User", "points": 100, "mode": "api"
+    })
+
+
+def scenario_wallet_cards(session, ctx, rng):
+    email, _ = rng.choice(ctx.cards)
+    return session.get(f"{ctx.base_url}/wallet/cards", params={"email": email})
+
+
+def scenario_wallet_points(session, ctx, rng):
+    _, object_id = rng.choice(ctx.cards)
+    return session.post(f"{ctx.base_url}/wallet/points", json={"object_id": object_id, "delta": rng.randint(1, 50)})
+
+
+def scenario_receipt_process(session, ctx, rng):
+    image = ctx.image_pool.variant(ctx.unique())
+    return session.post(f"{ctx.base_url}/receipt/process", files={"file": ("receipt.png", image, "image/png")})
+
+
+def scenario_receipt_process_url(session, ctx, rng):
+    return session.post(f"{ctx.base_url}/receipt/process-url",
+                        json={"image_url": f"{ctx.image_url}/images/{ctx.unique()}.png"})
+
+
+SCENARIOS = {
+    'webhook': scenario_webhook,
+    'webhook_cached': scenario_webhook_cached,
+    'chat_stream': scenario_chat_stream,
+    'wallet_create_card': scenario_wallet_create_card,
+    'wallet_create_card_repeat': scenario_wallet_create_card_repeat,
+    'wallet_cards': scenario_wallet_cards,
+    'wallet_points': scenario_wallet_points,
+    'receipt_process': scenario_receipt_process,
+    'receipt_process_url': scenario_receipt_process_url
+}
+
+
+def parse_mix(text):
+    """Parse 'webhook=3,receipt_process' into {name: weight}"""
+    mix = {}
+    for part in filter(None, (part.strip() for part in text.split(','))):
+        name, _, weight = part.partition('=')
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"Unknown scenario '{name}'. Choose from: {', '.join(SCENARIOS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def issue_setup_cards(ctx, count):
+    """Create the cards that the lookup, repeat and points scenarios use"""
+    with requests.Session() as session:
+        for n in range(count):
+            email = f"setup-{n}@example.com"
+            response = session.post(f"{ctx.base_url}/wallet/create-card", json={
+                "email": email, "name": "Setup User", "points": 0, "mode": "api"
+            })
+            if response.status_code == 200:
+                ctx.cards.append((email, response.json()["card_id"]))
+    if not ctx.cards:
+        raise RuntimeError("No setup cards could be created; check the Wallet stand-in profile")
+
+
+class LoadDriver:
+    """Runs the scenario mix from `concurrency` threads and collects per-scenario latencies"""
+
+    def __init__(self, ctx, mix, concurrency, duration, warmup, max_requests=None, seed=1):
+        self.ctx = ctx
+        self.names = list(mix)
+        self.weights = [mix[name] for name in self.names]
+        self.concurrency = concurrency
+        self.duration = duration
+        self.warmup = warmup
+        self.max_requests = max_requests
+        self.seed = seed
+        self.samples = {name: [] for name in self.names}
+        self.failures = {name: {} for name in self.names}
+        self._lock = threading.Lock()
+        self._sent = itertools.count()
+
+    def run(self):
+        """Drive load and return the measured duration in seconds"""
+        started = time.perf_counter()
+        self.measure_from = started + self.warmup
+        self.stop_at = self.measure_from + self.duration
+        threads = [
+            threading.Thread(target=self._worker, args=(index,), name=f"load-{index}", daemon=True)
+            for index in range(self.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return min(time.perf_counter(), self.stop_at) - self.measure_from
+
+    def _worker(self, index):
+        rng = random.Random(self.seed * 1000 + index)
+        with requests.Session() as session:
+            while time.perf_counter() < self.stop_at:
+                if self.max_requests is not None and next(self._sent) >= self.max_requests:
+                    return
+                name = rng.choices(self.names, self.weights)[0]
+                sent = time.perf_counter()
+                failure = None
+                try:
+                    response = SCENARIOS[name](session, self.ctx, rng)
+                    if response.status_code >= 400:
+                        failure = f"http_{response.status_code}"
+                except requests.exceptions.RequestException as e:
+                    failure = type(e).__name__
+                elapsed = time.perf_counter() - sent
+                if sent < self.measure_from:
+                    continue
+                with self._lock:
+                    self.samples[name].append(elapsed)
+                    if failure:
+                        self.failures[name][failure] = self.failures[name].get(failure, 0) + 1
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(fraction * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(samples, failures, elapsed):
+    """Per-scenario throughput and latency percentiles in milliseconds"""
+    results = {}
+    everything = []
+    for name, latencies in samples.items():
+        everything.extend(latencies)
+        results[name] = _summary(sorted(latencies), sum(failures[name].values()), elapsed)
+        results[name]["failures"] = failures[name]
+    results['all'] = _summary(
+        sorted(everything), sum(sum(counts.values()) for counts in failures.values()), elapsed
+    )
+    return results
+
+
+def _summary(latencies, errors, elapsed):
+    def ms(value):
+        return round(value * 1000, 2) if value is not None else None
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 2) if elapsed > 0 else 0.0,
+        "p50_ms": ms(percentile(latencies, 0.50)),
+        "p95_ms": ms(percentile(latencies, 0.95)),
+        "p99_ms": ms(percentile(latencies, 0.99)),
+        "max_ms": ms(latencies[-1] if latencies else None)
+    }
+
+
+def print_report(results):
+    print(f"\n{'scenario':<28}{'requests':>9}{'errors':>8}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, row in results.items():
+        cells = [row[key] if row[key] is not None else '-' for key in ('p50_ms', 'p95_ms', 'p99_ms', 'max_ms')]
+        print(f"{name:<28}{row['requests']:>9}{row['errors']:>8}{row['rps']:>9}"
+              + ''.join(f"{cell:>10}" for cell in cells))
+    for name, row in results.items():
+        if row.get("failures"):
+            print(f"  {name} failures: {row['failures']}")
+
+
+def compare(results, baseline, max_regression):
+    """Print changes against a saved run and return the scenarios that regressed"""
+    regressions = []
+    print(f"\n{'scenario':<28}{'p95 change':>12}{'rps change':>12}")
+    for name, row in results.items():
+        before = baseline.get(name)
+        if not before or not before.get("p95_ms") or not before.get("rps") or row["p95_ms"] is None:
+            continue
+        p95_change = row["p95_ms"] / before["p95_ms"] - 1
+        rps_change = row["rps"] / before["rps"] - 1
+        flag = ''
+        if p95_change > max_regression or rps_change < -max_regression:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f"{name:<28}{p95_change:>+12.1%}{rps_change:>+12.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Raseed webhook service against local upstream stand-ins")
+    parser.add_argument('--target', help="Benchmark an already running instance instead of starting one; "
+                                         "its upstreams must be configured separately")
+    parser.add_argument('--image-url', help="With --target, a base URL serving receipt images at /images/<name> "
+                                            "that the target can fetch (enables receipt_process_url)")
+    parser.add_argument('--server', choices=('gunicorn', 'asgi'), default='gunicorn', help="How to run the app")
+    parser.add_argument('--workers', type=int, help="Worker processes (default: the server's own setting)")
+    parser.add_argument('--scenarios', type=parse_mix, default=parse_mix(DEFAULT_SCENARIOS),
+                        help=f"Scenario mix as name[=weight],... (available: {', '.join(SCENARIOS)})")
+    parser.add_argument('--concurrency', type=int, default=16, help="Concurrent clients")
+    parser.add_argument('--duration', type=float, default=30, help="Measured seconds")
+    parser.add_argument('--warmup', type=float, default=5, help="Seconds of load before measuring")
+    parser.add_argument('--requests', type=int, help="Stop after about this many requests")
+    parser.add_argument('--cards', type=int, default=50, help="Cards issued before the run for the wallet scenarios")
+    parser.add_argument('--seed', type=int, default=1, help="Seed for the scenario mix")
+    for name, default in DEFAULT_PROFILES.items():
+        parser.add_argument(f"--{name}-profile", type=UpstreamProfile.parse, default=UpstreamProfile.parse(default),
+                            help=f"latency_ms=,jitter_ms=,error_rate=,error_status= (default: {default})")
+    parser.add_argument('--save', help="Write results as JSON to this file")
+    parser.add_argument('--baseline', help="Compare against results saved with --save")
+    parser.add_argument('--max-regression', type=float, default=0.10,
+                        help="Allowed p95 growth / throughput drop against the baseline (fraction)")
+    args = parser.parse_args()
+
+    if args.target and not args.image_url and 'receipt_process_url' in args.scenarios:
+        # The remote app can't fetch images from a stand-in on this machine's loopback
+        print("Skipping receipt_process_url: pass --image-url for a host the target can reach")
+        del args.scenarios['receipt_process_url']
+        if not args.scenarios:
+            parser.error("no scenarios left to run")
+
+    image_pool = ImagePool(seed=args.seed)
+    fakes = []
+    workdir = tempfile.mkdtemp(prefix='raseed-benchmark-')
+    app = None
+    try:
+        if args.target:
+            base_url = args.target.rstrip('/')
+            image_url = (args.image_url or '').rstrip('/')
+            print(f"Target at {base_url}; its upstreams are whatever it is configured with")
+        else:
+            gemini = FakeGemini(args.gemini_profile).start()
+            receipt = FakeReceiptProcessor(args.receipt_profile, image_pool).start()
+            wallet = FakeWallet(args.wallet_profile).start()
+            fakes = [gemini, receipt, wallet]
+            for fake in fakes:
+                print(f"{fake.name:<8} stand-in at {fake.url}: {fake.profile.describe()}")
+
+            app = AppProcess(args.server, args.workers, gemini, receipt, wallet, workdir)
+            app.wait_ready()
+            base_url = app.url
+            image_url = receipt.url
+            print(f"App ({args.server}) at {base_url}, log {app.log_path}")
+
+        ctx = ScenarioContext(base_url, image_url, image_pool)
+        if {'wallet_create_card_repeat', 'wallet_cards', 'wallet_points'} & set(args.scenarios):
+            issue_setup_cards(ctx, args.cards)
+
+        print(f"Driving {', '.join(f'{name}={weight:g}' for name, weight in args.scenarios.items())} "
+              f"with {args.concurrency} clients for {args.duration:g}s (+{args.warmup:g}s warm-up)")
+        driver = LoadDriver(ctx, args.scenarios, args.concurrency, args.duration, args.warmup,
+                            args.requests, args.seed)
+        elapsed = driver.run()
+        results = summarize(driver.samples, driver.failures, elapsed)
+        print_report(results)
+        if fakes:
+            print("\nUpstream calls: " + ', '.join(
+                f"{fake.name}={fake.calls} ({fake.errors} injected errors)" for fake in fakes
+            ))
+
+        if args.save:
+            with open(args.save, 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2)
+            print(f"Results saved to {args.save}")
+
+        if args.baseline:
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                regressions = compare(results, json.load(f), args.max_regression)
+            if regressions:
+                print(f"\nRegressed beyond {args.max_regression:.0%}: {', '.join(regressions)}")
+                return 1
+        return 0
+    finally:
+        if app is not None:
+            app.stop()
+        for fake in fakes:
+            fake.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
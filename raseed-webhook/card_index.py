@@ -0,0 +1,107 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+# Local index of issued loyalty cards
+WALLET_CARD_INDEX_DB = os.environ.get(
+    'WALLET_CARD_INDEX_DB', os.path.join(tempfile.gettempdir(), 'raseed-wallet-cards.db')
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS issued_cards (
+    email TEXT NOT NULL,
+    class_id TEXT NOT NULL,
+    object_id TEXT NOT NULL,
+    save_url TEXT NOT NULL,
+    name TEXT,
+    mode TEXT,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (email, class_id)
+);
+"""
+
+
+def normalize_email(email):
+    """Lower-case and trim an email so lookups don't depend on how it was typed"""
+    return (email or '').strip().lower()
+
+
+class IssuedCardIndex:
+    """Maps (email, class) to the Wallet object and save URL issued for it"""
+
+    def __init__(self, db_path=WALLET_CARD_INDEX_DB):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self._db().executescript(_SCHEMA)
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def get(self, email, class_id):
+        """Return the card already issued for this email and class, or None"""
+        row = self._db().execute(
+            "SELECT object_id, save_url, name, mode, created_at FROM issued_cards WHERE email = ? AND class_id = ?",
+            (normalize_email(email), class_id)
+        ).fetchone()
+        with self._stats_lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return self._card(class_id, row) if row else None
+
+    def put(self, email, class_id, object_id, save_url, name=None, mode=None):
+        """Record an issued card, keeping the first one if two requests raced"""
+        db = self._db()
+        with db:
+            db.execute(
+                "INSERT OR IGNORE INTO issued_cards (email, class_id, object_id, save_url, name, mode, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (normalize_email(email), class_id, object_id, save_url, name, mode, time.time())
+            )
+        return self.get(email, class_id)
+
+    def find_by_email(self, email):
+        """Return every card issued to an email, across classes"""
+        rows = self._db().execute(
+            "SELECT class_id, object_id, save_url, name, mode, created_at FROM issued_cards "
+            "WHERE email = ? ORDER BY created_at",
+            (normalize_email(email),)
+        ).fetchall()
+        return [self._card(row[0], row[1:]) for row in rows]
+
+    def stats(self):
+        """Return index size and lookup counters"""
+        count = self._db().execute("SELECT COUNT(*) FROM issued_cards").fetchone()[0]
+        with self._stats_lock:
+            return {"cards": count, "hits": self.hits, "misses": self.misses}
+
+    @staticmethod
+    def _card(class_id, row):
+        object_id, save_url, name, mode, created_at = row
+        return {
+            "class_id": class_id,
+            "object_id": object_id,
+            "save_url": save_url,
+            "name": name,
+            "mode": mode,
+            "created_at": created_at
+        }
+
+    def _after_fork(self):
+        # Forked workers must open their own SQLite connections
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+
+    def _db(self):
+        # SQLite connections can't be shared across threads; keep one per thread
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.db_path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+        return db
@@ -1,23 +1,47 @@
+import json
 import os
-from google.auth.transport.requests import Request
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
+import tempfile
+from wallet_templates import load_templates
+
+# The Wallet API discovery document bundled with google-api-python-client is used when
+# available; otherwise the fetched document is cached here for later cold starts
+GOOGLE_WALLET_DISCOVERY_CACHE = os.environ.get(
+    'GOOGLE_WALLET_DISCOVERY_CACHE', os.path.join(tempfile.gettempdir(), 'raseed-walletobjects-v1.json')
+)
+# Send Wallet API calls (batches included) to another endpoint, e.g. the benchmark's stand-in
+GOOGLE_WALLET_API_ENDPOINT = os.environ.get('GOOGLE_WALLET_API_ENDPOINT', '')
 
 class GoogleWalletConfig:
     def __init__(self):
         # You'll need to download your service account key from Google Cloud Console
         # and save it as 'service-account-key.json' in this directory
         self.SCOPES = ['https://www.googleapis.com/auth/wallet_object.issuer']
-        self.SERVICE_ACCOUNT_FILE = 'service-account-key.json'
+        self.SERVICE_ACCOUNT_FILE = os.environ.get('GOOGLE_WALLET_SERVICE_ACCOUNT_FILE', 'service-account-key.json')
         
         # Your Google Wallet issuer ID (you'll get this from Google Wallet API setup)
         self.ISSUER_ID = os.environ.get('GOOGLE_WALLET_ISSUER_ID', '3388000000022969042')
         
         # Your Google Wallet class ID (you'll create this)
         self.CLASS_ID = os.environ.get('GOOGLE_WALLET_CLASS_ID', '3388000000022969042-raseed')
+
+        # How save links are produced: 'api' inserts the object through the Wallet API first,
+        # 'jwt' signs the object into the link locally. A JWT card's object only exists once
+        # the user saves it, so points updates for it fail until then
+        self.SAVE_MODE = os.environ.get('GOOGLE_WALLET_SAVE_MODE', 'api')
+
+        # Save links longer than this (the longest URL older browsers accept) can be cut off; JWT cards
+        # that would exceed it are inserted through the API and linked by object ID instead
+        self.MAX_SAVE_URL_LENGTH = int(os.environ.get('GOOGLE_WALLET_MAX_SAVE_URL_LENGTH', '2083'))
+
+        # Class and object resource templates, validated once here so a bad
+        # template fails at startup rather than on a user's request
+        self.TEMPLATES = load_templates()
         
     def get_credentials(self):
         """Get service account credentials for Google Wallet API"""
+        # Imported here so instances that never touch Wallet don't pay for it at startup
+        from google.oauth2 import service_account
+
         try:
             credentials = service_account.Credentials.from_service_account_file(
                 self.SERVICE_ACCOUNT_FILE, scopes=self.SCOPES
@@ -27,9 +51,56 @@ class GoogleWalletConfig:
             print("Service account key file not found. Please download it from Google Cloud Console.")
             return None
     
-    def get_wallet_service(self):
+    def get_wallet_service(self, credentials=None):
         """Get Google Wallet API service"""
-        credentials = self.get_credentials()
+        credentials = credentials or self.get_credentials()
         if credentials:
-            return build('walletobjects', 'v1', credentials=credentials)
-        return None 
\ No newline at end of file
+            return self._build_from_discovery(credentials)
+        return None
+
+    def _build_from_discovery(self, credentials):
+        from googleapiclient import discovery
+        from googleapiclient.errors import UnknownApiNameOrVersion
+
+        if GOOGLE_WALLET_API_ENDPOINT:
+            return self._build_for_endpoint(discovery, credentials, GOOGLE_WALLET_API_ENDPOINT)
+
+        try:
+            return discovery.build('walletobjects', 'v1', credentials=credentials, static_discovery=True)
+        except (UnknownApiNameOrVersion, TypeError):
+            # Older client libraries don't bundle discovery documents
+            pass
+
+        try:
+            with open(GOOGLE_WALLET_DISCOVERY_CACHE, 'r', encoding='utf-8') as f:
+                return discovery.build_from_document(f.read(), credentials=credentials)
+        except (OSError, ValueError):
+            pass
+
+        # No usable local copy: fetch the document once and keep it for the next cold start
+        from http_client import upstream_client
+
+        response = upstream_client.get(
+            discovery.DISCOVERY_URI.format(api='walletobjects', apiVersion='v1'), upstream='wallet', operation='discovery'
+        )
+        response.raise_for_status()
+        document = response.text
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(GOOGLE_WALLET_DISCOVERY_CACHE), suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(document)
+            os.replace(tmp_path, GOOGLE_WALLET_DISCOVERY_CACHE)
+        except OSError as e:
+            print(f"Could not cache Wallet discovery document: {e}")
+        return discovery.build_from_document(document, credentials=credentials)
+
+    def _build_for_endpoint(self, discovery, credentials, endpoint):
+        # client_options only moves regular calls; rewriting rootUrl moves batch calls too
+        from googleapiclient.discovery_cache import get_static_doc
+
+        document = get_static_doc('walletobjects', 'v1')
+        if document is None:
+            raise ValueError("GOOGLE_WALLET_API_ENDPOINT needs a client library that bundles discovery documents")
+        document = json.loads(document)
+        document['rootUrl'] = endpoint.rstrip('/') + '/'
+        return discovery.build_from_document(document, credentials=credentials)
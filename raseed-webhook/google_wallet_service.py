@@ -1,117 +1,177 @@
+import hashlib
+import os
+import threading
 import uuid
+from card_index import IssuedCardIndex, normalize_email
 from google_wallet_config import GoogleWalletConfig
+from http_client import TRACE_PROPAGATION_UPSTREAMS
+from metrics import body_size, track_upstream
+from single_flight import SingleFlight
+from startup_report import startup_report
+from token_manager import TokenManager
+from tracing import tracer
+
+# Build the Wallet client in the background right after startup instead of on first use
+GOOGLE_WALLET_PREWARM = os.environ.get('GOOGLE_WALLET_PREWARM', '0') == '1'
+
+# Object fields signed into save links. Images and static modules live on the class,
+# so the link carries only what differs per member and stays under MAX_SAVE_URL_LENGTH
+SAVE_JWT_OBJECT_FIELDS = ('id', 'classId', 'state', 'accountId', 'accountName', 'loyaltyPoints', 'barcode')
+
+_UNSET = object()
 
 class GoogleWalletService:
     def __init__(self):
         self.config = GoogleWalletConfig()
-        self.service = self.config.get_wallet_service()
+        # Credentials and the API client are loaded on first use so instances
+        # that only serve chat never pay for them
+        self._credentials = _UNSET
+        self._service = _UNSET
+        self._init_lock = threading.Lock()
+        self.token_manager = None
+        self.card_index = IssuedCardIndex()
+        self.card_flight = SingleFlight()
+        # Classes known to exist, so create_loyalty_class never sends a doomed insert
+        self._known_classes = set()
+        self._classes_lock = threading.Lock()
+        self._local = threading.local()
+
+        # A prewarm thread may hold these when a preloaded app forks its workers
+        os.register_at_fork(after_in_child=self._after_fork)
+
+        if GOOGLE_WALLET_PREWARM:
+            threading.Thread(target=lambda: self.service, name="wallet-prewarm", daemon=True).start()
+
+    @property
+    def credentials(self):
+        """Service account credentials, loaded once on first access"""
+        if self._credentials is _UNSET:
+            with self._init_lock:
+                if self._credentials is _UNSET:
+                    with startup_report.lazy("wallet_credentials"), tracer.span('wallet load_credentials'):
+                        self._credentials = self.config.get_credentials()
+        return self._credentials
+
+    @property
+    def service(self):
+        """Wallet API client, built once on first access"""
+        if self._service is _UNSET:
+            credentials = self.credentials
+            with self._init_lock:
+                if self._service is _UNSET:
+                    with startup_report.lazy("wallet_client"), tracer.span('wallet build_client'):
+                        self._service = self.config.get_wallet_service(credentials) if credentials else None
+                    if self._service:
+                        # API calls need access tokens; keep one fresh off the request path
+                        self.token_manager = TokenManager(credentials)
+                        self.token_manager.start()
+        return self._service
+
+    def _after_fork(self):
+        self._init_lock = threading.Lock()
+        self._classes_lock = threading.Lock()
+        self._local = threading.local()
+
+    def token_stats(self):
+        """Report access token age and refresh latency for Wallet API calls"""
+        if not self.token_manager:
+            return {"active": False}
+        stats = self.token_manager.stats()
+        stats["active"] = True
+        return stats
+
+    def initialized(self):
+        """Report which Wallet components have been loaded so far"""
+        return {
+            "credentials": self._credentials is not _UNSET,
+            "client": self._service is not _UNSET
+        }
     
     def create_loyalty_class(self, class_name, program_name, issuer_name):
-        """Create a loyalty class for Google Wallet"""
+        """Create the loyalty class for Google Wallet unless it already exists"""
         if not self.service:
             return {"error": "Wallet service not available"}
-        
-        loyalty_class = {
-            'id': f"{self.config.ISSUER_ID}.{self.config.CLASS_ID}",
-            'issuerName': issuer_name,
-            'programName': program_name,
-            'programLogo': {
-                'sourceUri': {
-                    'uri': 'https://www.shutterstock.com/image-vector/link-icon-hyperlink-chain-symbol-260nw-1186749931.jpg'  # Replace with your logo URL
-                }
-            },
-            'reviewStatus': 'UNDER_REVIEW',
-            'allowMultipleUsersPerObject': True,
-            'locations': [
-                {
-                    'kind': 'walletobjects#latLongPoint',
-                    'latitude': 37.424015499999996,
-                    'longitude': -122.09259560000001
-                }
-            ],
-            'textModulesData': [
-                {
-                    'header': 'POINTS BALANCE',
-                    'body': '1234'
-                }
-            ]
-        }
-        
+
+        class_id = f"{self.config.ISSUER_ID}.{self.config.CLASS_ID}"
+        with self._classes_lock:
+            if class_id in self._known_classes:
+                return {"success": True, "class_id": class_id, "existing": True}
+
         try:
-            result = self.service.loyaltyclass().insert(body=loyalty_class).execute()
-            return {"success": True, "class_id": result['id']}
+            self._execute(self.service.loyaltyclass().get(resourceId=class_id), 'class_get')
+            self._mark_class_exists(class_id)
+            return {"success": True, "class_id": class_id, "existing": True}
         except Exception as e:
+            if getattr(e, 'status_code', None) != 404:
+                return {"error": str(e)}
+
+        loyalty_class = self.config.TEMPLATES['loyalty_class'].render(
+            class_id=class_id,
+            class_name=class_name,
+            issuer_name=issuer_name,
+            program_name=program_name
+        )
+
+        try:
+            result = self._execute(self.service.loyaltyclass().insert(body=loyalty_class), 'class_insert')
+            self._mark_class_exists(result['id'])
+            return {"success": True, "class_id": result['id'], "existing": False}
+        except Exception as e:
+            if getattr(e, 'status_code', None) == 409:
+                # Created by another instance between our get and insert
+                self._mark_class_exists(class_id)
+                return {"success": True, "class_id": class_id, "existing": True}
             return {"error": str(e)}
-    
-    def create_loyalty_object(self, user_email, user_name, points_balance=0):
+
+    def _execute(self, request, operation):
+        # Every Wallet API call goes through here so it shows up in the upstream metrics and traces
+        with track_upstream('wallet', operation) as call:
+            if 'wallet' in TRACE_PROPAGATION_UPSTREAMS:
+                request.headers = tracer.inject(request.headers)
+            result = request.execute(http=self._http())
+            call.sent(body_size(request.body))
+        return result
+
+    def _http(self):
+        # httplib2 is not thread-safe, so each request thread gets its own authorized transport
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            import google_auth_httplib2
+            import httplib2
+
+            http = google_auth_httplib2.AuthorizedHttp(self.credentials, http=httplib2.Http())
+            self._local.http = http
+        return http
+
+    def _mark_class_exists(self, class_id):
+        with self._classes_lock:
+            self._known_classes.add(class_id)
+
+    def build_loyalty_object(self, user_email, user_name, points_balance=0, object_id=None):
+        """Build the loyalty object resource for a user, with a fresh object ID unless one is given"""
+        object_id = object_id or f"{self.config.ISSUER_ID}.{uuid.uuid4()}"
+        return self.config.TEMPLATES['loyalty_object'].render(
+            object_id=object_id,
+            class_id=f"{self.config.ISSUER_ID}.{self.config.CLASS_ID}",
+            email=user_email,
+            name=user_name,
+            points=points_balance
+        )
+
+    def create_loyalty_object(self, user_email, user_name, points_balance=0, object_id=None):
         """Create a loyalty card for a specific user"""
         if not self.service:
             return {"error": "Wallet service not available"}
-        
-        object_id = f"{self.config.ISSUER_ID}.{uuid.uuid4()}"
-        
-        loyalty_object = {
-            'id': object_id,
-            'classId': f"{self.config.ISSUER_ID}.{self.config.CLASS_ID}",
-            'state': 'ACTIVE',
-            'heroImage': {
-                'sourceUri': {
-                    'uri': 'https://www.shutterstock.com/image-vector/link-icon-hyperlink-chain-symbol-260nw-1186749931.jpg'  # Replace with your image
-                }
-            },
-            'textModulesData': [
-                {
-                    'header': 'POINTS BALANCE',
-                    'body': str(points_balance)
-                },
-                {
-                    'header': 'MEMBER SINCE',
-                    'body': '2024'
-                }
-            ],
-            'linksModuleData': {
-                'uris': [
-                    {
-                        'uri': 'https://your-domain.com/terms',
-                        'description': 'Terms of Service'
-                    }
-                ]
-            },
-            'imageModulesData': [
-                {
-                    'mainImage': {
-                        'sourceUri': {
-                            'uri': 'https://your-domain.com/qr-code.png'  # QR code if needed
-                        }
-                    }
-                }
-            ],
-            'barcode': {
-                'type': 'QR_CODE',
-                'value': object_id,
-                'alternateText': object_id
-            },
-            'locations': [
-                {
-                    'kind': 'walletobjects#latLongPoint',
-                    'latitude': 37.424015499999996,
-                    'longitude': -122.09259560000001
-                }
-            ],
-            'accountId': user_email,
-            'accountName': user_name,
-            'loyaltyPoints': {
-                'balance': {
-                    'kind': 'walletobjects#loyaltyPointsBalance',
-                    'stringBalance': str(points_balance)
-                }
-            }
-        }
-        
+
+        loyalty_object = self.build_loyalty_object(user_email, user_name, points_balance, object_id=object_id)
+
         try:
-            result = self.service.loyaltyobject().insert(body=loyalty_object).execute()
+            result = self._execute(self.service.loyaltyobject().insert(body=loyalty_object), 'object_insert')
             return {"success": True, "object_id": result['id']}
         except Exception as e:
+            if object_id and getattr(e, 'status_code', None) == 409:
+                # Already created by an earlier or concurrent request for the same card
+                return {"success": True, "object_id": object_id}
             return {"error": str(e)}
     
     def get_save_url(self, object_id):
@@ -120,11 +180,98 @@ class GoogleWalletService:
             return {"error": "Wallet service not available"}
         
         try:
-            result = self.service.loyaltyobject().get(
-                resourceId=object_id
-            ).execute()
+            result = self._execute(self.service.loyaltyobject().get(resourceId=object_id), 'object_get')
             
             save_url = f"https://pay.google.com/gp/v/save/{object_id}"
             return {"success": True, "save_url": save_url, "object": result}
         except Exception as e:
-            return {"error": str(e)} 
\ No newline at end of file
+            return {"error": str(e)}
+
+    def create_save_jwt_url(self, user_email, user_name, points_balance=0, object_id=None):
+        """
+        Build a "Save to Google Wallet" link with the loyalty object embedded in
+        a JWT signed locally with the service-account key. Google creates the
+        object when the user saves it, so no Wallet API calls are made here.
+        """
+        if not self.credentials:
+            return {"error": "Wallet credentials not available"}
+
+        loyalty_object = {
+            key: value
+            for key, value in self.build_loyalty_object(user_email, user_name, points_balance, object_id=object_id).items()
+            if key in SAVE_JWT_OBJECT_FIELDS
+        }
+        claims = {
+            'iss': self.credentials.service_account_email,
+            'aud': 'google',
+            'typ': 'savetowallet',
+            'origins': [],
+            'payload': {
+                'loyaltyObjects': [loyalty_object]
+            }
+        }
+
+        from google.auth import jwt
+
+        try:
+            with tracer.span('wallet sign_save_jwt'):
+                token = jwt.encode(self.credentials.signer, claims).decode('utf-8')
+        except Exception as e:
+            return {"error": str(e)}
+
+        save_url = f"https://pay.google.com/gp/v/save/{token}"
+        return {"success": True, "object_id": loyalty_object['id'], "save_url": save_url}
+
+    def card_object_id(self, user_email):
+        """Deterministic object ID for a member's card in the configured class"""
+        key = f"{self.config.CLASS_ID}|{normalize_email(user_email)}"
+        return f"{self.config.ISSUER_ID}.card-{hashlib.sha256(key.encode('utf-8')).hexdigest()[:40]}"
+
+    def find_cards(self, user_email):
+        """Look up the cards already issued to an email in the local index"""
+        return self.card_index.find_by_email(user_email)
+
+    def create_card(self, user_email, user_name, points_balance=0, mode=None):
+        """Create a loyalty card and its save URL, or return the one already issued to this member"""
+        mode = mode or self.config.SAVE_MODE
+        if mode not in ('jwt', 'api'):
+            return {"error": f"Unknown save mode '{mode}'. Use 'jwt' or 'api'."}
+
+        class_id = f"{self.config.ISSUER_ID}.{self.config.CLASS_ID}"
+        with tracer.span('wallet create_card', attributes={'wallet.mode': mode}) as span:
+            card = self.card_index.get(user_email, class_id)
+            span.set_attribute('wallet.existing', bool(card))
+            if card:
+                return {"success": True, "object_id": card["object_id"], "save_url": card["save_url"], "existing": True}
+
+            # Retries and double-clicks that arrive together share one creation
+            key = f"{class_id}|{normalize_email(user_email)}"
+            return self.card_flight.do(key, lambda: self._issue_card(user_email, user_name, points_balance, mode, class_id))
+
+    def _issue_card(self, user_email, user_name, points_balance, mode, class_id):
+        # Only the request that wins card_flight gets this span; the others just wait under create_card
+        with tracer.span('wallet issue_card'):
+            card = self.card_index.get(user_email, class_id)
+            if card:
+                return {"success": True, "object_id": card["object_id"], "save_url": card["save_url"], "existing": True}
+
+            object_id = self.card_object_id(user_email)
+            if mode == 'jwt':
+                result = self.create_save_jwt_url(user_email, user_name, points_balance, object_id=object_id)
+                if result.get("success") and len(result["save_url"]) > self.config.MAX_SAVE_URL_LENGTH:
+                    print(f"Save link for {object_id} is {len(result['save_url'])} characters; inserting the object instead")
+                    mode = 'api'
+            if mode == 'api':
+                result = self.create_loyalty_object(user_email, user_name, points_balance, object_id=object_id)
+                if result.get("success"):
+                    # Get the save URL
+                    save_result = self.get_save_url(result["object_id"])
+                    if not save_result.get("success"):
+                        return save_result
+                    result = {"success": True, "object_id": result["object_id"], "save_url": save_result["save_url"]}
+
+            if not result.get("success"):
+                return result
+
+            card = self.card_index.put(user_email, class_id, result["object_id"], result["save_url"], user_name, mode)
+            return {"success": True, "object_id": card["object_id"], "save_url": card["save_url"], "existing": False}
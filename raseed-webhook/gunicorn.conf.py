@@ -0,0 +1,99 @@
+"""
+Production server settings for the Raseed webhook service.
+
+Run with:
+    gunicorn --config gunicorn.conf.py main:app
+
+Every setting can be overridden from the environment, so the same image
+works on a laptop, a large VM or Cloud Run.
+"""
+
+import os
+import shutil
+import tempfile
+
+
+def _available_cpus():
+    """CPUs this container may actually use, honouring cgroup quotas (e.g. Cloud Run)"""
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()
+        if quota != 'max':
+            return max(1, int(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    try:
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:
+            quota = int(f.read())
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+            period = int(f.read())
+        if quota > 0:
+            return max(1, quota // period)
+    except (OSError, ValueError):
+        pass
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+
+# One process per CPU, each with a thread pool: most of a request's time is
+# spent waiting on Gemini, Wallet or receipt-processing calls, not on CPU
+workers = int(os.environ.get('WEB_CONCURRENCY', str(_available_cpus())))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', '16'))
+
+# Import the app (templates, caches, service objects) once in the master and
+# fork workers from it, so startup cost is paid once and memory is shared
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+# Long enough for receipt batches and job long-polls
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '120'))
+# On SIGTERM, in-flight requests get this long to finish. Cloud Run allows
+# 10 seconds between SIGTERM and SIGKILL.
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', '9'))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', '5'))
+
+# Workers write their metrics here so /metrics reports the whole server, not
+# just the worker that answered. Stale files from a previous run are cleared
+# in on_starting.
+_prometheus_dir = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'raseed-prometheus')
+)
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-') or None
+errorlog = '-'
+
+
+def on_starting(server):
+    """Clear the previous run's metrics once, in the master; config reloads keep live workers' files"""
+    from profiler import mark_run_started
+
+    shutil.rmtree(_prometheus_dir, ignore_errors=True)
+    os.makedirs(_prometheus_dir, exist_ok=True)
+    # Profiler settings changed through /debug/profiler last until the server is restarted
+    mark_run_started()
+
+
+def post_worker_init(worker):
+    """Start receipt job workers, which also pick up jobs left unfinished by a previous run"""
+    import main
+
+    main.start_services()
+
+
+def worker_exit(server, worker):
+    """Flush queued points, give running receipt jobs a moment and close pooled connections"""
+    import main
+
+    # Receipt jobs are persisted, so any still running are picked up again after a restart
+    main.shutdown_services(timeout=1)
+
+
+def child_exit(server, worker):
+    """Drop a dead worker's live gauges from the shared metrics"""
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
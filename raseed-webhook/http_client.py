@@ -0,0 +1,104 @@
+import os
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from metrics import body_size, track_upstream
+from tracing import tracer
+
+# Connection pool sizing (one pool per upstream host)
+POOL_CONNECTIONS = int(os.environ.get('UPSTREAM_POOL_CONNECTIONS', '10'))
+POOL_MAXSIZE = int(os.environ.get('UPSTREAM_POOL_MAXSIZE', '32'))
+
+# Retry policy for transient upstream failures
+MAX_RETRIES = int(os.environ.get('UPSTREAM_MAX_RETRIES', '3'))
+BACKOFF_FACTOR = float(os.environ.get('UPSTREAM_BACKOFF_FACTOR', '0.5'))
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# A POST (e.g. a billed Gemini generation) is only retried when the upstream says it didn't do the work
+POST_RETRY_STATUSES = (429, 503)
+
+# Upstreams that receive the W3C traceparent header; receipt downloads go to arbitrary third-party hosts
+TRACE_PROPAGATION_UPSTREAMS = {
+    name.strip()
+    for name in os.environ.get('UPSTREAM_TRACE_PROPAGATION', 'gemini,receipt_processor,wallet').split(',')
+    if name.strip()
+}
+
+# Default (connect, read) timeouts in seconds
+CONNECT_TIMEOUT = float(os.environ.get('UPSTREAM_CONNECT_TIMEOUT', '5'))
+READ_TIMEOUT = float(os.environ.get('UPSTREAM_READ_TIMEOUT', '30'))
+
+
+def retry_statuses(method):
+    """Statuses worth retrying a request with this method on"""
+    return POST_RETRY_STATUSES if method.upper() == 'POST' else RETRY_STATUSES
+
+
+class UpstreamRetry(Retry):
+    """urllib3 retry policy that applies retry_statuses() per method"""
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if status_code not in retry_statuses(method):
+            return False
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+class UpstreamClient:
+    def __init__(self, pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE,
+                 max_retries=MAX_RETRIES, backoff_factor=BACKOFF_FACTOR,
+                 connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT):
+        self.timeout = (connect_timeout, read_timeout)
+
+        # Read errors are not retried: the upstream may already have done the
+        # (billable) work, and retrying would multiply the worst-case latency.
+        retry = UpstreamRetry(
+            total=max_retries,
+            connect=max_retries,
+            read=0,
+            status=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(['GET', 'HEAD', 'POST']),
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=retry
+        )
+
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def request(self, method, url, upstream='other', operation=None, **kwargs):
+        """Send a request over the pooled keep-alive session, recording and tracing it under an upstream label"""
+        kwargs.setdefault('timeout', self.timeout)
+        with track_upstream(upstream, operation or method.lower()) as call:
+            if upstream in TRACE_PROPAGATION_UPSTREAMS:
+                kwargs['headers'] = tracer.inject(kwargs.get('headers'))
+            response = self.session.request(method, url, **kwargs)
+            call.status(response.status_code)
+            call.sent(body_size(response.request.body))
+            content_length = response.headers.get('Content-Length')
+            if content_length and content_length.isdigit():
+                call.received(int(content_length))
+            elif not kwargs.get('stream'):
+                call.received(len(response.content))
+        return response
+
+    def get(self, url, **kwargs):
+        """Send a GET request"""
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        """Send a POST request"""
+        return self.request('POST', url, **kwargs)
+
+    def close(self):
+        """Close all pooled connections"""
+        self.session.close()
+
+
+# Shared client used by every outbound call
+upstream_client = UpstreamClient()
@@ -0,0 +1,138 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from PIL import Image, ImageOps, UnidentifiedImageError
+from streaming_upload import RECEIPT_SPOOL_THRESHOLD
+
+# Receipt image normalization settings
+RECEIPT_PREPROCESS = os.environ.get('RECEIPT_PREPROCESS', '1') == '1'
+RECEIPT_MAX_DIMENSION = int(os.environ.get('RECEIPT_MAX_DIMENSION', '2048'))
+RECEIPT_GRAYSCALE = os.environ.get('RECEIPT_GRAYSCALE', '1') == '1'
+RECEIPT_OUTPUT_FORMAT = os.environ.get('RECEIPT_OUTPUT_FORMAT', 'JPEG').upper()  # JPEG or WEBP
+RECEIPT_OUTPUT_QUALITY = int(os.environ.get('RECEIPT_OUTPUT_QUALITY', '80'))
+
+OUTPUT_TYPES = {
+    'JPEG': ('image/jpeg', 'jpg'),
+    'WEBP': ('image/webp', 'webp')
+}
+
+
+class PreprocessedImage:
+    """A normalized receipt image plus what the normalization saved"""
+
+    def __init__(self, file, size, content_type, filename, stats):
+        self.file = file
+        self.size = size
+        self.content_type = content_type
+        self.filename = filename
+        self.stats = stats
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.file.close()
+
+
+class ReceiptImagePreprocessor:
+    def __init__(self, enabled=RECEIPT_PREPROCESS, max_dimension=RECEIPT_MAX_DIMENSION,
+                 grayscale=RECEIPT_GRAYSCALE, output_format=RECEIPT_OUTPUT_FORMAT,
+                 quality=RECEIPT_OUTPUT_QUALITY):
+        if output_format not in OUTPUT_TYPES:
+            raise ValueError(f"Unsupported receipt output format: {output_format}")
+
+        self.enabled = enabled
+        self.max_dimension = max_dimension
+        self.grayscale = grayscale
+        self.output_format = output_format
+        self.quality = quality
+
+        self._lock = threading.Lock()
+        self.images_processed = 0
+        self.images_skipped = 0
+        self.bytes_saved = 0
+        self.seconds_spent = 0.0
+
+    def process(self, fileobj, size, content_type, filename):
+        """
+        Normalize a receipt image for OCR. Returns a PreprocessedImage, or None
+        if the input should be forwarded untouched (PDFs, undecodable images,
+        or when re-encoding would not make it smaller).
+        """
+        if not self.enabled or self._is_pdf(content_type, filename):
+            return None
+
+        started = time.perf_counter()
+        start_pos = fileobj.tell()
+        try:
+            output = self._normalize(fileobj)
+        except (UnidentifiedImageError, OSError, ValueError, Image.DecompressionBombError):
+            output = None
+        fileobj.seek(start_pos)
+        elapsed = time.perf_counter() - started
+
+        output_size = output.seek(0, os.SEEK_END) if output is not None else None
+        if output is None or output_size >= size:
+            if output is not None:
+                output.close()
+            with self._lock:
+                self.images_skipped += 1
+                self.seconds_spent += elapsed
+            return None
+
+        output.seek(0)
+        stats = {
+            "original_bytes": size,
+            "output_bytes": output_size,
+            "bytes_saved": size - output_size,
+            "elapsed_ms": round(elapsed * 1000, 2)
+        }
+        with self._lock:
+            self.images_processed += 1
+            self.bytes_saved += stats["bytes_saved"]
+            self.seconds_spent += elapsed
+
+        output_type, extension = OUTPUT_TYPES[self.output_format]
+        base_name = filename.rsplit('.', 1)[0] if '.' in filename else filename
+        return PreprocessedImage(output, output_size, output_type, f"{base_name}.{extension}", stats)
+
+    def fingerprint(self):
+        """Short hash of the settings that shape the output, for keying cached results"""
+        settings = f"{self.enabled}|{self.max_dimension}|{self.grayscale}|{self.output_format}|{self.quality}"
+        return hashlib.sha256(settings.encode('utf-8')).hexdigest()[:12]
+
+    def stats(self):
+        """Return cumulative preprocessing counters"""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "images_processed": self.images_processed,
+                "images_skipped": self.images_skipped,
+                "bytes_saved": self.bytes_saved,
+                "seconds_spent": round(self.seconds_spent, 3)
+            }
+
+    def _normalize(self, fileobj):
+        with Image.open(fileobj) as image:
+            # Let the JPEG decoder downscale by a power of two while decoding,
+            # which is much cheaper than decoding at full size and resizing
+            target = (self.max_dimension, self.max_dimension)
+            image.draft('L' if self.grayscale else 'RGB', target)
+
+            normalized = ImageOps.exif_transpose(image)
+            normalized.thumbnail(target, Image.LANCZOS)
+            normalized = normalized.convert('L' if self.grayscale else 'RGB')
+
+        output = tempfile.SpooledTemporaryFile(max_size=RECEIPT_SPOOL_THRESHOLD)
+        try:
+            normalized.save(output, format=self.output_format, quality=self.quality, optimize=True)
+        except BaseException:
+            output.close()
+            raise
+        return output
+
+    @staticmethod
+    def _is_pdf(content_type, filename):
+        return (content_type or '').lower() == 'application/pdf' or filename.lower().endswith('.pdf')
@@ -1,12 +1,27 @@
-from flask import Flask, request, jsonify, send_from_directory
+from startup_report import startup_report
+from flask import Flask, Response, g, request, jsonify, send_from_directory, stream_with_context
 import requests
 import os
+import json
 from werkzeug.utils import secure_filename
+from werkzeug.exceptions import RequestEntityTooLarge
 from google_wallet_service import GoogleWalletService
 from receipt_service import ReceiptService
+from http_client import upstream_client
+from response_cache import ResponseCache
+from single_flight import SingleFlight
+from receipt_jobs import ReceiptJobQueue
+from wallet_bulk import BulkCardIssuer
+from points_updates import PointsUpdateQueue
+from static_assets import StaticAssetPipeline
+from traffic_recorder import TrafficRecorder
+from profiler import PROFILE_HEADER, SamplingProfiler
+from tracing import TRACE_ID_HEADER, tracer
+from metrics import METRICS_CONTENT_TYPE, render_metrics, request_closed, request_finished, request_started
 
 app = Flask(__name__, static_folder='static')
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+RECEIPT_BATCH_MAX_CONTENT_LENGTH = int(os.environ.get('RECEIPT_BATCH_MAX_CONTENT_LENGTH', str(256 * 1024 * 1024)))
 
 # CORS headers function
 def add_cors_headers(response):
@@ -22,34 +37,125 @@ def handle_options(path):
     response = jsonify({'status': 'ok'})
     return add_cors_headers(response)
 
+# Request metrics: latency is to the response headers, in-flight lasts until a streamed body ends.
+# Flask tears a stream_with_context request down twice (when the view returns and when the stream
+# ends), so requests with a response are closed when the server closes that response instead.
+@app.before_request
+def start_request_metrics():
+    g.metrics_route = request.url_rule.rule if request.url_rule else 'unmatched'
+    g.metrics_started = request_started(g.metrics_route)
+    g.request_outcome = {}
+
+@app.after_request
+def record_request_metrics(response):
+    request_finished(
+        g.metrics_route, request.method, response.status_code, g.metrics_started,
+        request.content_length, response.content_length
+    )
+    route, outcome = g.metrics_route, g.request_outcome
+    response.call_on_close(lambda: request_closed(route, outcome.get('error')))
+    g.metrics_closed_with_response = True
+    return response
+
+@app.teardown_request
+def close_request_metrics(error=None):
+    if error is not None and 'request_outcome' in g:
+        g.request_outcome.setdefault('error', error)
+    if 'metrics_route' in g and not g.get('metrics_closed_with_response'):
+        request_closed(g.pop('metrics_route'), error)
+
+# Opt-in recording of sanitized traffic for traffic_replay.py (TRAFFIC_RECORD_PATH)
+traffic_recorder = TrafficRecorder.from_env()
+if traffic_recorder:
+    traffic_recorder.init_app(app)
+
+# On-demand stack sampling, by sample rate or per request (PROFILER_TOKEN)
+profiler = SamplingProfiler()
+
+@app.before_request
+def start_profiling():
+    if profiler.wants(request.headers.get(PROFILE_HEADER)):
+        g.profile_ident = profiler.begin(f"{request.method} {g.metrics_route}")
+
+@app.teardown_request
+def stop_profiling(error=None):
+    ident = g.pop('profile_ident', None)
+    if ident is not None:
+        profiler.end(ident)
+
+# Span tracing (TRACING_FILE / TRACING_OTLP_ENDPOINT); callers sending traceparent get their trace continued
+@app.before_request
+def start_request_trace():
+    g.trace_span = tracer.start_request(
+        f"{request.method} {g.metrics_route}", request.path, request.headers,
+        {'http.method': request.method, 'http.route': g.metrics_route}
+    )
+
+@app.after_request
+def tag_request_trace(response):
+    span = g.get('trace_span')
+    if span is not None:
+        span.set_attribute('http.status_code', response.status_code)
+        if response.status_code >= 500:
+            span.set_error(f"http_{response.status_code}")
+        if span.sampled:
+            response.headers[TRACE_ID_HEADER] = span.trace_id
+        # Like the metrics, the span stays open (and current) until a streamed body ends
+        response.call_on_close(lambda: tracer.end_request(span))
+        g.trace_closed_with_response = True
+    return response
+
+@app.teardown_request
+def end_request_trace(error=None):
+    span = g.get('trace_span')
+    if span is None:
+        return
+    if error is not None:
+        span.set_error(error)
+    if not g.get('trace_closed_with_response'):
+        tracer.end_request(g.pop('trace_span'))
+
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY", "YOUR_GEMINI_API_KEY")
+GEMINI_MODEL = os.environ.get("GEMINI_MODEL", "gemini-2.5-flash")
+GEMINI_API_BASE = os.environ.get("GEMINI_API_BASE", "https://generativelanguage.googleapis.com")
 
 # Initialize services
-wallet_service = GoogleWalletService()
-receipt_service = ReceiptService()
+with startup_report.phase("wallet_service"):
+    wallet_service = GoogleWalletService()
+    bulk_issuer = BulkCardIssuer(wallet_service)
+    points_updates = PointsUpdateQueue(wallet_service)
+with startup_report.phase("receipt_service"):
+    receipt_service = ReceiptService()
+    receipt_jobs = ReceiptJobQueue(receipt_service)
+with startup_report.phase("answer_cache"):
+    answer_cache = ResponseCache()
+    gemini_flight = SingleFlight()
+with startup_report.phase("static_assets"):
+    static_assets = StaticAssetPipeline()
 
 @app.route('/')
 def index():
-    response = send_from_directory('static', 'index.html')
-    return add_cors_headers(response)
+    return static_files('index.html')
 
 @app.route('/<path:filename>')
 def static_files(filename):
-    response = send_from_directory('static', filename)
-    return add_cors_headers(response)
+    asset = static_assets.get(filename)
+    if asset is None:
+        response = send_from_directory('static', filename)
+        return add_cors_headers(response)
 
-@app.route('/webhook', methods=['POST'])
-def webhook():
-    req_data = request.get_json()
-    # Extract user query from Dialogflow CX request
-    user_query = ""
-    try:
-        user_query = req_data['text'] if 'text' in req_data else req_data['queryInput']['text']['text']
-    except Exception:
-        user_query = "No query found"
+    # Fingerprinted, precompressed assets with prebuilt headers
+    status, headers, body = static_assets.respond(
+        asset, request.headers.get('Accept-Encoding', ''), request.headers.get('If-None-Match', '')
+    )
+    return Response(body, status=status, headers=headers)
 
-    # Call Gemini API
-    gemini_url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent?key={GEMINI_API_KEY}"
+def gemini_request(user_query, stream=False):
+    """Build the Gemini URL, headers and payload for a user query"""
+    method = "streamGenerateContent?alt=sse" if stream else "generateContent"
+    gemini_url = f"{GEMINI_API_BASE}/v1beta/models/{GEMINI_MODEL}:{method}"
+    # The key goes in a header so it never shows up in URLs quoted by errors, traces or logs
+    headers = {"x-goog-api-key": GEMINI_API_KEY}
     payload = {
         "contents": [
             {
@@ -59,26 +165,226 @@ def webhook():
             }
         ]
     }
-    gemini_resp = requests.post(gemini_url, json=payload)
-    if gemini_resp.status_code == 200:
-        data = gemini_resp.json()
-        answer = (
-            data.get("candidates", [{}])[0]
-            .get("content", {})
-            .get("parts", [{}])[0]
-            .get("text", "Sorry, I couldn't get an answer.")
-        )
-    else:
-        answer = "Sorry, I couldn't get an answer from Gemini."
+    return gemini_url, headers, payload
 
-    # Respond in Dialogflow CX webhook format
-    response = jsonify({
+def parse_gemini_answer(data):
+    """Extract the answer text from a generateContent response"""
+    return (
+        data.get("candidates", [{}])[0]
+        .get("content", {})
+        .get("parts", [{}])[0]
+        .get("text", "Sorry, I couldn't get an answer.")
+    )
+
+def parse_gemini_stream_line(line):
+    """Extract answer text chunks from one line of a streamGenerateContent SSE response"""
+    if not line or not line.startswith("data:"):
+        return []
+    data = json.loads(line[len("data:"):])
+    return [
+        part["text"]
+        for candidate in data.get("candidates", [])[:1]
+        for part in candidate.get("content", {}).get("parts", [])
+        if part.get("text")
+    ]
+
+def ask_gemini(user_query):
+    """Send a query to Gemini and return the answer text, or None on failure"""
+    gemini_url, headers, payload = gemini_request(user_query)
+    try:
+        gemini_resp = upstream_client.post(gemini_url, json=payload, headers=headers, upstream='gemini', operation='generate')
+    except requests.exceptions.RequestException:
+        return None
+
+    if gemini_resp.status_code != 200:
+        return None
+
+    return parse_gemini_answer(gemini_resp.json())
+
+def stream_gemini(user_query):
+    """Yield answer text chunks from Gemini's streaming endpoint"""
+    gemini_url, headers, payload = gemini_request(user_query, stream=True)
+    with upstream_client.post(
+        gemini_url, json=payload, headers=headers, stream=True, upstream='gemini', operation='stream'
+    ) as gemini_resp:
+        gemini_resp.raise_for_status()
+        for line in gemini_resp.iter_lines(decode_unicode=True):
+            yield from parse_gemini_stream_line(line)
+
+def sse_event(data, event=None):
+    """Format a Server-Sent Events frame"""
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {json.dumps(data)}\n\n"
+
+def gemini_error_event(error):
+    """SSE error frame for a failed Gemini stream; the details go to the server log only"""
+    print(f"Gemini stream failed: {error}")
+    body = {"error": "Sorry, I couldn't get an answer from Gemini."}
+    status = getattr(getattr(error, 'response', None), 'status_code', None)
+    if status is not None:
+        body["status"] = status
+    return sse_event(body, event="error")
+
+def fetch_and_cache_answer(cache_key, user_query):
+    """Ask Gemini and cache a successful answer"""
+    answer = ask_gemini(user_query)
+    if answer is not None:
+        answer_cache.set(cache_key, answer)
+    return answer
+
+def extract_user_query(req_data):
+    """Extract the user query from a Dialogflow CX or plain {"text": ...} request"""
+    try:
+        query = req_data['text'] if 'text' in req_data else req_data['queryInput']['text']['text']
+    except Exception:
+        return "No query found"
+    return query if isinstance(query, str) else "No query found"
+
+def receipt_success_body(result):
+    """Response body for a processed receipt, with cache and preprocessing details when present"""
+    body = {
+        "success": True,
+        "data": result["data"],
+        "message": "Receipt processed successfully"
+    }
+    for key in ("cached", "preprocessing"):
+        if key in result:
+            body[key] = result[key]
+    return body
+
+def dialogflow_response(answer):
+    """Wrap an answer in the Dialogflow CX webhook response format"""
+    return {
         "fulfillment_response": {
             "messages": [
                 {"text": {"text": [answer]}}
             ]
         }
-    })
+    }
+
+def cache_bypass_requested(headers, req_data):
+    """Check whether the caller asked to skip the answer cache"""
+    cache_control = headers.get('Cache-Control', '').lower()
+    if 'no-cache' in cache_control or 'no-store' in cache_control:
+        return True
+    return isinstance(req_data, dict) and bool(req_data.get('no_cache'))
+
+@app.route('/webhook', methods=['POST'])
+def webhook():
+    req_data = request.get_json()
+    # Extract user query from Dialogflow CX request
+    user_query = extract_user_query(req_data)
+
+    # Serve repeated questions from the answer cache
+    bypass_cache = cache_bypass_requested(request.headers, req_data)
+    cache_key = answer_cache.make_key(GEMINI_MODEL, user_query)
+    answer = None if bypass_cache else answer_cache.get(cache_key)
+    tracer.current().set_attribute('answer_cache.hit', answer is not None)
+
+    if answer is None:
+        # Requests coalesced onto another one's Gemini call show this span without a gemini child
+        with tracer.span('gemini answer', attributes={'gemini.model': GEMINI_MODEL, 'answer_cache.bypass': bypass_cache}):
+            if bypass_cache:
+                answer = ask_gemini(user_query)
+            else:
+                # Identical concurrent queries share a single upstream call
+                answer = gemini_flight.do(cache_key, lambda: fetch_and_cache_answer(cache_key, user_query))
+        if answer is None:
+            answer = "Sorry, I couldn't get an answer from Gemini."
+
+    # Respond in Dialogflow CX webhook format
+    response = jsonify(dialogflow_response(answer))
+    return add_cors_headers(response)
+
+@app.route('/webhook/cache-stats', methods=['GET'])
+def webhook_cache_stats():
+    """Report answer cache and request coalescing counters"""
+    stats = answer_cache.stats()
+    stats["coalescing"] = gemini_flight.stats()
+    response = jsonify(stats)
+    return add_cors_headers(response)
+
+@app.route('/startup-stats', methods=['GET'])
+def startup_stats():
+    """Report startup phase timings and which lazy clients have been initialized"""
+    stats = startup_report.summary()
+    stats["wallet_initialized"] = wallet_service.initialized()
+    response = jsonify(stats)
+    return add_cors_headers(response)
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Expose request and upstream call metrics in Prometheus text format"""
+    return Response(render_metrics(), content_type=METRICS_CONTENT_TYPE)
+
+@app.route('/debug/profiler', methods=['GET'])
+def profiler_status():
+    """Report the sampling profiler's settings and this worker's sample counts"""
+    if not profiler.authorized(request.headers.get('X-Profiler-Token')):
+        response = jsonify({"error": "Not found"})
+        return add_cors_headers(response), 404
+    response = jsonify(profiler.status())
+    return add_cors_headers(response)
+
+@app.route('/debug/profiler', methods=['POST'])
+def configure_profiler():
+    """Change the profiler sample rate for every worker, or start a fresh profile"""
+    if not profiler.authorized(request.headers.get('X-Profiler-Token')):
+        response = jsonify({"error": "Not found"})
+        return add_cors_headers(response), 404
+    try:
+        data = request.get_json(silent=True) or {}
+        response = jsonify(profiler.configure(data.get('sample_rate'), bool(data.get('reset'))))
+        return add_cors_headers(response)
+    except Exception as e:
+        response = jsonify({"error": str(e)})
+        return add_cors_headers(response), 500
+
+@app.route('/debug/profiler/collapsed', methods=['GET'])
+def profiler_collapsed():
+    """Download the merged collapsed-stack profile (flamegraph.pl / speedscope input)"""
+    if not profiler.authorized(request.headers.get('X-Profiler-Token')):
+        response = jsonify({"error": "Not found"})
+        return add_cors_headers(response), 404
+    response = Response(profiler.collapsed(), mimetype='text/plain')
+    return add_cors_headers(response)
+
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """Stream a Gemini answer to the browser as Server-Sent Events"""
+    req_data = request.get_json(silent=True) or {}
+    user_query = req_data.get('text', '')
+
+    if not user_query:
+        response = jsonify({"error": "Text is required"})
+        return add_cors_headers(response), 400
+
+    bypass_cache = cache_bypass_requested(request.headers, req_data)
+    cache_key = answer_cache.make_key(GEMINI_MODEL, user_query)
+    cached_answer = None if bypass_cache else answer_cache.get(cache_key)
+
+    def generate():
+        if cached_answer is not None:
+            yield sse_event({"text": cached_answer})
+            yield sse_event({}, event="done")
+            return
+
+        chunks = []
+        try:
+            for chunk in stream_gemini(user_query):
+                chunks.append(chunk)
+                yield sse_event({"text": chunk})
+        except (requests.exceptions.RequestException, ValueError) as e:
+            yield gemini_error_event(e)
+            return
+
+        if chunks and not bypass_cache:
+            answer_cache.set(cache_key, "".join(chunks))
+        yield sse_event({}, event="done")
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
     return add_cors_headers(response)
 
 # Google Wallet Endpoints
@@ -95,20 +401,20 @@ def create_wallet_card():
             response = jsonify({"error": "Email is required"})
             return add_cors_headers(response), 400
         
-        # Create the loyalty card
-        result = wallet_service.create_loyalty_object(user_email, user_name, points_balance)
+        # Create the loyalty card and its save URL
+        result = wallet_service.create_card(user_email, user_name, points_balance, data.get('mode'))
         
         if result.get("success"):
-            # Get the save URL
-            save_result = wallet_service.get_save_url(result["object_id"])
-            if save_result.get("success"):
-                response = jsonify({
-                    "success": True,
-                    "card_id": result["object_id"],
-                    "save_url": save_result["save_url"],
-                    "message": "Digital card created successfully. Use the save_url to add it to your Google Wallet."
-                })
-                return add_cors_headers(response)
+            if not result.get("existing"):
+                points_updates.record_balance(result["object_id"], points_balance)
+            response = jsonify({
+                "success": True,
+                "card_id": result["object_id"],
+                "save_url": result["save_url"],
+                "existing": result.get("existing", False),
+                "message": "Digital card created successfully. Use the save_url to add it to your Google Wallet."
+            })
+            return add_cors_headers(response)
         
         response = jsonify(result)
         return add_cors_headers(response), 400
@@ -132,7 +438,8 @@ def create_wallet_class():
             response = jsonify({
                 "success": True,
                 "class_id": result["class_id"],
-                "message": "Loyalty class created successfully"
+                "existing": result.get("existing", False),
+                "message": "Loyalty class already exists" if result.get("existing") else "Loyalty class created successfully"
             })
             return add_cors_headers(response)
         
@@ -143,6 +450,101 @@ def create_wallet_class():
         response = jsonify({"error": str(e)})
         return add_cors_headers(response), 500
 
+@app.route('/wallet/cards', methods=['GET'])
+def find_wallet_cards():
+    """Look up the cards already issued to an email"""
+    try:
+        user_email = request.args.get('email')
+        if not user_email:
+            response = jsonify({"error": "Email is required"})
+            return add_cors_headers(response), 400
+
+        cards = wallet_service.find_cards(user_email)
+        response = jsonify({"email": user_email, "cards": cards})
+        return add_cors_headers(response)
+
+    except Exception as e:
+        response = jsonify({"error": str(e)})
+        return add_cors_headers(response), 500
+
+@app.route('/wallet/token-stats', methods=['GET'])
+def wallet_token_stats():
+    """Report Wallet API access token age and refresh latency"""
+    response = jsonify(wallet_service.token_stats())
+    return add_cors_headers(response)
+
+@app.route('/wallet/points', methods=['POST'])
+def update_wallet_points():
+    """Queue a points change for a loyalty card; writes to the Wallet API are batched"""
+    try:
+        data = request.get_json()
+        result = points_updates.add(data.get('object_id'), data.get('delta'))
+
+        response = jsonify(result)
+        if result.get("success"):
+            return add_cors_headers(response), 202
+        return add_cors_headers(response), 400
+
+    except Exception as e:
+        response = jsonify({"error": str(e)})
+        return add_cors_headers(response), 500
+
+@app.route('/wallet/points/stats', methods=['GET'])
+def wallet_points_stats():
+    """Report the points write-behind backlog and flush counters"""
+    response = jsonify(points_updates.stats())
+    return add_cors_headers(response)
+
+@app.route('/wallet/bulk-issue', methods=['POST'])
+def bulk_issue_wallet_cards():
+    """Issue loyalty cards for many members using batched Wallet API calls"""
+    try:
+        data = request.get_json()
+        result = bulk_issuer.submit(data.get('members', []))
+
+        response = jsonify(result)
+        if result.get("success"):
+            return add_cors_headers(response), 202
+        return add_cors_headers(response), 400
+
+    except Exception as e:
+        response = jsonify({"error": str(e)})
+        return add_cors_headers(response), 500
+
+@app.route('/wallet/bulk-issue/<job_id>', methods=['GET'])
+def get_bulk_issue_job(job_id):
+    """Get bulk issuance progress and a page of per-member results"""
+    try:
+        offset = request.args.get('offset', 0, type=int)
+        limit = min(request.args.get('limit', 100, type=int), 1000)
+        job = bulk_issuer.status(job_id, offset, limit)
+
+        if job is None:
+            response = jsonify({"error": "Job not found"})
+            return add_cors_headers(response), 404
+
+        response = jsonify(job)
+        return add_cors_headers(response)
+
+    except Exception as e:
+        response = jsonify({"error": str(e)})
+        return add_cors_headers(response), 500
+
+@app.route('/wallet/bulk-issue/<job_id>/resume', methods=['POST'])
+def resume_bulk_issue_job(job_id):
+    """Resume issuing the pending cards of an interrupted bulk job"""
+    try:
+        result = bulk_issuer.resume(job_id)
+
+        response = jsonify(result)
+        if result.get("success"):
+            return add_cors_headers(response), 202
+        return add_cors_headers(response), 404
+
+    except Exception as e:
+        response = jsonify({"error": str(e)})
+        return add_cors_headers(response), 500
+
 # Receipt Processing Endpoints
 @app.route('/receipt/process', methods=['POST'])
 def process_receipt():
@@ -160,11 +562,7 @@ def process_receipt():
         result = receipt_service.process_receipt(file)
         
         if result.get("success"):
-            response = jsonify({
-                "success": True,
-                "data": result["data"],
-                "message": "Receipt processed successfully"
-            })
+            response = jsonify(receipt_success_body(result))
             return add_cors_headers(response)
         
         response = jsonify(result)
@@ -174,6 +572,12 @@ def process_receipt():
         response = jsonify({"error": str(e)})
         return add_cors_headers(response), 500
 
+@app.route('/receipt/stats', methods=['GET'])
+def receipt_stats():
+    """Report receipt result cache and image preprocessing counters"""
+    response = jsonify(receipt_service.stats())
+    return add_cors_headers(response)
+
 @app.route('/receipt/process-url', methods=['POST'])
 def process_receipt_from_url():
     """Process a receipt from a URL"""
@@ -188,11 +592,7 @@ def process_receipt_from_url():
         result = receipt_service.process_receipt_from_url(image_url)
         
         if result.get("success"):
-            response = jsonify({
-                "success": True,
-                "data": result["data"],
-                "message": "Receipt processed successfully"
-            })
+            response = jsonify(receipt_success_body(result))
             return add_cors_headers(response)
         
         response = jsonify(result)
@@ -202,5 +602,112 @@ def process_receipt_from_url():
         response = jsonify({"error": str(e)})
         return add_cors_headers(response), 500
 
+@app.route('/receipt/process-batch', methods=['POST'])
+def process_receipt_batch():
+    """Process many receipt files and/or URLs concurrently"""
+    try:
+        # A batch may legitimately exceed the single-upload size limit
+        request.max_content_length = RECEIPT_BATCH_MAX_CONTENT_LENGTH
+
+        if request.is_json:
+            data = request.get_json() or {}
+            files = []
+            image_urls = data.get('image_urls', [])
+            concurrency = data.get('concurrency')
+        else:
+            files = [file for file in request.files.getlist('files') + request.files.getlist('file') if file.filename]
+            image_urls = request.form.getlist('image_urls')
+            concurrency = request.form.get('concurrency', type=int)
+
+        result = receipt_service.process_batch(files, image_urls, concurrency)
+
+        response = jsonify(result)
+        if result.get("success"):
+            return add_cors_headers(response)
+        return add_cors_headers(response), 400
+
+    except RequestEntityTooLarge:
+        response = jsonify({"error": f"Batch exceeds {RECEIPT_BATCH_MAX_CONTENT_LENGTH} bytes"})
+        return add_cors_headers(response), 413
+
+    except Exception as e:
+        response = jsonify({"error": str(e)})
+        return add_cors_headers(response), 500
+
+@app.route('/receipt/jobs', methods=['POST'])
+def submit_receipt_job():
+    """Queue a receipt file or URL for background processing"""
+    try:
+        if request.is_json:
+            data = request.get_json() or {}
+            image_url = data.get('image_url')
+
+            if not image_url:
+                response = jsonify({"error": "Image URL is required"})
+                return add_cors_headers(response), 400
+
+            job = receipt_jobs.submit_url(image_url)
+        else:
+            if 'file' not in request.files:
+                response = jsonify({"error": "No file provided"})
+                return add_cors_headers(response), 400
+
+            file = request.files['file']
+            if file.filename == '':
+                response = jsonify({"error": "No file selected"})
+                return add_cors_headers(response), 400
+
+            if not receipt_service.allowed_file(file.filename):
+                response = jsonify({"error": "Invalid file type. Please upload an image (PNG, JPG, JPEG, GIF) or PDF file."})
+                return add_cors_headers(response), 400
+
+            job = receipt_jobs.submit_file(file)
+
+        response = jsonify({
+            "success": True,
+            "job_id": job["job_id"],
+            "status": job["status"],
+            "status_url": f"/receipt/jobs/{job['job_id']}",
+            "message": "Receipt queued for processing"
+        })
+        return add_cors_headers(response), 202
+
+    except Exception as e:
+        response = jsonify({"error": str(e)})
+        return add_cors_headers(response), 500
+
+@app.route('/receipt/jobs/<job_id>', methods=['GET'])
+def get_receipt_job(job_id):
+    """Get a receipt job's status; ?wait=N long-polls up to N seconds for it to finish"""
+    try:
+        wait = request.args.get('wait', 0, type=float)
+        job = receipt_jobs.wait(job_id, wait) if wait > 0 else receipt_jobs.get(job_id)
+
+        if job is None:
+            response = jsonify({"error": "Job not found"})
+            return add_cors_headers(response), 404
+
+        response = jsonify(job)
+        return add_cors_headers(response)
+
+    except Exception as e:
+        response = jsonify({"error": str(e)})
+        return add_cors_headers(response), 500
+
+def start_services():
+    """Start background workers; under gunicorn this runs in each worker after the fork"""
+    receipt_jobs.start()
+
+def shutdown_services(timeout=None):
+    """Drain background work and release upstream connections before a worker exits"""
+    receipt_jobs.stop(timeout)
+    # Unwritten points stay journaled; don't build the Wallet client just to flush them
+    points_updates.stop(flush=wallet_service.initialized()["client"])
+    upstream_client.close()
+
+startup_report.ready()
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=8080)
\ No newline at end of file
+    # Development server; production runs under gunicorn (see gunicorn.conf.py)
+    start_services()
+    app.run(host='0.0.0.0', port=int(os.environ.get('PORT', '8080')))
\ No newline at end of file
@@ -0,0 +1,157 @@
+import os
+import time
+from contextlib import contextmanager
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from tracing import NOOP_SPAN, tracer
+
+# Set (by gunicorn.conf.py) when several worker processes share one /metrics view
+PROMETHEUS_MULTIPROC_DIR = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+METRICS_CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+HTTP_REQUEST_SECONDS = Histogram(
+    'raseed_http_request_duration_seconds', 'Time spent handling HTTP requests',
+    ['route', 'method', 'status'], buckets=LATENCY_BUCKETS
+)
+HTTP_IN_FLIGHT = Gauge(
+    'raseed_http_requests_in_flight', 'HTTP requests currently being handled',
+    ['route'], multiprocess_mode='livesum'
+)
+HTTP_EXCEPTIONS = Counter(
+    'raseed_http_exceptions_total', 'Exceptions that escaped route handlers',
+    ['route', 'exception']
+)
+HTTP_REQUEST_BYTES = Histogram(
+    'raseed_http_request_size_bytes', 'HTTP request body sizes',
+    ['route'], buckets=SIZE_BUCKETS
+)
+HTTP_RESPONSE_BYTES = Histogram(
+    'raseed_http_response_size_bytes', 'HTTP response body sizes (streamed responses excluded)',
+    ['route'], buckets=SIZE_BUCKETS
+)
+
+UPSTREAM_SECONDS = Histogram(
+    'raseed_upstream_request_duration_seconds',
+    'Upstream call latency (to response headers for streamed calls)',
+    ['upstream', 'operation', 'outcome'], buckets=LATENCY_BUCKETS
+)
+UPSTREAM_IN_FLIGHT = Gauge(
+    'raseed_upstream_requests_in_flight', 'Upstream calls currently in progress',
+    ['upstream'], multiprocess_mode='livesum'
+)
+UPSTREAM_ERRORS = Counter(
+    'raseed_upstream_errors_total', 'Failed upstream calls by error type (exception name or http_<status>)',
+    ['upstream', 'operation', 'error']
+)
+UPSTREAM_BYTES = Histogram(
+    'raseed_upstream_payload_size_bytes', 'Upstream request and response body sizes',
+    ['upstream', 'direction'], buckets=SIZE_BUCKETS
+)
+
+
+class UpstreamCall:
+    """Outcome of one tracked upstream call, filled in by the caller"""
+
+    def __init__(self, upstream, operation):
+        self.upstream = upstream
+        self.operation = operation
+        self.outcome = 'ok'
+        self.span = NOOP_SPAN
+
+    def status(self, status_code):
+        """Record the HTTP status; 4xx and 5xx count as errors"""
+        self.outcome = f"{status_code // 100}xx"
+        self.span.set_attribute('http.status_code', status_code)
+        if status_code >= 400:
+            UPSTREAM_ERRORS.labels(self.upstream, self.operation, f"http_{status_code}").inc()
+            self.span.set_error(f"http_{status_code}")
+
+    def failed(self, error):
+        """Count a failure reported inside a successful response (e.g. one request in a batch)"""
+        UPSTREAM_ERRORS.labels(self.upstream, self.operation, error_label(error)).inc()
+
+    def sent(self, size):
+        """Record the request body size, if known"""
+        if size is not None:
+            UPSTREAM_BYTES.labels(self.upstream, 'request').observe(size)
+            self.span.set_attribute('request_bytes', size)
+
+    def received(self, size):
+        """Record the response body size, if known"""
+        if size is not None:
+            UPSTREAM_BYTES.labels(self.upstream, 'response').observe(size)
+            self.span.set_attribute('response_bytes', size)
+
+
+@contextmanager
+def track_upstream(upstream, operation):
+    """Time an upstream call and count it as in flight until it returns or raises; it is traced as a client span"""
+    call = UpstreamCall(upstream, operation)
+    in_flight = UPSTREAM_IN_FLIGHT.labels(upstream)
+    in_flight.inc()
+    started = time.perf_counter()
+    try:
+        with tracer.span(f"{upstream} {operation}", 'client', {'upstream': upstream, 'operation': operation}) as span:
+            call.span = span
+            yield call
+    except Exception as e:
+        call.outcome = 'error'
+        call.failed(e)
+        raise
+    finally:
+        in_flight.dec()
+        UPSTREAM_SECONDS.labels(upstream, operation, call.outcome).observe(time.perf_counter() - started)
+
+
+def error_label(error):
+    """Name an error by its HTTP status when it carries one, else by exception type"""
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    return f"http_{status}" if isinstance(status, int) else type(error).__name__
+
+
+def body_size(body):
+    """Length of a request body, or None if it can't be known without reading it"""
+    if body is None:
+        return 0
+    try:
+        return len(body)
+    except TypeError:
+        return None
+
+
+def request_started(route):
+    """Mark a request as in flight; returns the start time to pass to request_finished"""
+    HTTP_IN_FLIGHT.labels(route).inc()
+    return time.perf_counter()
+
+
+def request_finished(route, method, status, started, request_size=None, response_size=None):
+    """Record a handled request's latency and payload sizes"""
+    HTTP_REQUEST_SECONDS.labels(route, method, str(status)).observe(time.perf_counter() - started)
+    if request_size:
+        HTTP_REQUEST_BYTES.labels(route).observe(request_size)
+    if response_size is not None:
+        HTTP_RESPONSE_BYTES.labels(route).observe(response_size)
+
+
+def request_closed(route, error=None):
+    """Take a request out of the in-flight gauge, counting any exception that escaped"""
+    HTTP_IN_FLIGHT.labels(route).dec()
+    if error is not None:
+        HTTP_EXCEPTIONS.labels(route, type(error).__name__).inc()
+
+
+def render_metrics():
+    """Return the current metrics in Prometheus text format"""
+    if PROMETHEUS_MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
@@ -0,0 +1,364 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from metrics import track_upstream
+
+# Write-behind loyalty points settings
+WALLET_POINTS_DB = os.environ.get(
+    'WALLET_POINTS_DB', os.path.join(tempfile.gettempdir(), 'raseed-wallet-points.db')
+)
+WALLET_POINTS_FLUSH_INTERVAL = float(os.environ.get('WALLET_POINTS_FLUSH_INTERVAL', '10'))
+# Flush early once this many deltas are waiting
+WALLET_POINTS_FLUSH_THRESHOLD = int(os.environ.get('WALLET_POINTS_FLUSH_THRESHOLD', '500'))
+WALLET_POINTS_BATCH_SIZE = int(os.environ.get('WALLET_POINTS_BATCH_SIZE', '50'))
+WALLET_POINTS_MAX_ATTEMPTS = int(os.environ.get('WALLET_POINTS_MAX_ATTEMPTS', '5'))
+
+# Only one worker process flushes at a time; a crashed holder's lease lapses after this long
+_FLUSH_LEASE_SECONDS = 120
+
+# Statuses worth retrying on a later flush (quota exhaustion and server errors)
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS points_pending (
+    object_id TEXT PRIMARY KEY,
+    delta INTEGER NOT NULL DEFAULT 0,
+    balance INTEGER,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS points_pending_due ON points_pending (status, delta);
+CREATE TABLE IF NOT EXISTS points_flush_lease (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    owner TEXT,
+    expires_at REAL NOT NULL
+);
+INSERT OR IGNORE INTO points_flush_lease (id, owner, expires_at) VALUES (1, NULL, 0);
+"""
+
+
+class PointsUpdateQueue:
+    """
+    Accept points deltas per loyalty object and write them to the Wallet API
+    in the background. Deltas are merged into one durable SQLite row per
+    object, so any number of updates between flushes becomes a single PATCH
+    of the object's loyaltyPoints balance.
+    """
+
+    def __init__(self, wallet_service, db_path=WALLET_POINTS_DB, flush_interval=WALLET_POINTS_FLUSH_INTERVAL,
+                 flush_threshold=WALLET_POINTS_FLUSH_THRESHOLD, batch_size=WALLET_POINTS_BATCH_SIZE,
+                 max_attempts=WALLET_POINTS_MAX_ATTEMPTS):
+        self.wallet_service = wallet_service
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+
+        self._owner = uuid.uuid4().hex
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._started = False
+        self._stopping = threading.Event()
+
+        self._stats_lock = threading.Lock()
+        self._unflushed = 0
+        self.deltas_accepted = 0
+        self.flushes = 0
+        self.patches_sent = 0
+        self.patch_failures = 0
+        self.last_flush_ms = None
+
+        self._db().executescript(_SCHEMA)
+        os.register_at_fork(after_in_child=self._after_fork)
+
+        # Deltas journaled before a restart are flushed without waiting for new ones
+        if self._db().execute("SELECT 1 FROM points_pending WHERE status = 'pending' AND delta != 0 LIMIT 1").fetchone():
+            self.start()
+
+    def add(self, object_id, delta):
+        """Durably record a points delta for a loyalty object and schedule a flush"""
+        if not object_id:
+            return {"error": "object_id is required"}
+        try:
+            delta = int(delta)
+        except (TypeError, ValueError):
+            return {"error": "delta must be an integer"}
+
+        db = self._db()
+        with db:
+            # A new delta gives a previously failed object another round of attempts
+            db.execute(
+                "INSERT INTO points_pending (object_id, delta, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(object_id) DO UPDATE SET delta = delta + excluded.delta, "
+                "status = 'pending', attempts = 0, updated_at = excluded.updated_at",
+                (object_id, delta, time.time())
+            )
+            pending_delta = db.execute(
+                "SELECT delta FROM points_pending WHERE object_id = ?", (object_id,)
+            ).fetchone()[0]
+
+        with self._stats_lock:
+            self.deltas_accepted += 1
+            self._unflushed += 1
+            flush_now = self._unflushed >= self.flush_threshold
+
+        self.start()
+        if flush_now:
+            self._wakeup.set()
+        return {"success": True, "object_id": object_id, "pending_delta": pending_delta}
+
+    def record_balance(self, object_id, balance):
+        """Remember an object's current balance (e.g. at creation) so flushes needn't fetch it"""
+        db = self._db()
+        with db:
+            db.execute(
+                "INSERT INTO points_pending (object_id, balance, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(object_id) DO UPDATE SET balance = excluded.balance",
+                (object_id, int(balance), time.time())
+            )
+
+    def start(self):
+        """Start the background flusher; safe to call more than once"""
+        with self._start_lock:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self._flush_loop, name="wallet-points-flush", daemon=True).start()
+
+    def stop(self, flush=True):
+        """Stop the background flusher, optionally writing out pending deltas first"""
+        self._stopping.set()
+        self._wakeup.set()
+        if flush:
+            self.flush()
+
+    def flush(self):
+        """Write every pending object's merged balance to the Wallet API"""
+        with self._flush_lock:
+            started = time.perf_counter()
+            with self._stats_lock:
+                self._unflushed = 0
+
+            # Another worker process is flushing; its writes cover our deltas too
+            if not self._acquire_lease():
+                return 0
+            try:
+                rows = self._db().execute(
+                    "SELECT object_id, delta, balance FROM points_pending "
+                    "WHERE status = 'pending' AND delta != 0 ORDER BY updated_at"
+                ).fetchall()
+                if rows and self.wallet_service.service:
+                    for i in range(0, len(rows), self.batch_size):
+                        if not self._acquire_lease():
+                            break
+                        self._flush_batch(rows[i:i + self.batch_size])
+            finally:
+                self._release_lease()
+
+            with self._stats_lock:
+                self.flushes += 1
+                self.last_flush_ms = round((time.perf_counter() - started) * 1000, 2)
+            return len(rows)
+
+    def stats(self):
+        """Return write-behind counters and the current backlog"""
+        backlog = dict(self._db().execute(
+            "SELECT status, COUNT(*) FROM points_pending WHERE delta != 0 GROUP BY status"
+        ).fetchall())
+        with self._stats_lock:
+            return {
+                "pending_objects": backlog.get('pending', 0),
+                "failed_objects": backlog.get('failed', 0),
+                "deltas_accepted": self.deltas_accepted,
+                "patches_sent": self.patches_sent,
+                "patch_failures": self.patch_failures,
+                "flushes": self.flushes,
+                "last_flush_ms": self.last_flush_ms
+            }
+
+    def _acquire_lease(self):
+        now = time.time()
+        db = self._db()
+        with db:
+            cursor = db.execute(
+                "UPDATE points_flush_lease SET owner = ?, expires_at = ? "
+                "WHERE id = 1 AND (owner = ? OR expires_at < ?)",
+                (self._owner, now + _FLUSH_LEASE_SECONDS, self._owner, now)
+            )
+        return cursor.rowcount == 1
+
+    def _release_lease(self):
+        db = self._db()
+        with db:
+            db.execute("UPDATE points_flush_lease SET expires_at = 0 WHERE id = 1 AND owner = ?", (self._owner,))
+
+    def _flush_loop(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if self._stopping.is_set():
+                return
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Points flush failed: {e}")
+
+    def _flush_batch(self, rows):
+        unknown = [object_id for object_id, _, balance in rows if balance is None]
+        balances, errors = self._fetch_balances(unknown) if unknown else ({}, {})
+
+        updates = []
+        for object_id, delta, balance in rows:
+            if object_id in errors:
+                continue
+            if balance is None:
+                balance = balances[object_id]
+            updates.append((object_id, delta, balance + delta))
+
+        outcomes = self._execute_batch(
+            'batch_object_patch',
+            [(object_id, self._patch_request(object_id, new_balance)) for object_id, _, new_balance in updates]
+        )
+
+        results = [(object_id, None, None) + errors[object_id] for object_id in errors]
+        for object_id, delta, new_balance in updates:
+            exception = outcomes.get(object_id)
+            if exception is None:
+                results.append((object_id, delta, new_balance, 'ok', None))
+            else:
+                results.append((object_id, None, None) + self._classify(exception))
+        self._record(results)
+
+    def _fetch_balances(self, object_ids):
+        service = self.wallet_service.service
+        responses = {}
+        outcomes = self._execute_batch(
+            'batch_object_get',
+            [(object_id, service.loyaltyobject().get(resourceId=object_id)) for object_id in object_ids],
+            responses
+        )
+
+        balances, errors = {}, {}
+        for object_id in object_ids:
+            exception = outcomes.get(object_id)
+            if exception is not None:
+                errors[object_id] = self._classify(exception)
+                continue
+            balance = (responses.get(object_id) or {}).get('loyaltyPoints', {}).get('balance', {})
+            try:
+                balances[object_id] = int(balance.get('int', balance.get('stringBalance', 0)))
+            except (TypeError, ValueError):
+                errors[object_id] = ('failed', f"Balance is not an integer: {balance}")
+        return balances, errors
+
+    def _patch_request(self, object_id, new_balance):
+        body = {
+            'loyaltyPoints': {
+                'balance': {
+                    'kind': 'walletobjects#loyaltyPointsBalance',
+                    'stringBalance': str(new_balance)
+                }
+            }
+        }
+        return self.wallet_service.service.loyaltyobject().patch(resourceId=object_id, body=body)
+
+    def _execute_batch(self, operation, requests, responses=None):
+        outcomes = {}
+
+        def on_response(request_id, response, exception):
+            outcomes[request_id] = exception
+            if responses is not None:
+                responses[request_id] = response
+
+        if not requests:
+            return outcomes
+
+        batch = self.wallet_service.service.new_batch_http_request(callback=on_response)
+        for object_id, request in requests:
+            batch.add(request, request_id=object_id)
+        try:
+            with track_upstream('wallet', operation) as call:
+                batch.execute(http=self._http())
+        except Exception as e:
+            # The whole batch failed to send; every request gets another attempt
+            return {object_id: e for object_id, _ in requests}
+        for exception in outcomes.values():
+            if exception is not None:
+                call.failed(exception)
+        return outcomes
+
+    @staticmethod
+    def _classify(exception):
+        from googleapiclient.errors import HttpError
+
+        if isinstance(exception, HttpError) and exception.status_code not in RETRYABLE_STATUSES:
+            return 'failed', str(exception)
+        return 'retry', str(exception)
+
+    def _record(self, results):
+        db = self._db()
+        with db:
+            for object_id, delta, new_balance, outcome, error in results:
+                if outcome == 'ok':
+                    # Subtract only what was written; deltas added meanwhile stay pending
+                    db.execute(
+                        "UPDATE points_pending SET delta = delta - ?, balance = ?, attempts = 0, "
+                        "last_error = NULL, updated_at = ? WHERE object_id = ?",
+                        (delta, new_balance, time.time(), object_id)
+                    )
+                elif outcome == 'retry':
+                    db.execute(
+                        "UPDATE points_pending SET attempts = attempts + 1, last_error = ?, "
+                        "status = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END "
+                        "WHERE object_id = ?",
+                        (error, self.max_attempts, object_id)
+                    )
+                else:
+                    db.execute(
+                        "UPDATE points_pending SET attempts = attempts + 1, last_error = ?, status = 'failed' "
+                        "WHERE object_id = ?",
+                        (error, object_id)
+                    )
+
+        with self._stats_lock:
+            self.patches_sent += sum(1 for result in results if result[3] == 'ok')
+            self.patch_failures += sum(1 for result in results if result[3] != 'ok')
+
+    def _after_fork(self):
+        # Forked workers get their own SQLite connection, flusher thread and lease identity
+        self._owner = uuid.uuid4().hex
+        self._local = threading.local()
+        self._flush_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        was_started, self._started = self._started, False
+        if was_started:
+            self.start()
+
+    def _http(self):
+        # httplib2 is not thread-safe, so each thread gets its own authorized transport
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            import google_auth_httplib2
+            import httplib2
+
+            http = google_auth_httplib2.AuthorizedHttp(self.wallet_service.credentials, http=httplib2.Http())
+            self._local.http = http
+        return http
+
+    def _db(self):
+        # SQLite connections can't be shared across threads; keep one per thread
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.db_path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+        return db
@@ -0,0 +1,271 @@
+import hmac
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+# Access token for the /debug/profiler endpoints and the per-request header; empty disables both
+PROFILER_TOKEN = os.environ.get('PROFILER_TOKEN', '')
+# Fraction of requests profiled at startup; can be changed at runtime through /debug/profiler
+PROFILER_SAMPLE_RATE = float(os.environ.get('PROFILER_SAMPLE_RATE', '0'))
+# Wall-clock sampling interval
+PROFILER_INTERVAL_MS = float(os.environ.get('PROFILER_INTERVAL_MS', '5'))
+# Where each worker writes its collapsed stacks
+PROFILER_OUTPUT_DIR = os.environ.get(
+    'PROFILER_OUTPUT_DIR', os.path.join(tempfile.gettempdir(), 'raseed-profiles')
+)
+# Runtime settings shared by every worker process
+PROFILER_CONTROL_FILE = os.environ.get(
+    'PROFILER_CONTROL_FILE', os.path.join(tempfile.gettempdir(), 'raseed-profiler.json')
+)
+# How often workers pick up new settings and write out their samples
+PROFILER_FLUSH_INTERVAL = float(os.environ.get('PROFILER_FLUSH_INTERVAL', '5'))
+
+# Start of the current server run, inherited by every worker; control files older than it are ignored
+RUN_STARTED_ENV = 'PROFILER_RUN_STARTED'
+
+# Requests carrying this header with the profiler token are always profiled
+PROFILE_HEADER = 'X-Profile-Request'
+MAX_STACK_DEPTH = 128
+
+
+def mark_run_started():
+    """Record when this server run started, once, so workers forked or spawned later share it"""
+    return float(os.environ.setdefault(RUN_STARTED_ENV, repr(time.time())))
+
+
+class SamplingProfiler:
+    """
+    Wall-clock stack sampler for live requests. A profiled request registers
+    its thread; while any are registered, a background thread records their
+    stacks every PROFILER_INTERVAL_MS, so time spent blocked on sockets shows
+    up next to CPU work. Samples are aggregated as collapsed stacks
+    ("route;file:function;... count"), the input format of flamegraph.pl and
+    speedscope. When no request is profiled, the only cost is one comparison
+    per request and a control-file check at most every PROFILER_FLUSH_INTERVAL.
+    """
+
+    def __init__(self, token=PROFILER_TOKEN, sample_rate=PROFILER_SAMPLE_RATE, interval_ms=PROFILER_INTERVAL_MS,
+                 output_dir=PROFILER_OUTPUT_DIR, control_file=PROFILER_CONTROL_FILE,
+                 flush_interval=PROFILER_FLUSH_INTERVAL):
+        self.token = token
+        self.sample_rate = sample_rate
+        self.interval = interval_ms / 1000
+        self.output_dir = output_dir
+        self.control_file = control_file
+        self.flush_interval = flush_interval
+        self.session = None
+        self.run_started = mark_run_started()
+        self._reset_state()
+
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _reset_state(self):
+        self._lock = threading.Lock()
+        self._targets = {}
+        self._counts = {}
+        self._labels = {}
+        self._dirty = False
+        self._sampler = None
+        self._next_check = 0.0
+        self._control_mtime = None
+        self.samples = 0
+        self.profiled_requests = 0
+
+    def wants(self, header_value):
+        """Decide whether to profile a request, given its X-Profile-Request header"""
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + self.flush_interval
+            self._load_control()
+        if header_value and self.authorized(header_value):
+            return True
+        return self.sample_rate > 0 and (self.sample_rate >= 1 or random.random() < self.sample_rate)
+
+    def begin(self, label, ident=None):
+        """Start sampling the current (or given) thread under a label, e.g. the route"""
+        ident = ident or threading.get_ident()
+        with self._lock:
+            entry = self._targets.get(ident)
+            # Several requests can share a thread on an event loop; keep the thread sampled until all finish
+            self._targets[ident] = (label, entry[1] + 1 if entry else 1)
+            self.profiled_requests += 1
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample_loop, name="profiler-sampler", daemon=True)
+                self._sampler.start()
+        return ident
+
+    def end(self, ident):
+        """Stop sampling a thread registered with begin()"""
+        with self._lock:
+            entry = self._targets.get(ident)
+            if entry is None:
+                return
+            if entry[1] > 1:
+                self._targets[ident] = (entry[0], entry[1] - 1)
+            else:
+                del self._targets[ident]
+
+    def configure(self, sample_rate=None, reset=False):
+        """Change the sample rate for every worker, optionally starting a fresh profile"""
+        settings = self._read_control() or {"sample_rate": self.sample_rate, "session": self.session}
+        if sample_rate is not None:
+            settings["sample_rate"] = max(0.0, min(1.0, float(sample_rate)))
+        if reset or not settings.get("session"):
+            settings["session"] = uuid.uuid4().hex[:12]
+        directory = os.path.dirname(os.path.abspath(self.control_file))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(settings, f)
+        os.replace(tmp_path, self.control_file)
+        self._next_check = 0.0
+        self._load_control()
+        return self.status()
+
+    def status(self):
+        """Report settings and sample counts for this worker"""
+        with self._lock:
+            return {
+                "sample_rate": self.sample_rate,
+                "session": self.session,
+                "interval_ms": self.interval * 1000,
+                "sampling": bool(self._targets),
+                "profiled_requests": self.profiled_requests,
+                "samples": self.samples,
+                "distinct_stacks": len(self._counts),
+                "output_dir": self.output_dir
+            }
+
+    def collapsed(self):
+        """Merge every worker's samples for the current session into collapsed-stack text"""
+        self.flush()
+        merged = {}
+        prefix = f"profile-{self.session or 'local'}-"
+        try:
+            names = [name for name in os.listdir(self.output_dir) if name.startswith(prefix)]
+        except OSError:
+            names = []
+        for name in names:
+            try:
+                with open(os.path.join(self.output_dir, name), 'r', encoding='utf-8') as f:
+                    for line in f:
+                        stack, _, count = line.rstrip('\n').rpartition(' ')
+                        if stack and count.isdigit():
+                            merged[stack] = merged.get(stack, 0) + int(count)
+            except OSError:
+                continue
+        return ''.join(f"{stack} {count}\n" for stack, count in sorted(merged.items()))
+
+    def flush(self):
+        """Write this worker's samples to its file in the output directory"""
+        with self._lock:
+            if not self._dirty:
+                return
+            lines = ''.join(f"{stack} {count}\n" for stack, count in self._counts.items())
+            self._dirty = False
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = self._output_path()
+        fd, tmp_path = tempfile.mkstemp(dir=self.output_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(lines)
+        os.replace(tmp_path, path)
+
+    def authorized(self, supplied):
+        """Check a token supplied to the control endpoints"""
+        if not self.token or not supplied:
+            return False
+        return hmac.compare_digest(supplied.encode('utf-8'), self.token.encode('utf-8'))
+
+    def _output_path(self):
+        return os.path.join(self.output_dir, f"profile-{self.session or 'local'}-{os.getpid()}.collapsed")
+
+    def _sample_loop(self):
+        last_flush = time.monotonic()
+        while True:
+            with self._lock:
+                targets = dict(self._targets)
+                if not targets:
+                    # Nothing to sample; let the thread go until the next profiled request
+                    self._sampler = None
+                    break
+            frames = sys._current_frames()
+            stacks = []
+            for ident, (label, _) in targets.items():
+                frame = frames.get(ident)
+                if frame is not None:
+                    stacks.append(self._collapse(label, frame))
+            del frames
+            with self._lock:
+                for stack in stacks:
+                    self._counts[stack] = self._counts.get(stack, 0) + 1
+                self.samples += len(stacks)
+                self._dirty = self._dirty or bool(stacks)
+            if time.monotonic() - last_flush >= self.flush_interval:
+                last_flush = time.monotonic()
+                self._flush_quietly()
+            time.sleep(self.interval)
+        self._flush_quietly()
+
+    def _collapse(self, label, frame):
+        names = []
+        labels = self._labels
+        while frame is not None and len(names) < MAX_STACK_DEPTH:
+            code = frame.f_code
+            name = labels.get(code)
+            if name is None:
+                name = labels[code] = f"{os.path.basename(code.co_filename)}:{code.co_name}".replace(';', ',').replace(' ', '_')
+            names.append(name)
+            frame = frame.f_back
+        names.append(label.replace(';', ',').replace(' ', '_'))
+        return ';'.join(reversed(names))
+
+    def _flush_quietly(self):
+        try:
+            self.flush()
+        except OSError as e:
+            print(f"Could not write profile samples: {e}")
+
+    def _read_control(self):
+        try:
+            with open(self.control_file, 'r', encoding='utf-8') as f:
+                # Settings left by an earlier run must not override this run's PROFILER_SAMPLE_RATE
+                if os.fstat(f.fileno()).st_mtime < self.run_started:
+                    return None
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _load_control(self):
+        try:
+            mtime = os.stat(self.control_file).st_mtime_ns
+        except OSError:
+            return
+        if mtime == self._control_mtime:
+            return
+        self._control_mtime = mtime
+        settings = self._read_control()
+        if settings is None:
+            return
+        self.sample_rate = float(settings.get("sample_rate", self.sample_rate))
+        session = settings.get("session")
+        if session != self.session:
+            # A new session starts an empty profile in every worker
+            with self._lock:
+                try:
+                    os.remove(self._output_path())
+                except OSError:
+                    pass
+                self.session = session
+                self._counts = {}
+                self._dirty = False
+                self.samples = 0
+                self.profiled_requests = 0
+
+    def _after_fork(self):
+        # Forked workers sample their own threads and write their own files
+        self._reset_state()
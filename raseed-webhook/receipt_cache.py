@@ -0,0 +1,153 @@
+import json
+import os
+import tempfile
+import threading
+import time
+
+# Disk-backed receipt result cache settings
+RECEIPT_CACHE_DIR = os.environ.get(
+    'RECEIPT_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'raseed-receipt-cache')
+)
+RECEIPT_CACHE_MAX_BYTES = int(os.environ.get('RECEIPT_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+RECEIPT_CACHE_TTL_SECONDS = float(os.environ.get('RECEIPT_CACHE_TTL_SECONDS', '0'))  # 0 = never expire
+
+
+class ReceiptResultCache:
+    def __init__(self, cache_dir=RECEIPT_CACHE_DIR, max_bytes=RECEIPT_CACHE_MAX_BYTES,
+                 ttl_seconds=RECEIPT_CACHE_TTL_SECONDS):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._bytes = sum(size for _, _, size in self._scan())
+        except OSError as e:
+            print(f"Receipt cache disabled: {e}")
+            self.cache_dir = None
+            self._bytes = 0
+
+    def get(self, digest):
+        """Return the cached result for a content hash, or None on a miss"""
+        if not self.cache_dir:
+            return None
+
+        path = self._path(digest)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            stored_at = entry["stored_at"]
+            if self._expired(stored_at):
+                self._discard(path)
+                self._count('misses')
+                return None
+            # Bump the mtime so eviction is least-recently-used; expiry uses stored_at, not mtime
+            os.utime(path)
+        except (OSError, ValueError, TypeError, KeyError):
+            self._count('misses')
+            return None
+
+        self._count('hits')
+        return entry["result"]
+
+    def set(self, digest, result):
+        """Store a JSON-serializable result under a content hash"""
+        if not self.cache_dir:
+            return
+
+        try:
+            encoded = json.dumps({"stored_at": time.time(), "result": result}).encode('utf-8')
+        except (TypeError, ValueError):
+            return
+        if len(encoded) > self.max_bytes:
+            return
+
+        path = self._path(digest)
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(encoded)
+            replaced = self._size(path)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Receipt cache write failed: {e}")
+            return
+
+        with self._lock:
+            self._bytes += len(encoded) - replaced
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def stats(self):
+        """Return cache counters and current usage"""
+        with self._lock:
+            return {
+                "enabled": bool(self.cache_dir),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _path(self, digest):
+        return os.path.join(self.cache_dir, f"{digest}.json")
+
+    def _expired(self, stored_at):
+        return self.ttl_seconds > 0 and time.time() - stored_at > self.ttl_seconds
+
+    def _scan(self):
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith('.json'):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, entry.path, stat.st_size))
+        return entries
+
+    def _evict(self):
+        # Caller must hold self._lock. Rescan so entries written by other
+        # worker processes sharing the directory are accounted for too.
+        # mtime is the last access here; expired entries are dropped when read.
+        entries = sorted(self._scan())
+        total = sum(size for _, _, size in entries)
+        for _, path, size in entries:
+            if total <= self.max_bytes:
+                break
+            if self._unlink(path):
+                total -= size
+                self.evictions += 1
+        self._bytes = total
+
+    def _discard(self, path):
+        size = self._size(path)
+        if self._unlink(path):
+            with self._lock:
+                self._bytes -= size
+
+    @staticmethod
+    def _size(path):
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+
+    @staticmethod
+    def _unlink(path):
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
@@ -0,0 +1,283 @@
+import json
+import os
+import queue
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from werkzeug.datastructures import FileStorage
+
+# Background receipt job settings
+RECEIPT_JOBS_DIR = os.environ.get(
+    'RECEIPT_JOBS_DIR', os.path.join(tempfile.gettempdir(), 'raseed-receipt-jobs')
+)
+RECEIPT_JOB_WORKERS = int(os.environ.get('RECEIPT_JOB_WORKERS', '4'))
+RECEIPT_JOB_TTL_SECONDS = float(os.environ.get('RECEIPT_JOB_TTL_SECONDS', '3600'))
+# Expired jobs are deleted, and queued or stale jobs no worker holds are picked up, this often
+RECEIPT_JOB_CLEANUP_INTERVAL = float(os.environ.get('RECEIPT_JOB_CLEANUP_INTERVAL', '60'))
+# Jobs left "running" longer than this (e.g. after a crash) are picked up again
+RECEIPT_JOB_STALE_SECONDS = float(os.environ.get('RECEIPT_JOB_STALE_SECONDS', '300'))
+RECEIPT_JOB_MAX_WAIT = float(os.environ.get('RECEIPT_JOB_MAX_WAIT', '30'))
+
+FINISHED_STATUSES = ('succeeded', 'failed')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    source TEXT NOT NULL,
+    content_type TEXT,
+    payload_path TEXT,
+    result TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, updated_at);
+"""
+
+
+class ReceiptJobQueue:
+    def __init__(self, receipt_service, jobs_dir=RECEIPT_JOBS_DIR, workers=RECEIPT_JOB_WORKERS,
+                 ttl_seconds=RECEIPT_JOB_TTL_SECONDS, cleanup_interval=RECEIPT_JOB_CLEANUP_INTERVAL):
+        self.receipt_service = receipt_service
+        self.jobs_dir = jobs_dir
+        self.payload_dir = os.path.join(jobs_dir, 'payloads')
+        self.db_path = os.path.join(jobs_dir, 'jobs.db')
+        self.workers = workers
+        self.ttl_seconds = ttl_seconds
+        self.cleanup_interval = cleanup_interval
+
+        self._local = threading.local()
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+        self._finished = threading.Condition()
+        self._start_lock = threading.Lock()
+        self._started = False
+        self._stopping = threading.Event()
+        self._threads = []
+
+        os.makedirs(self.payload_dir, exist_ok=True)
+        self._db().executescript(_SCHEMA)
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def submit_file(self, file):
+        """Persist an uploaded receipt file and queue it for processing"""
+        job_id = uuid.uuid4().hex
+        payload_path = os.path.join(self.payload_dir, job_id)
+        file.save(payload_path)
+        return self._insert(job_id, 'file', file.filename, file.content_type, payload_path)
+
+    def submit_url(self, image_url):
+        """Queue a receipt URL for processing"""
+        return self._insert(uuid.uuid4().hex, 'url', image_url, None, None)
+
+    def get(self, job_id):
+        """Return a job's public status, or None if it doesn't exist (or has expired)"""
+        row = self._db().execute(
+            "SELECT id, status, kind, source, result, created_at, updated_at, finished_at FROM jobs WHERE id = ?",
+            (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        job = {
+            "job_id": row[0],
+            "status": row[1],
+            "type": row[2],
+            "source": row[3],
+            "created_at": row[5],
+            "updated_at": row[6],
+            "finished_at": row[7]
+        }
+        if row[4] is not None:
+            job["result"] = json.loads(row[4])
+        return job
+
+    def wait(self, job_id, timeout):
+        """Long-poll: block up to timeout seconds for a job to finish"""
+        deadline = time.monotonic() + min(timeout, RECEIPT_JOB_MAX_WAIT)
+        while True:
+            job = self.get(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job["status"] in FINISHED_STATUSES or remaining <= 0:
+                return job
+            # Jobs finished by another worker process don't notify us, so recheck regularly
+            with self._finished:
+                self._finished.wait(min(remaining, 0.5))
+
+    def start(self):
+        """Start worker and maintenance threads and pick up unfinished jobs; safe to call more than once"""
+        with self._start_lock:
+            if self._started:
+                return
+            self._started = True
+
+            self._requeue_pending()
+            for index in range(self.workers):
+                self._spawn(self._work, f"receipt-job-{index}")
+            self._spawn(self._maintenance_loop, "receipt-job-maintenance")
+
+    def stop(self, timeout=None):
+        """Stop accepting work and wait for in-progress jobs to finish"""
+        self._stopping.set()
+        for _ in range(self.workers):
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def stats(self):
+        """Return job counts by status"""
+        rows = self._db().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {"queued_locally": self._queue.qsize(), "jobs": dict(rows)}
+
+    def cleanup(self):
+        """Delete finished jobs older than the TTL, along with any leftover payloads"""
+        cutoff = time.time() - self.ttl_seconds
+        db = self._db()
+        expired = db.execute(
+            "SELECT id, payload_path FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?",
+            (cutoff,)
+        ).fetchall()
+        for job_id, payload_path in expired:
+            self._remove_payload(payload_path)
+            db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        db.commit()
+        return len(expired)
+
+    def _insert(self, job_id, kind, source, content_type, payload_path):
+        now = time.time()
+        db = self._db()
+        db.execute(
+            "INSERT INTO jobs (id, status, kind, source, content_type, payload_path, created_at, updated_at) "
+            "VALUES (?, 'queued', ?, ?, ?, ?, ?, ?)",
+            (job_id, kind, source, content_type, payload_path, now, now)
+        )
+        db.commit()
+
+        self.start()
+        self._enqueue(job_id)
+        return self.get(job_id)
+
+    def _requeue_pending(self):
+        stale_before = time.time() - RECEIPT_JOB_STALE_SECONDS
+        rows = self._db().execute(
+            "SELECT id FROM jobs WHERE status = 'queued' OR (status = 'running' AND updated_at < ?) "
+            "ORDER BY created_at",
+            (stale_before,)
+        ).fetchall()
+        for (job_id,) in rows:
+            self._enqueue(job_id)
+
+    def _enqueue(self, job_id):
+        # Jobs already waiting here aren't queued twice when the database is rescanned
+        with self._pending_lock:
+            if job_id in self._pending:
+                return
+            self._pending.add(job_id)
+        self._queue.put(job_id)
+
+    def _claim(self, job_id):
+        # Atomically move the job to running so only one worker (in any process) takes it
+        now = time.time()
+        stale_before = now - RECEIPT_JOB_STALE_SECONDS
+        db = self._db()
+        cursor = db.execute(
+            "UPDATE jobs SET status = 'running', updated_at = ? "
+            "WHERE id = ? AND (status = 'queued' OR (status = 'running' AND updated_at < ?))",
+            (now, job_id, stale_before)
+        )
+        db.commit()
+        if cursor.rowcount != 1:
+            return None
+        return db.execute(
+            "SELECT kind, source, content_type, payload_path FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+
+    def _work(self):
+        while True:
+            job_id = self._queue.get()
+            if job_id is None:
+                return
+            with self._pending_lock:
+                self._pending.discard(job_id)
+
+            claimed = self._claim(job_id)
+            if claimed is None:
+                continue
+
+            try:
+                result = self._run(*claimed)
+            except Exception as e:
+                result = {"error": f"Unexpected error: {str(e)}"}
+            self._finish(job_id, result, claimed[3])
+
+    def _run(self, kind, source, content_type, payload_path):
+        if kind == 'url':
+            return self.receipt_service.process_receipt_from_url(source)
+
+        with open(payload_path, 'rb') as stream:
+            file = FileStorage(stream=stream, filename=source, content_type=content_type)
+            return self.receipt_service.process_receipt(file)
+
+    def _finish(self, job_id, result, payload_path):
+        now = time.time()
+        status = 'succeeded' if result.get("success") else 'failed'
+        db = self._db()
+        db.execute(
+            "UPDATE jobs SET status = ?, result = ?, updated_at = ?, finished_at = ?, payload_path = NULL WHERE id = ?",
+            (status, json.dumps(result), now, now, job_id)
+        )
+        db.commit()
+        self._remove_payload(payload_path)
+
+        with self._finished:
+            self._finished.notify_all()
+
+    def _maintenance_loop(self):
+        # Jobs queued or running in a worker that died are only in the database
+        while not self._stopping.wait(self.cleanup_interval):
+            try:
+                self._requeue_pending()
+                self.cleanup()
+            except sqlite3.Error as e:
+                print(f"Receipt job maintenance failed: {e}")
+
+    def _spawn(self, target, name):
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _after_fork(self):
+        # Worker processes forked from a preloaded app must not reuse the parent's
+        # SQLite connection, and the parent's threads don't exist in the child
+        self._local = threading.local()
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+        self._finished = threading.Condition()
+        self._start_lock = threading.Lock()
+        self._threads = []
+        was_started, self._started = self._started, False
+        if was_started:
+            self.start()
+
+    def _db(self):
+        # SQLite connections can't be shared across threads; keep one per thread
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.db_path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+        return db
+
+    @staticmethod
+    def _remove_payload(payload_path):
+        if payload_path and os.path.exists(payload_path):
+            try:
+                os.remove(payload_path)
+            except OSError:
+                pass
@@ -2,17 +2,50 @@ import requests
 import os
 from werkzeug.utils import secure_filename
 import mimetypes
+from http_client import upstream_client
+from receipt_cache import ReceiptResultCache
+from streaming_upload import BoundedReader, MultipartFileBody, UploadTooLargeError, spool_upload
+from image_preprocessor import ReceiptImagePreprocessor
+from tracing import in_current_context, tracer
+from concurrent.futures import ThreadPoolExecutor
+
+# Batch processing limits
+RECEIPT_BATCH_CONCURRENCY = int(os.environ.get('RECEIPT_BATCH_CONCURRENCY', '8'))
+RECEIPT_BATCH_MAX_ITEMS = int(os.environ.get('RECEIPT_BATCH_MAX_ITEMS', '100'))
+
+# Limits for receipts downloaded from a URL
+RECEIPT_URL_MAX_BYTES = int(os.environ.get('RECEIPT_URL_MAX_BYTES', str(16 * 1024 * 1024)))
+RECEIPT_URL_FETCH_TIMEOUT = float(os.environ.get('RECEIPT_URL_FETCH_TIMEOUT', '30'))
+
+# Receipt processing Cloud Function
+RECEIPT_PROCESSING_URL = os.environ.get(
+    'RECEIPT_PROCESSING_URL', 'https://us-central1-raseed-467016.cloudfunctions.net/process_receipt'
+)
 
 class ReceiptService:
     def __init__(self):
-        self.receipt_processing_url = "https://us-central1-raseed-467016.cloudfunctions.net/process_receipt"
+        self.receipt_processing_url = RECEIPT_PROCESSING_URL
         self.allowed_extensions = {'png', 'jpg', 'jpeg', 'gif', 'pdf'}
-    
+        self.allowed_content_types = {'image/png', 'image/jpeg', 'image/jpg', 'image/gif', 'application/pdf'}
+        self.url_max_bytes = RECEIPT_URL_MAX_BYTES
+        self.url_fetch_timeout = RECEIPT_URL_FETCH_TIMEOUT
+        self.batch_concurrency = RECEIPT_BATCH_CONCURRENCY
+        self.batch_max_items = RECEIPT_BATCH_MAX_ITEMS
+        self.result_cache = ReceiptResultCache()
+        self.preprocessor = ReceiptImagePreprocessor()
+
     def allowed_file(self, filename):
         """Check if the uploaded file has an allowed extension"""
         return '.' in filename and \
                filename.rsplit('.', 1)[1].lower() in self.allowed_extensions
-    
+
+    def stats(self):
+        """Return result cache and image preprocessing counters"""
+        return {
+            "result_cache": self.result_cache.stats(),
+            "preprocessing": self.preprocessor.stats()
+        }
+
     def process_receipt(self, file):
         """Process a receipt by sending it to the external API"""
         try:
@@ -20,75 +53,126 @@ class ReceiptService:
                 return {
                     "error": "Invalid file type. Please upload an image (PNG, JPG, JPEG, GIF) or PDF file."
                 }
-            
-            # Prepare the file for upload
-            files = {
-                'file': (secure_filename(file.filename), file.read(), file.content_type)
-            }
-            
-            # Send the file to the receipt processing API
-            response = requests.post(
-                self.receipt_processing_url,
-                files=files,
-                timeout=30  # 30 second timeout
-            )
-            
-            if response.status_code == 200:
-                return {
-                    "success": True,
-                    "data": response.json() if response.headers.get('content-type', '').startswith('application/json') else response.text
-                }
-            else:
-                return {
-                    "error": f"Receipt processing failed with status code: {response.status_code}",
-                    "details": response.text
-                }
-                
+
+            return self._process_stream(secure_filename(file.filename), file.stream, file.content_type)
+
         except requests.exceptions.Timeout:
             return {"error": "Request timed out. Please try again."}
         except requests.exceptions.RequestException as e:
             return {"error": f"Network error: {str(e)}"}
         except Exception as e:
             return {"error": f"Unexpected error: {str(e)}"}
-    
+
     def process_receipt_from_url(self, image_url):
         """Process a receipt from a URL instead of file upload"""
         try:
-            # Download the image from URL
-            response = requests.get(image_url, timeout=30)
-            response.raise_for_status()
-            
-            # Determine content type
-            content_type = response.headers.get('content-type', 'image/jpeg')
-            
-            # Create a file-like object
-            from io import BytesIO
-            file_obj = BytesIO(response.content)
-            
-            # Prepare for upload
-            files = {
-                'file': ('receipt.jpg', file_obj, content_type)
-            }
-            
-            # Send to receipt processing API
-            upload_response = requests.post(
-                self.receipt_processing_url,
-                files=files,
-                timeout=30
-            )
-            
-            if upload_response.status_code == 200:
-                return {
+            # Stream the image from the URL instead of buffering it
+            with upstream_client.get(image_url, stream=True, upstream='receipt_download') as response:
+                response.raise_for_status()
+
+                # Determine content type
+                content_type = response.headers.get('content-type', 'image/jpeg')
+                media_type = content_type.split(';', 1)[0].strip().lower()
+                if media_type not in self.allowed_content_types:
+                    return {
+                        "error": f"Unsupported content type '{media_type}'. The URL must point to an image (PNG, JPG, JPEG, GIF) or PDF file."
+                    }
+
+                # Reject oversized files before downloading anything
+                content_length = response.headers.get('content-length', '')
+                if content_length.isdigit() and int(content_length) > self.url_max_bytes:
+                    return {"error": f"Receipt is larger than the {self.url_max_bytes} byte limit"}
+
+                response.raw.decode_content = True
+                stream = BoundedReader(response.raw, self.url_max_bytes, self.url_fetch_timeout)
+                extension = mimetypes.guess_extension(media_type) or '.jpg'
+                return self._process_stream(f"receipt{extension}", stream, media_type)
+
+        except UploadTooLargeError as e:
+            return {"error": str(e)}
+        except TimeoutError as e:
+            return {"error": f"{str(e)}. Please try again."}
+        except requests.exceptions.RequestException as e:
+            return {"error": f"Network error: {str(e)}"}
+        except Exception as e:
+            return {"error": f"Unexpected error: {str(e)}"}
+
+    def process_batch(self, files=(), image_urls=(), concurrency=None):
+        """Process many receipts concurrently and return one result per item"""
+        items = [("file", file.filename, self.process_receipt, file) for file in files]
+        items += [("url", image_url, self.process_receipt_from_url, image_url) for image_url in image_urls]
+
+        if not items:
+            return {"error": "No files or image URLs provided"}
+        if len(items) > self.batch_max_items:
+            return {"error": f"Too many receipts in one batch (maximum is {self.batch_max_items})"}
+
+        # Callers may lower the concurrency limit but never raise it
+        workers = min(concurrency or self.batch_concurrency, self.batch_concurrency, len(items))
+        with ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix='receipt-batch') as executor:
+            outcomes = list(executor.map(in_current_context(lambda item: item[2](item[3])), items))
+
+        results = []
+        for index, ((kind, source, _, _), outcome) in enumerate(zip(items, outcomes)):
+            results.append({"index": index, "type": kind, "source": source, **outcome})
+
+        succeeded = sum(1 for result in results if result.get("success"))
+        return {
+            "success": True,
+            "results": results,
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded
+        }
+
+    def _process_stream(self, filename, stream, content_type):
+        """Stream a receipt to the processing API, reusing cached results for identical content"""
+        with tracer.span('receipt process', attributes={'receipt.content_type': content_type}) as receipt_span:
+            # For URL receipts the body is downloaded here; the receipt_download span ends at its headers
+            with tracer.span('receipt spool') as span:
+                upload = spool_upload(stream)
+                span.set_attribute('receipt.bytes', upload.size)
+            # Results depend on the preprocessing settings as well as the content
+            cache_key = f"{upload.digest}-{self.preprocessor.fingerprint()}"
+            with upload:
+                cached = self.result_cache.get(cache_key)
+                receipt_span.set_attribute('receipt.cached', cached is not None)
+                if cached is not None:
+                    return {"success": True, "data": cached, "cached": True}
+
+                # Shrink images before upload; PDFs and undecodable files go as-is
+                with tracer.span('receipt preprocess') as span:
+                    preprocessed = self.preprocessor.process(upload.file, upload.size, content_type, filename)
+                    span.set_attribute('receipt.preprocessed_bytes', preprocessed.size if preprocessed is not None else None)
+                if preprocessed is not None:
+                    with preprocessed:
+                        response = self._upload(preprocessed.filename, preprocessed.file,
+                                                preprocessed.content_type, preprocessed.size)
+                else:
+                    response = self._upload(filename, upload.file, content_type, upload.size)
+
+            if response.status_code == 200:
+                data = response.json() if response.headers.get('content-type', '').startswith('application/json') else response.text
+                self.result_cache.set(cache_key, data)
+                result = {
                     "success": True,
-                    "data": upload_response.json() if upload_response.headers.get('content-type', '').startswith('application/json') else upload_response.text
+                    "data": data
                 }
+                if preprocessed is not None:
+                    result["preprocessing"] = preprocessed.stats
+                return result
             else:
                 return {
-                    "error": f"Receipt processing failed with status code: {upload_response.status_code}",
-                    "details": upload_response.text
+                    "error": f"Receipt processing failed with status code: {response.status_code}",
+                    "details": response.text
                 }
-                
-        except requests.exceptions.RequestException as e:
-            return {"error": f"Network error: {str(e)}"}
-        except Exception as e:
-            return {"error": f"Unexpected error: {str(e)}"} 
\ No newline at end of file
+
+    def _upload(self, filename, fileobj, content_type, size):
+        """Stream a file to the receipt processing API as multipart/form-data"""
+        body = MultipartFileBody('file', filename, fileobj, content_type, size)
+        return upstream_client.post(
+            self.receipt_processing_url,
+            data=body,
+            headers={'Content-Type': body.content_type},
+            upstream='receipt_processor',
+            operation='process'
+        )
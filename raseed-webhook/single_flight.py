@@ -0,0 +1,156 @@
+import asyncio
+import os
+import threading
+from collections import OrderedDict
+
+# How long followers wait for the leader's result before calling upstream themselves
+COALESCE_WAIT_SECONDS = float(os.environ.get('COALESCE_WAIT_SECONDS', '30'))
+# Number of distinct keys to keep per-key metrics for
+COALESCE_METRICS_KEYS = int(os.environ.get('COALESCE_METRICS_KEYS', '200'))
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self, wait_seconds=COALESCE_WAIT_SECONDS, metrics_keys=COALESCE_METRICS_KEYS):
+        self.wait_seconds = wait_seconds
+        self.metrics_keys = metrics_keys
+
+        self._calls = {}
+        self._lock = threading.Lock()
+
+        # key -> {"leader_calls", "coalesced", "timeouts"}, least recently seen first
+        self._key_stats = OrderedDict()
+        self.leader_calls = 0
+        self.coalesced = 0
+        self.timeouts = 0
+
+    def do(self, key, fn):
+        """Run fn once per key at a time; concurrent callers share the result"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = _Call()
+                self._calls[key] = call
+                leader = True
+                self._record(key, 'leader_calls')
+            else:
+                leader = False
+
+        if leader:
+            try:
+                call.result = fn()
+            except Exception as e:
+                call.error = e
+                raise
+            finally:
+                with self._lock:
+                    self._calls.pop(key, None)
+                call.done.set()
+            return call.result
+
+        if not call.done.wait(self.wait_seconds):
+            # The leader is stuck; don't let it hold this request hostage
+            with self._lock:
+                self._record(key, 'timeouts')
+            return fn()
+
+        with self._lock:
+            self._record(key, 'coalesced')
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def in_flight(self):
+        """Return the number of keys with an upstream call in progress"""
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self):
+        """Return global and per-key coalescing counters"""
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "wait_seconds": self.wait_seconds,
+                "leader_calls": self.leader_calls,
+                "coalesced": self.coalesced,
+                "timeouts": self.timeouts,
+                "keys": [
+                    {"key": self._format_key(key), **counters}
+                    for key, counters in reversed(self._key_stats.items())
+                ]
+            }
+
+    def _record(self, key, counter):
+        # Caller must hold self._lock
+        setattr(self, counter, getattr(self, counter) + 1)
+
+        counters = self._key_stats.pop(key, None)
+        if counters is None:
+            counters = {"leader_calls": 0, "coalesced": 0, "timeouts": 0}
+        counters[counter] += 1
+        self._key_stats[key] = counters
+
+        while len(self._key_stats) > self.metrics_keys:
+            self._key_stats.popitem(last=False)
+
+    @staticmethod
+    def _format_key(key):
+        if isinstance(key, tuple):
+            return ":".join(str(part) for part in key)
+        return str(key)
+
+
+class AsyncSingleFlight(SingleFlight):
+    """Single-flight coalescing for coroutines running on one event loop"""
+
+    async def do(self, key, fn):
+        """Await fn() once per key at a time; concurrent callers share the result"""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is None:
+                future = asyncio.get_running_loop().create_future()
+                self._calls[key] = future
+                leader = True
+                self._record(key, 'leader_calls')
+            else:
+                leader = False
+
+        if leader:
+            try:
+                result = await fn()
+            except BaseException as e:
+                if isinstance(e, asyncio.CancelledError):
+                    future.cancel()
+                else:
+                    future.set_exception(e)
+                    # Followers re-raise it; don't warn if there are none
+                    future.exception()
+                raise
+            else:
+                future.set_result(result)
+                return result
+            finally:
+                with self._lock:
+                    self._calls.pop(key, None)
+
+        try:
+            result = await asyncio.wait_for(asyncio.shield(future), self.wait_seconds)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._record(key, 'timeouts')
+            return await fn()
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                raise
+            # The leader's request went away; make the call ourselves
+            return await fn()
+
+        with self._lock:
+            self._record(key, 'coalesced')
+        return result
@@ -0,0 +1,61 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Imported first by main.py, so this approximates when app startup began
+_STARTED_AT = time.perf_counter()
+
+
+class StartupReport:
+    """Collects how long each startup phase (and each lazy initialization) took"""
+
+    def __init__(self, started_at=_STARTED_AT):
+        self.started_at = started_at
+        self.ready_after_ms = None
+        self._lock = threading.Lock()
+        self._phases = []
+        self._lazy = {}
+
+    @contextmanager
+    def phase(self, name):
+        """Time a startup phase"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+            with self._lock:
+                self._phases.append({"name": name, "ms": elapsed_ms})
+
+    @contextmanager
+    def lazy(self, name):
+        """Time a deferred initialization that runs on first use rather than at startup"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+            with self._lock:
+                self._lazy[name] = {
+                    "ms": elapsed_ms,
+                    "after_startup_ms": round((started - self.started_at) * 1000, 2)
+                }
+            print(f"Lazy init: {name} took {elapsed_ms} ms")
+
+    def ready(self):
+        """Mark the app as importable/ready to serve and print the report"""
+        self.ready_after_ms = round((time.perf_counter() - self.started_at) * 1000, 2)
+        phases = ", ".join(f"{phase['name']}={phase['ms']}ms" for phase in self._phases)
+        print(f"Startup completed in {self.ready_after_ms} ms ({phases})")
+
+    def summary(self):
+        """Return startup and lazy-initialization timings"""
+        with self._lock:
+            return {
+                "ready_after_ms": self.ready_after_ms,
+                "phases": list(self._phases),
+                "lazy": dict(self._lazy)
+            }
+
+
+startup_report = StartupReport()
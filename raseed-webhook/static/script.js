@@ -131,6 +131,22 @@ async function processReceiptFile(file) {
     return await response.json();
 }
 
+async function processReceiptBatch(files) {
+    const formData = new FormData();
+    files.forEach(file => formData.append('files', file));
+    
+    const response = await fetch(`${API_BASE_URL}/receipt/process-batch`, {
+        method: 'POST',
+        body: formData
+    });
+    
+    if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+    }
+    
+    return await response.json();
+}
+
 async function processReceiptUrl(url) {
     const data = { image_url: url };
     
@@ -154,6 +170,64 @@ async function sendChatMessage(message) {
     return response;
 }
 
+async function streamChatMessage(message, onChunk) {
+    const response = await fetch(`${API_BASE_URL}/chat/stream`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'Accept': 'text/event-stream'
+        },
+        body: JSON.stringify({ text: message })
+    });
+    
+    if (!response.ok || !response.body) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+    }
+    
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let answer = '';
+    
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        
+        buffer += decoder.decode(value, { stream: true });
+        
+        // SSE frames are separated by a blank line
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const frame = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            
+            let event = 'message';
+            let data = '';
+            frame.split('\n').forEach(line => {
+                if (line.startsWith('event:')) {
+                    event = line.slice(6).trim();
+                } else if (line.startsWith('data:')) {
+                    data += line.slice(5).trim();
+                }
+            });
+            
+            const payload = data ? JSON.parse(data) : {};
+            if (event === 'error') {
+                throw new Error(payload.error || 'Streaming failed');
+            }
+            if (event === 'done') {
+                return answer;
+            }
+            if (payload.text) {
+                answer += payload.text;
+                onChunk(answer);
+            }
+        }
+    }
+    
+    return answer;
+}
+
 // Form Event Listeners
 document.getElementById('createClassForm').addEventListener('submit', async (e) => {
     e.preventDefault();
@@ -213,7 +287,8 @@ document.getElementById('uploadReceiptForm').addEventListener('submit', async (e
     e.preventDefault();
     
     const fileInput = document.getElementById('receiptFile');
-    const file = fileInput.files[0];
+    const files = Array.from(fileInput.files);
+    const file = files[0];
     
     if (!file) {
         showNotification('Please select a file', 'error');
@@ -222,6 +297,30 @@ document.getElementById('uploadReceiptForm').addEventListener('submit', async (e
     
     showLoading();
     
+    // Several files go to the batch endpoint in a single request
+    if (files.length > 1) {
+        try {
+            const response = await processReceiptBatch(files);
+            
+            response.results.forEach(result => {
+                if (result.success) {
+                    addReceiptResult(`Receipt processed: ${result.source}`, 'success', result.data);
+                } else {
+                    addReceiptResult(`Failed to process receipt: ${result.source}`, 'error', result.error);
+                }
+            });
+            showNotification(`${response.succeeded} of ${files.length} receipts processed`,
+                response.failed ? 'error' : 'success');
+        } catch (error) {
+            showNotification('Error processing receipts: ' + error.message, 'error');
+            addReceiptResult('Error processing receipts', 'error', error.message);
+        } finally {
+            hideLoading();
+            fileInput.value = ''; // Clear file input
+        }
+        return;
+    }
+    
     try {
         const response = await processReceiptFile(file);
         
@@ -285,22 +384,35 @@ document.getElementById('chatForm').addEventListener('submit', async (e) => {
     addChatMessage(message, 'user');
     input.value = '';
     
-    showLoading();
+    // Render the answer as it streams in
+    const botContent = addChatMessage('...', 'bot');
     
     try {
-        const response = await sendChatMessage(message);
+        const answer = await streamChatMessage(message, text => {
+            botContent.textContent = text;
+            const chatMessages = document.getElementById('chatMessages');
+            chatMessages.scrollTop = chatMessages.scrollHeight;
+        });
         
-        if (response.fulfillment_response && response.fulfillment_response.messages) {
-            const botMessage = response.fulfillment_response.messages[0].text.text[0];
-            addChatMessage(botMessage, 'bot');
-        } else {
-            addChatMessage('Sorry, I couldn\'t process your request.', 'bot');
+        if (!answer) {
+            botContent.textContent = 'Sorry, I couldn\'t process your request.';
+        }
+    } catch (streamError) {
+        console.error('Streaming Error:', streamError);
+        
+        // Fall back to the regular webhook endpoint
+        try {
+            const response = await sendChatMessage(message);
+            
+            if (response.fulfillment_response && response.fulfillment_response.messages) {
+                botContent.textContent = response.fulfillment_response.messages[0].text.text[0];
+            } else {
+                botContent.textContent = 'Sorry, I couldn\'t process your request.';
+            }
+        } catch (error) {
+            botContent.textContent = 'Error: ' + error.message;
+            showNotification('Error sending message: ' + error.message, 'error');
         }
-    } catch (error) {
-        addChatMessage('Error: ' + error.message, 'bot');
-        showNotification('Error sending message: ' + error.message, 'error');
-    } finally {
-        hideLoading();
     }
 });
 
@@ -378,12 +490,21 @@ function addChatMessage(message, sender) {
     
     chatMessages.appendChild(messageDiv);
     chatMessages.scrollTop = chatMessages.scrollHeight;
+    
+    return messageDiv.querySelector('.message-content');
 }
 
 // File input preview
 document.getElementById('receiptFile').addEventListener('change', (e) => {
-    const file = e.target.files[0];
-    if (file) {
+    const files = Array.from(e.target.files);
+    const file = files[0];
+    if (files.length > 1) {
+        const totalSize = files.reduce((sum, f) => sum + f.size, 0);
+        const fileInfo = document.querySelector('.file-info');
+        fileInfo.innerHTML = `
+            <small>Selected: ${files.length} files (${(totalSize / 1024 / 1024).toFixed(2)} MB)</small>
+        `;
+    } else if (file) {
         const fileInfo = document.querySelector('.file-info');
         fileInfo.innerHTML = `
             <small>Selected: ${file.name} (${(file.size / 1024 / 1024).toFixed(2)} MB)</small>
@@ -0,0 +1,220 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import tempfile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Static asset pipeline settings
+STATIC_DIR = os.environ.get(
+    'STATIC_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+)
+STATIC_MAX_AGE = int(os.environ.get('STATIC_MAX_AGE', str(365 * 24 * 3600)))
+# Precompressed variants are kept here; `python static_assets.py` fills it at image build time
+STATIC_BUILD_DIR = os.environ.get(
+    'STATIC_BUILD_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.static-build')
+)
+# Files smaller than this aren't worth compressing
+STATIC_COMPRESS_MIN_BYTES = int(os.environ.get('STATIC_COMPRESS_MIN_BYTES', '256'))
+
+# Pages that reference the other assets; they keep their names and are revalidated
+HTML_ENTRY_POINTS = ('index.html',)
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type, Authorization'
+}
+
+
+class StaticAsset:
+    """One static file with its precompressed variants and precomputed response headers"""
+
+    def __init__(self, name, encodings, digest, content_type, immutable):
+        self.name = name
+        self.digest = digest
+        self.content_type = content_type
+
+        cache_control = f"public, max-age={STATIC_MAX_AGE}, immutable" if immutable else "no-cache"
+        self.variants = {}
+        self.etags = set()
+        for encoding, encoded in encodings:
+            etag = f'"{self.digest}-{encoding}"' if encoding else f'"{self.digest}"'
+            headers = {
+                'Content-Type': content_type,
+                'Content-Length': str(len(encoded)),
+                'ETag': etag,
+                'Cache-Control': cache_control,
+                'Vary': 'Accept-Encoding'
+            }
+            if encoding:
+                headers['Content-Encoding'] = encoding
+            headers.update(CORS_HEADERS)
+            self.variants[encoding] = (encoded, headers)
+            self.etags.add(etag)
+
+
+def encode_variants(body, content_type, digest):
+    """Return the (encoding, bytes) variants worth serving for a file, identity first"""
+    variants = [(None, body)]
+    if len(body) < STATIC_COMPRESS_MIN_BYTES or not content_type.startswith(COMPRESSIBLE_TYPES):
+        return variants
+
+    compressors = [('gzip', lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        compressors.insert(0, ('br', lambda data: brotli.compress(data, quality=11)))
+
+    for encoding, compress in compressors:
+        compressed = _load_built(digest, encoding)
+        if compressed is None:
+            compressed = compress(body)
+            _save_built(digest, encoding, compressed)
+        if len(compressed) < len(body):
+            variants.append((encoding, compressed))
+    return variants
+
+
+def _load_built(digest, encoding):
+    try:
+        with open(os.path.join(STATIC_BUILD_DIR, f"{digest}.{encoding}"), 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _save_built(digest, encoding, data):
+    # Best effort: a read-only filesystem just means compressing again next startup
+    try:
+        os.makedirs(STATIC_BUILD_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=STATIC_BUILD_DIR, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, os.path.join(STATIC_BUILD_DIR, f"{digest}.{encoding}"))
+    except OSError:
+        pass
+
+
+class StaticAssetPipeline:
+    """
+    Load the static directory once, fingerprint asset names, precompress them
+    and rewrite the HTML entry points to reference the fingerprinted names.
+    Fingerprinted assets are cached forever by browsers; HTML is revalidated
+    with its ETag so a deploy is picked up on the next visit.
+    """
+
+    def __init__(self, static_dir=STATIC_DIR):
+        self.static_dir = static_dir
+        self._assets = {}
+        self.fingerprinted = {}
+
+        try:
+            names = sorted(os.listdir(static_dir))
+        except OSError as e:
+            print(f"Static asset pipeline disabled: {e}")
+            return
+
+        files = {}
+        for name in names:
+            path = os.path.join(static_dir, name)
+            if os.path.isfile(path):
+                with open(path, 'rb') as f:
+                    files[name] = f.read()
+
+        for name, body in files.items():
+            if name in HTML_ENTRY_POINTS:
+                continue
+            content_type = self._content_type(name)
+            digest = hashlib.sha256(body).hexdigest()[:12]
+            encodings = encode_variants(body, content_type, digest)
+            base, extension = os.path.splitext(name)
+            fingerprinted_name = f"{base}.{digest}{extension}"
+            self.fingerprinted[name] = fingerprinted_name
+            self._assets[fingerprinted_name] = StaticAsset(name, encodings, digest, content_type, immutable=True)
+            # The plain name still works (e.g. for cached old HTML) but is revalidated
+            self._assets[name] = StaticAsset(name, encodings, digest, content_type, immutable=False)
+
+        for name in HTML_ENTRY_POINTS:
+            if name in files:
+                html = self._rewrite_references(files[name].decode('utf-8')).encode('utf-8')
+                content_type = 'text/html; charset=utf-8'
+                digest = hashlib.sha256(html).hexdigest()[:12]
+                self._assets[name] = StaticAsset(
+                    name, encode_variants(html, content_type, digest), digest, content_type, immutable=False
+                )
+
+    def get(self, name):
+        """Return the asset served at this path, or None if it isn't in the pipeline"""
+        return self._assets.get(name)
+
+    def respond(self, asset, accept_encoding, if_none_match):
+        """Pick the best encoding and return (status, headers, body), honouring If-None-Match"""
+        encoding = self._negotiate(accept_encoding, asset.variants)
+        body, headers = asset.variants[encoding]
+
+        if if_none_match and self._matches(if_none_match, asset.etags):
+            headers = {key: value for key, value in headers.items() if key not in ('Content-Length', 'Content-Encoding')}
+            return 304, headers, b''
+        return 200, headers, body
+
+    def stats(self):
+        """Return per-asset sizes for each encoding"""
+        return {
+            name: {encoding or 'identity': len(body) for encoding, (body, _) in asset.variants.items()}
+            for name, asset in self._assets.items()
+        }
+
+    def _rewrite_references(self, html):
+        def replace(match):
+            attribute, quote, reference = match.group(1), match.group(2), match.group(3)
+            fingerprinted_name = self.fingerprinted.get(reference.lstrip('/'))
+            if fingerprinted_name is None:
+                return match.group(0)
+            prefix = '/' if reference.startswith('/') else ''
+            return f"{attribute}={quote}{prefix}{fingerprinted_name}{quote}"
+
+        return re.sub(r'\b(href|src)=(["\'])([^"\'#?]+)\2', replace, html)
+
+    @staticmethod
+    def _content_type(name):
+        content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        if content_type.startswith('text/') or content_type == 'application/javascript':
+            content_type += '; charset=utf-8'
+        return content_type
+
+    @staticmethod
+    def _negotiate(accept_encoding, variants):
+        accepted = set()
+        for part in accept_encoding.lower().split(','):
+            token, _, params = part.strip().partition(';')
+            if params.strip().replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+                continue
+            accepted.add(token.strip())
+        for encoding in ('br', 'gzip'):
+            if encoding in variants and (encoding in accepted or '*' in accepted):
+                return encoding
+        return None
+
+    @staticmethod
+    def _matches(if_none_match, etags):
+        if if_none_match.strip() == '*':
+            return True
+        for tag in if_none_match.split(','):
+            tag = tag.strip()
+            if tag.startswith('W/'):
+                tag = tag[2:]
+            if tag in etags:
+                return True
+        return False
+
+
+if __name__ == '__main__':
+    # Precompress at build time so containers don't spend startup on it
+    pipeline = StaticAssetPipeline()
+    for name, sizes in sorted(pipeline.stats().items()):
+        print(f"{name}: {sizes}")
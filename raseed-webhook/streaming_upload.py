@@ -0,0 +1,164 @@
+import hashlib
+import io
+import os
+import tempfile
+import time
+import uuid
+
+# Non-seekable sources are spooled to memory up to this size, then to disk
+RECEIPT_SPOOL_THRESHOLD = int(os.environ.get('RECEIPT_SPOOL_THRESHOLD', str(1024 * 1024)))
+RECEIPT_UPLOAD_CHUNK_SIZE = int(os.environ.get('RECEIPT_UPLOAD_CHUNK_SIZE', str(64 * 1024)))
+
+
+class UploadTooLargeError(Exception):
+    """Raised when a streamed receipt exceeds its size limit"""
+
+
+class BoundedReader:
+    """
+    Wrap a non-seekable byte stream, failing fast once more than max_bytes
+    have been read or the overall deadline has passed.
+    """
+
+    def __init__(self, raw, max_bytes, timeout=None):
+        self._raw = raw
+        self.max_bytes = max_bytes
+        self.bytes_read = 0
+        self._deadline = time.monotonic() + timeout if timeout else None
+
+    def read(self, size=-1):
+        if self._deadline is not None and time.monotonic() > self._deadline:
+            raise TimeoutError("Timed out while downloading the receipt")
+
+        data = self._raw.read(size)
+        self.bytes_read += len(data)
+        if self.bytes_read > self.max_bytes:
+            raise UploadTooLargeError(f"Receipt is larger than the {self.max_bytes} byte limit")
+        return data
+
+    def seekable(self):
+        return False
+
+
+def _is_seekable(stream):
+    try:
+        return stream.seekable()
+    except AttributeError:
+        # SpooledTemporaryFile (Werkzeug's upload buffer) only has seekable() from Python 3.11
+        pass
+    except ValueError:
+        return False
+    try:
+        stream.seek(stream.tell())
+        return True
+    except (AttributeError, OSError, ValueError):
+        return False
+
+
+class SpooledUpload:
+    """A receipt body ready to stream upstream, with its size and SHA-256 digest"""
+
+    def __init__(self, file, digest, size, owned):
+        self.file = file
+        self.digest = digest
+        self.size = size
+        self._owned = owned
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        """Release the spool file if we created it"""
+        if self._owned:
+            self.file.close()
+
+
+def spool_upload(stream, threshold=RECEIPT_SPOOL_THRESHOLD, chunk_size=RECEIPT_UPLOAD_CHUNK_SIZE):
+    """Hash a stream chunk by chunk, spooling it first only if it can't be rewound"""
+    hasher = hashlib.sha256()
+    size = 0
+
+    if _is_seekable(stream):
+        # Werkzeug already spools uploads to disk; hash in place and rewind
+        start = stream.tell()
+        for chunk in iter(lambda: stream.read(chunk_size), b''):
+            hasher.update(chunk)
+            size += len(chunk)
+        stream.seek(start)
+        return SpooledUpload(stream, hasher.hexdigest(), size, owned=False)
+
+    spool = tempfile.SpooledTemporaryFile(max_size=threshold)
+    try:
+        for chunk in iter(lambda: stream.read(chunk_size), b''):
+            hasher.update(chunk)
+            spool.write(chunk)
+            size += len(chunk)
+        spool.seek(0)
+    except BaseException:
+        spool.close()
+        raise
+    return SpooledUpload(spool, hasher.hexdigest(), size, owned=True)
+
+
+class MultipartFileBody:
+    """
+    A multipart/form-data body holding a single file part, read lazily from
+    the underlying file so the upload is never copied into memory in full.
+    """
+
+    def __init__(self, field_name, filename, fileobj, content_type, size):
+        boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+
+        filename = filename.replace('"', '%22')
+        header = (
+            f"--{boundary}\r\n"
+            f"Content-Disposition: form-data; name=\"{field_name}\"; filename=\"{filename}\"\r\n"
+            f"Content-Type: {content_type or 'application/octet-stream'}\r\n\r\n"
+        ).encode('utf-8')
+        footer = f"\r\n--{boundary}--\r\n".encode('utf-8')
+
+        self._fileobj = fileobj
+        self._file_start = fileobj.tell()
+        self._parts = [io.BytesIO(header), fileobj, io.BytesIO(footer)]
+        self._length = len(header) + size + len(footer)
+        self.seek(0)
+
+    def __len__(self):
+        return self._length
+
+    def read(self, size=-1):
+        """Read up to size bytes across the header, file and footer parts"""
+        if size is None or size < 0:
+            size = self._length - self._pos
+
+        chunks = []
+        remaining = size
+        while remaining > 0 and self._index < len(self._parts):
+            chunk = self._parts[self._index].read(remaining)
+            if not chunk:
+                self._index += 1
+                continue
+            chunks.append(chunk)
+            remaining -= len(chunk)
+
+        data = b''.join(chunks)
+        self._pos += len(data)
+        return data
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        """Rewind to the start; only used when a request is retried"""
+        if offset != 0 or whence != io.SEEK_SET:
+            raise io.UnsupportedOperation("MultipartFileBody can only be rewound to the start")
+        self._parts[0].seek(0)
+        self._fileobj.seek(self._file_start)
+        self._parts[2].seek(0)
+        self._index = 0
+        self._pos = 0
+        return 0
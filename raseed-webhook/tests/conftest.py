@@ -0,0 +1,24 @@
+"""
+Unit tests for the service modules. Run from raseed-webhook with:
+    python -m pytest
+
+The test_*.py scripts next to main.py exercise a running server and are not
+collected here.
+"""
+
+import os
+import sys
+import tempfile
+
+# Modules read their settings at import time, so local state goes to a scratch directory first
+_STATE_DIR = tempfile.mkdtemp(prefix='raseed-tests-')
+for name, filename in (
+    ('WALLET_CARD_INDEX_DB', 'cards.db'),
+    ('WALLET_POINTS_DB', 'points.db'),
+    ('WALLET_BULK_DB', 'bulk.db'),
+    ('RECEIPT_JOBS_DIR', 'receipt-jobs'),
+    ('RECEIPT_CACHE_DIR', 'receipt-cache'),
+):
+    os.environ.setdefault(name, os.path.join(_STATE_DIR, filename))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
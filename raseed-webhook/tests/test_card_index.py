@@ -0,0 +1,69 @@
+import threading
+
+import pytest
+
+from card_index import IssuedCardIndex, normalize_email
+
+
+@pytest.fixture
+def index(tmp_path):
+    return IssuedCardIndex(str(tmp_path / 'cards.db'))
+
+
+def test_lookups_ignore_email_case_and_whitespace(index):
+    index.put('Ana@Example.com ', 'issuer.class', 'issuer.card-1', 'https://pay.google.com/gp/v/save/1', 'Ana', 'api')
+
+    card = index.get(' ana@example.COM', 'issuer.class')
+    assert card["object_id"] == 'issuer.card-1'
+    assert normalize_email(None) == ''
+
+
+def test_first_issued_card_wins_a_race(index):
+    first = index.put('a@b.c', 'issuer.class', 'issuer.card-1', 'url-1')
+    second = index.put('a@b.c', 'issuer.class', 'issuer.card-2', 'url-2')
+
+    assert second == first
+    assert second["save_url"] == 'url-1'
+
+
+def test_cards_are_kept_per_class(index):
+    index.put('a@b.c', 'issuer.gold', 'issuer.card-1', 'url-1')
+    index.put('a@b.c', 'issuer.silver', 'issuer.card-2', 'url-2')
+
+    assert [card["class_id"] for card in index.find_by_email('A@B.C')] == ['issuer.gold', 'issuer.silver']
+    assert index.get('a@b.c', 'issuer.bronze') is None
+    stats = index.stats()
+    assert (stats["cards"], stats["misses"]) == (2, 1)
+
+
+def test_each_thread_uses_its_own_connection(index):
+    index.put('a@b.c', 'issuer.class', 'issuer.card-1', 'url-1')
+    found = []
+    thread = threading.Thread(target=lambda: found.append(index.get('a@b.c', 'issuer.class')))
+    thread.start()
+    thread.join(5)
+
+    assert found[0]["object_id"] == 'issuer.card-1'
+
+
+def test_create_card_issues_once_per_member(tmp_path, monkeypatch):
+    pytest.importorskip('googleapiclient')
+    from google_wallet_service import GoogleWalletService
+
+    wallet = GoogleWalletService()
+    wallet.card_index = IssuedCardIndex(str(tmp_path / 'service-cards.db'))
+    issued = []
+
+    def create_save_jwt_url(user_email, user_name, points_balance=0, object_id=None):
+        issued.append(object_id)
+        return {"success": True, "object_id": object_id, "save_url": f"https://pay.google.com/gp/v/save/{object_id}"}
+
+    monkeypatch.setattr(wallet, 'create_save_jwt_url', create_save_jwt_url)
+
+    first = wallet.create_card('Ana@Example.com', 'Ana', 10, mode='jwt')
+    repeat = wallet.create_card('ana@example.com', 'Ana', 10, mode='jwt')
+
+    assert first["existing"] is False
+    assert repeat == {**first, "existing": True}
+    assert issued == [wallet.card_object_id('ana@example.com')]
+    assert wallet.create_card('ana@example.com', 'Ana', mode='pdf')["error"].startswith('Unknown save mode')
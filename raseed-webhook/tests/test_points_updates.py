@@ -0,0 +1,190 @@
+import pytest
+
+from points_updates import PointsUpdateQueue
+
+errors = pytest.importorskip('googleapiclient.errors')
+httplib2 = pytest.importorskip('httplib2')
+
+
+def http_error(status):
+    return errors.HttpError(httplib2.Response({'status': status}), b'{"error": {"message": "upstream"}}')
+
+
+class FakeRequest:
+    def __init__(self, run):
+        self.run = run
+
+
+class FakeBatch:
+    def __init__(self, callback):
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id):
+        self.requests.append((request_id, request))
+
+    def execute(self, http=None):
+        for request_id, request in self.requests:
+            try:
+                self.callback(request_id, request.run(), None)
+            except errors.HttpError as e:
+                self.callback(request_id, None, e)
+
+
+class FakeWalletApi:
+    """The loyaltyobject get/patch and batch calls PointsUpdateQueue makes"""
+
+    def __init__(self):
+        self.balances = {}
+        self.gets = []
+        self.patches = []
+        self.failures = {}
+        self.on_patch = None
+
+    def loyaltyobject(self):
+        return self
+
+    def get(self, resourceId):
+        def run():
+            self.gets.append(resourceId)
+            return {"loyaltyPoints": {"balance": {"int": self.balances[resourceId]}}}
+        return FakeRequest(run)
+
+    def patch(self, resourceId, body):
+        def run():
+            if resourceId in self.failures:
+                raise http_error(self.failures[resourceId])
+            if self.on_patch:
+                self.on_patch(resourceId)
+            balance = int(body["loyaltyPoints"]["balance"]["stringBalance"])
+            self.patches.append((resourceId, balance))
+            self.balances[resourceId] = balance
+        return FakeRequest(run)
+
+    def new_batch_http_request(self, callback):
+        return FakeBatch(callback)
+
+
+class FakeWalletService:
+    def __init__(self):
+        self.service = FakeWalletApi()
+
+
+@pytest.fixture
+def make_queue(tmp_path, monkeypatch):
+    queues = []
+
+    def make(wallet_service=None, **kwargs):
+        kwargs.setdefault('max_attempts', 2)
+        queue = PointsUpdateQueue(wallet_service or FakeWalletService(), db_path=str(tmp_path / 'points.db'),
+                                  flush_interval=3600, flush_threshold=10_000, **kwargs)
+        monkeypatch.setattr(queue, '_http', lambda: None)
+        queues.append(queue)
+        return queue
+
+    yield make
+    for queue in queues:
+        queue.stop(flush=False)
+
+
+def pending(queue, object_id):
+    return queue._db().execute(
+        "SELECT delta, status, attempts FROM points_pending WHERE object_id = ?", (object_id,)
+    ).fetchone()
+
+
+def test_deltas_between_flushes_become_one_patch(make_queue):
+    queue = make_queue()
+    api = queue.wallet_service.service
+    api.balances['obj'] = 100
+
+    queue.add('obj', 5)
+    queue.add('obj', 3)
+    assert queue.add('obj', -2)["pending_delta"] == 6
+
+    assert queue.flush() == 1
+    assert api.patches == [('obj', 106)]
+    assert pending(queue, 'obj')[0] == 0
+    assert queue.stats()["pending_objects"] == 0
+
+
+def test_known_balance_skips_the_fetch(make_queue):
+    queue = make_queue()
+    api = queue.wallet_service.service
+    queue.record_balance('obj', 40)
+    queue.add('obj', 2)
+
+    queue.flush()
+    queue.add('obj', 1)
+    queue.flush()
+
+    assert api.gets == []
+    assert api.patches == [('obj', 42), ('obj', 43)]
+
+
+def test_delta_added_while_patching_stays_pending(make_queue):
+    queue = make_queue()
+    api = queue.wallet_service.service
+    api.balances['obj'] = 0
+    queue.add('obj', 10)
+    api.on_patch = lambda object_id: queue.add(object_id, 4)
+
+    queue.flush()
+
+    assert api.patches == [('obj', 10)]
+    assert pending(queue, 'obj')[:2] == (4, 'pending')
+
+
+def test_invalid_values_are_rejected(make_queue):
+    queue = make_queue()
+
+    assert queue.add('', 1) == {"error": "object_id is required"}
+    assert queue.add('obj', 'lots') == {"error": "delta must be an integer"}
+
+
+def test_retryable_errors_are_retried_up_to_max_attempts(make_queue):
+    queue = make_queue(max_attempts=2)
+    api = queue.wallet_service.service
+    queue.record_balance('obj', 0)
+    queue.add('obj', 1)
+    api.failures['obj'] = 503
+
+    queue.flush()
+    assert pending(queue, 'obj') == (1, 'pending', 1)
+    queue.flush()
+    assert pending(queue, 'obj') == (1, 'failed', 2)
+
+    # A new delta gives the object another round
+    del api.failures['obj']
+    queue.add('obj', 1)
+    queue.flush()
+    assert api.patches == [('obj', 2)]
+
+
+def test_client_errors_fail_without_retrying(make_queue):
+    queue = make_queue()
+    api = queue.wallet_service.service
+    queue.record_balance('obj', 0)
+    queue.add('obj', 1)
+    api.failures['obj'] = 404
+
+    queue.flush()
+
+    assert pending(queue, 'obj') == (1, 'failed', 1)
+    assert queue.stats()["failed_objects"] == 1
+
+
+def test_only_the_lease_holder_flushes(make_queue):
+    wallet_service = FakeWalletService()
+    first = make_queue(wallet_service)
+    second = make_queue(wallet_service)
+    first.record_balance('obj', 0)
+    first.add('obj', 1)
+
+    assert first._acquire_lease()
+    assert second.flush() == 0
+    assert wallet_service.service.patches == []
+
+    first._release_lease()
+    assert second.flush() == 1
+    assert wallet_service.service.patches == [('obj', 1)]
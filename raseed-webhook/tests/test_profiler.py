@@ -0,0 +1,85 @@
+import json
+import os
+import sys
+import time
+
+import pytest
+
+from profiler import RUN_STARTED_ENV, SamplingProfiler
+
+
+@pytest.fixture
+def make_profiler(tmp_path, monkeypatch):
+    monkeypatch.delenv(RUN_STARTED_ENV, raising=False)
+
+    def make(**kwargs):
+        kwargs.setdefault('token', 'secret')
+        return SamplingProfiler(output_dir=str(tmp_path / 'profiles'), control_file=str(tmp_path / 'control.json'),
+                                flush_interval=0, **kwargs)
+    return make
+
+
+def test_control_file_from_an_earlier_run_is_ignored(make_profiler, tmp_path):
+    control = tmp_path / 'control.json'
+    control.write_text(json.dumps({"sample_rate": 1.0, "session": "old"}))
+    old = time.time() - 3600
+    os.utime(control, (old, old))
+
+    profiler = make_profiler(sample_rate=0.0)
+
+    assert profiler.wants(None) is False
+    assert profiler.status()["sample_rate"] == 0.0
+    assert profiler.session is None
+
+
+def test_settings_from_this_run_reach_later_workers(make_profiler):
+    first = make_profiler(sample_rate=0.0)
+    first.configure(sample_rate=1.0)
+
+    # A worker started later in the same run shares the run start through the environment
+    later = make_profiler(sample_rate=0.0)
+    assert later.wants(None) is True
+    assert later.session == first.session
+
+
+def test_configure_clamps_and_reset_starts_a_new_session(make_profiler):
+    profiler = make_profiler()
+    first = profiler.configure(sample_rate=5)
+    assert first["sample_rate"] == 1.0
+
+    second = profiler.configure(reset=True)
+    assert second["sample_rate"] == 1.0
+    assert second["session"] != first["session"]
+
+
+def test_header_needs_the_token(make_profiler):
+    profiler = make_profiler(sample_rate=0.0)
+    assert profiler.wants('secret') is True
+    assert profiler.wants('wrong') is False
+    assert make_profiler(token='', sample_rate=0.0).wants('') is False
+
+
+def test_collapse_puts_the_route_at_the_root(make_profiler):
+    profiler = make_profiler()
+
+    def inner():
+        return sys._getframe()
+
+    stack = profiler._collapse('GET /chat; v2', inner())
+
+    frames = stack.split(';')
+    assert frames[0] == 'GET_/chat,_v2'
+    assert frames[-1] == 'test_profiler.py:inner'
+    assert ' ' not in stack
+
+
+def test_collapsed_merges_every_worker_file(make_profiler, tmp_path):
+    profiler = make_profiler()
+    profiler.configure(sample_rate=0.0, reset=True)
+    output = tmp_path / 'profiles'
+    output.mkdir(exist_ok=True)
+    (output / f"profile-{profiler.session}-1.collapsed").write_text("GET_/;a 2\nGET_/;b 1\n")
+    (output / f"profile-{profiler.session}-2.collapsed").write_text("GET_/;a 3\n")
+    (output / "profile-othersession-3.collapsed").write_text("GET_/;a 100\n")
+
+    assert profiler.collapsed() == "GET_/;a 5\nGET_/;b 1\n"
@@ -0,0 +1,80 @@
+import os
+import time
+
+import pytest
+
+from receipt_cache import ReceiptResultCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ReceiptResultCache(cache_dir=str(tmp_path), max_bytes=10_000, ttl_seconds=0)
+
+
+def test_round_trip_counts_hits_and_misses(cache):
+    assert cache.get('abc') is None
+    cache.set('abc', {"total": 12.5})
+
+    assert cache.get('abc') == {"total": 12.5}
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+
+def test_overwrite_replaces_the_old_size(cache, tmp_path):
+    cache.set('abc', {"items": ["x" * 200]})
+    cache.set('abc', {"items": ["x" * 200]})
+    cache.set('abc', {"items": ["y"]})
+
+    on_disk = sum(entry.stat().st_size for entry in os.scandir(tmp_path))
+    assert cache.stats()["bytes"] == on_disk
+
+
+def test_expired_entry_is_a_miss_and_frees_its_bytes(tmp_path, monkeypatch):
+    cache = ReceiptResultCache(cache_dir=str(tmp_path), max_bytes=10_000, ttl_seconds=60)
+    cache.set('abc', {"total": 1})
+    assert cache.get('abc') == {"total": 1}
+
+    later = time.time() + 120
+    monkeypatch.setattr('receipt_cache.time.time', lambda: later)
+
+    assert cache.get('abc') is None
+    assert not (tmp_path / 'abc.json').exists()
+    assert cache.stats()["bytes"] == 0
+
+
+def test_eviction_drops_least_recently_used(tmp_path):
+    cache = ReceiptResultCache(cache_dir=str(tmp_path), max_bytes=300, ttl_seconds=0)
+    cache.set('old', {"v": "a" * 80})
+    cache.set('used', {"v": "b" * 80})
+    old = time.time() - 100
+    os.utime(tmp_path / 'old.json', (old - 10, old - 10))
+    os.utime(tmp_path / 'used.json', (old, old))
+    cache.get('used')
+
+    cache.set('new', {"v": "c" * 80})
+
+    assert cache.get('old') is None
+    assert cache.get('used') is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_disabled_when_the_directory_cannot_be_created(tmp_path):
+    blocker = tmp_path / 'file'
+    blocker.write_text('')
+    cache = ReceiptResultCache(cache_dir=str(blocker / 'cache'))
+
+    cache.set('abc', {"total": 1})
+    assert cache.get('abc') is None
+    assert cache.stats()["enabled"] is False
+
+
+def test_preprocessor_fingerprint_follows_settings():
+    pytest.importorskip('PIL')
+    from image_preprocessor import ReceiptImagePreprocessor
+
+    base = ReceiptImagePreprocessor(enabled=True, max_dimension=2048, grayscale=True, output_format='JPEG', quality=80)
+    same = ReceiptImagePreprocessor(enabled=True, max_dimension=2048, grayscale=True, output_format='JPEG', quality=80)
+    resized = ReceiptImagePreprocessor(enabled=True, max_dimension=1024, grayscale=True, output_format='JPEG', quality=80)
+
+    assert base.fingerprint() == same.fingerprint()
+    assert base.fingerprint() != resized.fingerprint()
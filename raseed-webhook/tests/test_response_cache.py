@@ -0,0 +1,68 @@
+import pytest
+
+from response_cache import ResponseCache, normalize_query
+
+
+@pytest.mark.parametrize('query', ['What is Raseed?', '  what   is raseed ', 'WHAT IS RASEED!!'])
+def test_trivially_different_queries_share_a_key(query):
+    assert ResponseCache.make_key('gemini', query) == ('gemini', 'what is raseed')
+
+
+def test_non_string_queries_are_normalized():
+    assert normalize_query(42) == '42'
+    assert normalize_query(None) == 'none'
+
+
+def test_keys_are_scoped_by_model():
+    cache = ResponseCache()
+    cache.set(ResponseCache.make_key('flash', 'hi'), 'from flash')
+
+    assert cache.get(ResponseCache.make_key('pro', 'hi')) is None
+    assert cache.get(ResponseCache.make_key('flash', 'hi')) == 'from flash'
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('response_cache.time.monotonic', lambda: now[0])
+    cache = ResponseCache(ttl_seconds=10)
+    cache.set('k', 'v')
+
+    now[0] += 9
+    assert cache.get('k') == 'v'
+    now[0] += 2
+    assert cache.get('k') is None
+    assert cache.stats()["expirations"] == 1
+    assert cache.stats()["bytes"] == 0
+
+
+def test_least_recently_used_entry_is_evicted_first():
+    cache = ResponseCache(max_entries=2)
+    cache.set('a', '1')
+    cache.set('b', '2')
+    cache.get('a')
+    cache.set('c', '3')
+
+    assert cache.get('b') is None
+    assert cache.get('a') == '1'
+    assert cache.get('c') == '3'
+    assert cache.stats()["evictions"] == 1
+
+
+def test_byte_limit_counts_utf8_and_overwrites():
+    cache = ResponseCache(max_bytes=10)
+    cache.set('a', 'ééé')
+    cache.set('a', 'éé')
+    assert cache.stats()["bytes"] == 4
+
+    cache.set('b', 'x' * 7)
+    assert cache.get('a') is None
+    assert cache.stats()["bytes"] == 7
+
+
+def test_values_larger_than_the_cache_are_not_stored():
+    cache = ResponseCache(max_bytes=4)
+    cache.set('a', 'abcd')
+    cache.set('b', 'abcde')
+
+    assert cache.get('a') == 'abcd'
+    assert cache.get('b') is None
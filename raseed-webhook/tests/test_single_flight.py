@@ -0,0 +1,130 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from single_flight import AsyncSingleFlight, SingleFlight
+
+
+def run_concurrently(count, target):
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def wait_for_leader(flight):
+    deadline = time.monotonic() + 5
+    while not flight.in_flight() and time.monotonic() < deadline:
+        time.sleep(0.001)
+
+
+def test_concurrent_callers_share_one_upstream_call():
+    flight = SingleFlight(wait_seconds=5)
+    release = threading.Event()
+    calls = []
+    results = []
+
+    def upstream():
+        calls.append(1)
+        release.wait(5)
+        return 'answer'
+
+    leader = run_concurrently(1, lambda: results.append(flight.do('q', upstream)))
+    wait_for_leader(flight)
+    followers = run_concurrently(4, lambda: results.append(flight.do('q', upstream)))
+    release.set()
+    for thread in leader + followers:
+        thread.join(5)
+
+    assert calls == [1]
+    assert results == ['answer'] * 5
+    stats = flight.stats()
+    assert (stats["leader_calls"], stats["in_flight"]) == (1, 0)
+    assert stats["keys"][0]["key"] == 'q'
+
+
+def test_followers_see_the_leaders_error():
+    flight = SingleFlight(wait_seconds=5)
+    release = threading.Event()
+    errors = []
+
+    def upstream():
+        release.wait(5)
+        raise RuntimeError('upstream down')
+
+    def call():
+        try:
+            flight.do('q', upstream)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    threads = run_concurrently(1, call)
+    wait_for_leader(flight)
+    threads += run_concurrently(2, call)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert errors == ['upstream down'] * 3
+    assert flight.in_flight() == 0
+
+
+def test_follower_calls_upstream_itself_when_the_leader_is_stuck():
+    flight = SingleFlight(wait_seconds=0.05)
+    release = threading.Event()
+    threads = run_concurrently(1, lambda: flight.do('q', lambda: release.wait(5)))
+    wait_for_leader(flight)
+
+    assert flight.do('q', lambda: 'own call') == 'own call'
+    assert flight.stats()["timeouts"] == 1
+    release.set()
+    threads[0].join(5)
+
+
+def test_metrics_keep_only_recent_keys():
+    flight = SingleFlight(metrics_keys=2)
+    for key in ('a', ('model', 'b'), 'c'):
+        flight.do(key, lambda: None)
+
+    assert [entry["key"] for entry in flight.stats()["keys"]] == ['c', 'model:b']
+
+
+def test_async_callers_share_one_upstream_call():
+    flight = AsyncSingleFlight(wait_seconds=5)
+    calls = []
+
+    async def upstream():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return 'answer'
+
+    async def main():
+        return await asyncio.gather(*(flight.do('q', upstream) for _ in range(5)))
+
+    assert asyncio.run(main()) == ['answer'] * 5
+    assert calls == [1]
+    assert flight.stats()["coalesced"] == 4
+
+
+def test_async_follower_retries_when_the_leader_is_cancelled():
+    flight = AsyncSingleFlight(wait_seconds=5)
+
+    async def slow():
+        await asyncio.sleep(5)
+
+    async def fast():
+        return 'own call'
+
+    async def main():
+        leader = asyncio.ensure_future(flight.do('q', slow))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do('q', fast))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(main()) == 'own call'
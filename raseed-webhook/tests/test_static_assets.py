@@ -0,0 +1,97 @@
+import gzip
+import hashlib
+
+import pytest
+
+import static_assets
+from static_assets import StaticAssetPipeline
+
+APP_JS = ("console.log('raseed');\n" * 50).encode('utf-8')
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    monkeypatch.setattr(static_assets, 'STATIC_BUILD_DIR', str(tmp_path / 'build'))
+    static_dir = tmp_path / 'static'
+    static_dir.mkdir()
+    (static_dir / 'app.js').write_bytes(APP_JS)
+    (static_dir / 'logo.png').write_bytes(b'\x89PNG' + bytes(1000))
+    (static_dir / 'index.html').write_text(
+        '<script src="/app.js"></script><img src=\'logo.png\'><a href="https://example.com/app.js">x</a>'
+        '<link href="missing.css">'
+    )
+    return StaticAssetPipeline(str(static_dir))
+
+
+def test_assets_get_content_hash_names(pipeline):
+    digest = hashlib.sha256(APP_JS).hexdigest()[:12]
+
+    assert pipeline.fingerprinted['app.js'] == f"app.{digest}.js"
+    assert pipeline.get(f"app.{digest}.js").variants[None][0] == APP_JS
+
+
+def test_html_references_point_at_fingerprinted_names(pipeline):
+    html = pipeline.get('index.html').variants[None][0].decode('utf-8')
+
+    assert f'src="/{pipeline.fingerprinted["app.js"]}"' in html
+    assert f"src='{pipeline.fingerprinted['logo.png']}'" in html
+    assert 'href="https://example.com/app.js"' in html
+    assert 'href="missing.css"' in html
+
+
+def test_fingerprinted_names_are_immutable_and_plain_names_revalidate(pipeline):
+    _, fingerprinted, _ = pipeline.respond(pipeline.get(pipeline.fingerprinted['app.js']), '', None)
+    _, plain, _ = pipeline.respond(pipeline.get('app.js'), '', None)
+    _, html, _ = pipeline.respond(pipeline.get('index.html'), '', None)
+
+    assert 'immutable' in fingerprinted['Cache-Control']
+    assert plain['Cache-Control'] == html['Cache-Control'] == 'no-cache'
+    assert plain['ETag'] == fingerprinted['ETag']
+
+
+@pytest.mark.parametrize('accept_encoding, expected', [
+    ('gzip, deflate', 'gzip'),
+    ('gzip;q=0, identity', None),
+    ('', None),
+])
+def test_encoding_negotiation(pipeline, accept_encoding, expected):
+    status, headers, body = pipeline.respond(pipeline.get('app.js'), accept_encoding, None)
+
+    assert status == 200
+    assert headers.get('Content-Encoding') == expected
+    assert headers['Content-Length'] == str(len(body))
+    assert (gzip.decompress(body) if expected == 'gzip' else body) == APP_JS
+
+
+def test_brotli_is_preferred_when_available(pipeline):
+    encoding = pipeline._negotiate('gzip, br', pipeline.get('app.js').variants)
+
+    assert encoding == ('br' if static_assets.brotli else 'gzip')
+
+
+def test_binary_and_small_files_are_not_compressed(pipeline):
+    assert set(pipeline.get('logo.png').variants) == {None}
+
+
+def test_matching_etag_gets_a_304_for_any_encoding(pipeline):
+    asset = pipeline.get('app.js')
+    _, gzipped, _ = pipeline.respond(asset, 'gzip', None)
+
+    for if_none_match in (gzipped['ETag'], f'W/{gzipped["ETag"]}', f'"other", {asset.variants[None][1]["ETag"]}', '*'):
+        status, headers, body = pipeline.respond(asset, '', if_none_match)
+        assert (status, body) == (304, b'')
+        assert 'Content-Length' not in headers
+
+    assert pipeline.respond(asset, '', '"stale"')[0] == 200
+
+
+def test_compressed_variants_are_reused_from_the_build_dir(pipeline, tmp_path, monkeypatch):
+    monkeypatch.setattr(static_assets.gzip, 'compress', lambda *args, **kwargs: pytest.fail('compressed again'))
+
+    reloaded = StaticAssetPipeline(str(tmp_path / 'static'))
+
+    assert 'gzip' in reloaded.get('app.js').variants
+
+
+def test_missing_directory_disables_the_pipeline(tmp_path):
+    assert StaticAssetPipeline(str(tmp_path / 'absent')).get('index.html') is None
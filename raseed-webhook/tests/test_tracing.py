@@ -0,0 +1,118 @@
+import json
+import threading
+
+import pytest
+
+from tracing import NOOP_SPAN, Tracer, in_current_context, parse_traceparent
+
+TRACE_ID = '4bf92f3577b34da6a3ce929d0e0e4736'
+PARENT_ID = '00f067aa0ba902b7'
+
+
+@pytest.mark.parametrize('value, expected', [
+    (f"00-{TRACE_ID}-{PARENT_ID}-01", (TRACE_ID, PARENT_ID, True)),
+    (f" 00-{TRACE_ID.upper()}-{PARENT_ID}-00 ", (TRACE_ID, PARENT_ID, False)),
+    (f"01-{TRACE_ID}-{PARENT_ID}-03-future-field", (TRACE_ID, PARENT_ID, True)),
+])
+def test_valid_traceparents_are_parsed(value, expected):
+    assert parse_traceparent(value) == expected
+
+
+@pytest.mark.parametrize('value', [
+    None,
+    '',
+    f"00-{TRACE_ID}-{PARENT_ID}",
+    f"00-{TRACE_ID}-{PARENT_ID}-01-extra",
+    f"ff-{TRACE_ID}-{PARENT_ID}-01",
+    f"00-{'0' * 32}-{PARENT_ID}-01",
+    f"00-{TRACE_ID}-{'0' * 16}-01",
+    f"00-{TRACE_ID[:-1]}g-{PARENT_ID}-01",
+])
+def test_malformed_traceparents_are_rejected(value):
+    assert parse_traceparent(value) is None
+
+
+@pytest.fixture
+def tracer(tmp_path):
+    return Tracer(file_path=str(tmp_path / 'spans.jsonl'), sample_rate=1.0, exclude='/metrics', export_interval=3600)
+
+
+def exported_spans(tracer):
+    tracer.flush()
+    spans = []
+    with open(tracer.file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            for resource in json.loads(line)["resourceSpans"]:
+                for scope in resource["scopeSpans"]:
+                    spans.extend(scope["spans"])
+    return {span["name"]: span for span in spans}
+
+
+def test_request_continues_the_callers_trace(tracer):
+    span = tracer.start_request('POST /webhook', '/webhook', {
+        'traceparent': f"00-{TRACE_ID}-{PARENT_ID}-01", 'tracestate': 'vendor=1'
+    })
+    with tracer.span('gemini generate', kind='client'):
+        outbound = tracer.inject({'Accept': 'application/json'})
+    tracer.end_request(span)
+
+    spans = exported_spans(tracer)
+    server, client = spans['POST /webhook'], spans['gemini generate']
+    assert (server["traceId"], server["parentSpanId"], server["traceState"]) == (TRACE_ID, PARENT_ID, 'vendor=1')
+    assert client["parentSpanId"] == server["spanId"]
+    assert outbound == {'Accept': 'application/json', 'traceparent': f"00-{TRACE_ID}-{client['spanId']}-01",
+                        'tracestate': 'vendor=1'}
+    assert tracer.current() is NOOP_SPAN
+
+
+def test_unsampled_callers_are_not_exported(tracer):
+    span = tracer.start_request('GET /', '/', {'traceparent': f"00-{TRACE_ID}-{PARENT_ID}-00"})
+    tracer.end_request(span)
+    tracer.flush()
+
+    assert tracer.exported == 0
+
+
+def test_excluded_paths_and_disabled_tracers_are_not_traced(tracer):
+    assert tracer.start_request('GET /metrics', '/metrics', {}) is None
+    off = Tracer(file_path='', endpoint='')
+    with off.span('anything') as span:
+        assert span is NOOP_SPAN
+    assert off.inject({'a': 'b'}) == {'a': 'b'}
+
+
+def test_errors_and_attributes_are_recorded(tracer):
+    with pytest.raises(ValueError):
+        with tracer.span('receipt process', attributes={'receipt.bytes': 10, 'receipt.cached': False}) as span:
+            span.set_attribute('receipt.ratio', 0.5)
+            span.set_attribute('receipt.skipped', None)
+            raise ValueError('bad image')
+
+    span = exported_spans(tracer)['receipt process']
+    assert span["status"] == {"code": 2, "message": "ValueError: bad image"}
+    assert {attribute["key"]: attribute["value"] for attribute in span["attributes"]} == {
+        'receipt.bytes': {"intValue": "10"},
+        'receipt.cached': {"boolValue": False},
+        'receipt.ratio': {"doubleValue": 0.5}
+    }
+
+
+def test_thread_pool_work_stays_in_the_callers_span(tracer):
+    with tracer.span('parent') as parent:
+        work = in_current_context(lambda: tracer.current().span_id)
+    seen = []
+    thread = threading.Thread(target=lambda: seen.append(work()))
+    thread.start()
+    thread.join(5)
+
+    assert seen == [parent.span_id]
+
+
+def test_queue_overflow_drops_spans(tmp_path):
+    tracer = Tracer(file_path=str(tmp_path / 'spans.jsonl'), export_interval=3600, batch_size=100, max_queue=2)
+    for name in ('a', 'b', 'c'):
+        with tracer.span(name):
+            pass
+
+    assert tracer.dropped == 1
+    assert set(exported_spans(tracer)) == {'a', 'b'}
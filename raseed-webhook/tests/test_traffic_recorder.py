@@ -0,0 +1,124 @@
+import io
+import json
+
+import pytest
+
+from traffic_recorder import TrafficRecorder
+
+
+@pytest.fixture
+def recorder(tmp_path):
+    return TrafficRecorder(path=str(tmp_path / 'traffic.jsonl'), sample_rate=1.0, max_body_bytes=1024,
+                           salt='pepper', exclude='/metrics,/debug')
+
+
+def test_emails_become_stable_pseudonyms(recorder):
+    first = recorder.sanitize({"email": "Ana@Example.com"})["email"]
+    second = recorder.sanitize({"user_email": " ana@example.com "})["user_email"]
+
+    assert first == second
+    assert first.endswith('@example.invalid')
+    assert 'ana' not in first
+
+
+def test_pseudonyms_depend_on_the_salt(recorder):
+    unsalted = TrafficRecorder(path='', salt='')
+
+    assert recorder.pseudonym_email('ana@example.com') != unsalted.pseudonym_email('ana@example.com')
+
+
+def test_free_text_keeps_its_length_but_not_its_content(recorder):
+    text = "How many points does Ana Lopez have on card 4111 1111 1111 1111?"
+    sanitized = recorder.sanitize({"text": text})["text"]
+
+    assert len(sanitized) == len(text)
+    assert 'Ana' not in sanitized and '4111' not in sanitized
+    assert recorder.pseudonym_text(text) == sanitized
+
+
+def test_secrets_are_dropped_at_any_depth(recorder):
+    body = {
+        "api_key": "k",
+        "Authorization": "Bearer t",
+        "settings": {"client_secret": "s", "refresh_token": "r", "points": 5},
+        "members": [{"email": "a@b.c", "password": "p", "points": 3}]
+    }
+
+    sanitized = recorder.sanitize(body)
+
+    assert sanitized == {
+        "settings": {"points": 5},
+        "members": [{"email": recorder.pseudonym_email('a@b.c'), "points": 3}]
+    }
+
+
+def test_signed_image_urls_lose_their_query(recorder):
+    body = {
+        "image_url": "https://storage.example.com/r.png?X-Goog-Signature=abc&X-Goog-Credential=x",
+        "image_urls": ["https://cdn.example.com/a.jpg?sig=1", "https://cdn.example.com/b.jpg"]
+    }
+
+    assert recorder.sanitize(body) == {
+        "image_url": "https://storage.example.com/r.png",
+        "image_urls": ["https://cdn.example.com/a.jpg", "https://cdn.example.com/b.jpg"]
+    }
+
+
+def test_entry_sanitizes_the_query_string_and_drops_other_headers(recorder):
+    headers = {"Authorization": "Bearer secret", "Cookie": "session=1", "Accept": "application/json"}
+
+    entry = recorder.entry(0.0, 'GET', '/wallet/cards', '/wallet/cards', 'email=a%40b.c&token=t&limit=5',
+                           headers, None)
+
+    assert 'token' not in entry["query"]
+    assert 'limit=5' in entry["query"]
+    assert 'a%40b.c' not in entry["query"]
+    assert entry["headers"] == {"Accept": "application/json"}
+
+
+def test_large_json_bodies_are_recorded_by_size_only(recorder):
+    entry = recorder.entry(0.0, 'POST', '/webhook', '/webhook', '', {}, 4096, json_body={"text": "hi"})
+
+    assert "json" not in entry
+    assert entry["request_bytes"] == 4096
+
+
+def test_uploaded_files_are_described_without_moving_the_stream(recorder):
+    class Storage:
+        filename = 'Receipt.PNG'
+        content_type = 'image/png'
+        stream = io.BytesIO(b'0123456789')
+
+    Storage.stream.seek(4)
+    described = recorder.describe_file('file', Storage)
+
+    assert described["ext"] == '.png'
+    assert described["size"] == 10
+    assert len(described["sha256"]) == 64
+    assert Storage.stream.tell() == 4
+
+
+def test_flask_requests_are_recorded_sanitized(recorder, tmp_path):
+    flask = pytest.importorskip('flask')
+    app = flask.Flask(__name__)
+
+    @app.route('/webhook', methods=['POST'])
+    def webhook():
+        return {"ok": True}
+
+    @app.route('/metrics')
+    def metrics():
+        return ''
+
+    recorder.init_app(app)
+    client = app.test_client()
+    client.post('/webhook', json={"text": "my email is ana@example.com", "session_token": "t"})
+    client.get('/metrics')
+
+    lines = (tmp_path / 'traffic.jsonl').read_text().splitlines()
+    assert len(lines) == 1
+    entry = json.loads(lines[0])
+    assert entry["route"] == '/webhook'
+    assert entry["status"] == 200
+    assert entry["json"] == {"text": recorder.pseudonym_text("my email is ana@example.com")}
+    assert recorder.stats()["recorded"] == 1
@@ -0,0 +1,61 @@
+import pytest
+
+from wallet_bulk import BulkCardIssuer
+
+
+class FakeConfig:
+    ISSUER_ID = 'issuer'
+    CLASS_ID = 'class'
+
+
+class FakeWalletService:
+    """Enough of GoogleWalletService for submit() to validate and record a job"""
+
+    service = object()
+    config = FakeConfig()
+
+    def __init__(self, card_index):
+        self.card_index = card_index
+
+    def card_object_id(self, email):
+        return f"issuer.card-{email.lower()}"
+
+
+@pytest.fixture
+def issuer(tmp_path, monkeypatch):
+    from card_index import IssuedCardIndex
+
+    issuer = BulkCardIssuer(FakeWalletService(IssuedCardIndex(str(tmp_path / 'cards.db'))), db_path=str(tmp_path / 'bulk.db'))
+    # Validation is under test here, not the background sender
+    monkeypatch.setattr(issuer, 'resume', lambda job_id: None)
+    return issuer
+
+
+@pytest.mark.parametrize('members, error', [
+    ({"email": "a@example.com"}, "members must be a list"),
+    ([], "At least one member is required"),
+    (["a@example.com"], "Member 0 must be an object"),
+    ([{"email": "a@example.com"}, {"name": "B"}], "Member 1 is missing an email"),
+    ([{"email": 5}], "Member 0 is missing an email"),
+    ([{"email": "a@example.com", "name": {"first": "A"}}], "Member 0 has a name that isn't a string"),
+    ([{"email": "a@example.com", "points": "lots"}], "Member 0 has non-integer points"),
+    ([{"email": "a@example.com", "points": None}], "Member 0 has non-integer points"),
+])
+def test_invalid_members_are_rejected(issuer, members, error):
+    assert issuer.submit(members) == {"error": error}
+
+
+def test_members_share_the_card_object_id(issuer):
+    result = issuer.submit([{"email": "A@example.com", "points": "5"}, {"email": "a@example.com"}])
+
+    assert result["success"]
+    members = issuer.status(result["job_id"])["members"]
+    assert [member["object_id"] for member in members] == ["issuer.card-a@example.com"] * 2
+
+
+def test_members_already_indexed_keep_their_card(issuer):
+    issuer.wallet_service.card_index.put('a@example.com', 'issuer.class', 'issuer.legacy-1', 'https://save/1')
+
+    result = issuer.submit([{"email": "a@example.com"}])
+
+    assert issuer.status(result["job_id"])["members"][0]["object_id"] == 'issuer.legacy-1'
@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+from google_wallet_service import SAVE_JWT_OBJECT_FIELDS, GoogleWalletService
+
+
+@pytest.fixture
+def wallet(tmp_path, monkeypatch):
+    serialization = pytest.importorskip('cryptography.hazmat.primitives.serialization')
+    rsa = pytest.importorskip('cryptography.hazmat.primitives.asymmetric.rsa')
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    key_path = tmp_path / 'service-account-key.json'
+    key_path.write_text(json.dumps({
+        "type": "service_account",
+        "project_id": "raseed-tests",
+        "private_key_id": "tests",
+        "private_key": key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+        ).decode('utf-8'),
+        "client_email": "wallet@raseed-tests.iam.gserviceaccount.com",
+        "client_id": "1",
+        "token_uri": "https://oauth2.googleapis.com/token"
+    }))
+    monkeypatch.setenv('GOOGLE_WALLET_SERVICE_ACCOUNT_FILE', str(key_path))
+    return GoogleWalletService()
+
+
+def test_default_save_link_fits_the_limit(wallet):
+    result = wallet.create_save_jwt_url(
+        'alexandra.montgomery-smith@example.com', 'Alexandra Montgomery-Smith', 12345,
+        object_id=wallet.card_object_id('alexandra.montgomery-smith@example.com')
+    )
+
+    assert result["success"]
+    assert len(result["save_url"]) <= wallet.config.MAX_SAVE_URL_LENGTH
+
+
+def test_save_link_carries_only_per_member_fields(wallet):
+    from google.auth import jwt
+
+    result = wallet.create_save_jwt_url('a@example.com', 'A', 10)
+    token = result["save_url"].rsplit('/', 1)[1]
+    claims = jwt.decode(token, verify=False)
+
+    loyalty_object = claims["payload"]["loyaltyObjects"][0]
+    assert set(loyalty_object) <= set(SAVE_JWT_OBJECT_FIELDS)
+    assert loyalty_object["accountId"] == 'a@example.com'
+    assert loyalty_object["loyaltyPoints"]["balance"]["stringBalance"] == '10'
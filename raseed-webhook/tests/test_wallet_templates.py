@@ -0,0 +1,81 @@
+import json
+
+import pytest
+
+from wallet_templates import TEMPLATE_FIELDS, WalletTemplate, load_templates
+
+OBJECT_FIELDS = TEMPLATE_FIELDS['loyalty_object']
+
+
+def object_template(document):
+    return WalletTemplate('loyalty_object', document, OBJECT_FIELDS['placeholders'], OBJECT_FIELDS['required'])
+
+
+def test_shipped_templates_render():
+    templates = load_templates()
+
+    loyalty_object = templates['loyalty_object'].render(
+        object_id='issuer.card-1', class_id='issuer.class', email='a@b.c', name='Ana', points=12
+    )
+
+    assert loyalty_object["id"] == 'issuer.card-1'
+    assert loyalty_object["classId"] == 'issuer.class'
+    assert json.dumps(loyalty_object).count('$') == 0
+
+
+def test_placeholders_are_substituted_whole_and_inside_text():
+    template = object_template({
+        "id": "$object_id",
+        "classId": "${class_id}",
+        "state": "ACTIVE",
+        "accountName": "Member ${name} <$email>",
+        "loyaltyPoints": {"balance": {"string": "$points"}},
+        "textModules": [{"body": "Costs $$5"}, {"body": "$$${points} off"}]
+    })
+
+    rendered = template.render(object_id='o', class_id='c', email='a@b.c', name='Ana', points=7)
+
+    assert rendered == {
+        "id": "o",
+        "classId": "c",
+        "state": "ACTIVE",
+        "accountName": "Member Ana <a@b.c>",
+        "loyaltyPoints": {"balance": {"string": "7"}},
+        "textModules": [{"body": "Costs $5"}, {"body": "$7 off"}]
+    }
+
+
+def test_static_parts_are_shared_between_renders():
+    template = object_template({"id": "$object_id", "classId": "c", "state": "ACTIVE",
+                                "textModules": [{"header": "Welcome"}]})
+
+    first = template.render(object_id='a')
+    second = template.render(object_id='b')
+
+    assert first["textModules"] is second["textModules"]
+    assert (first["id"], second["id"]) == ('a', 'b')
+
+
+def test_rendering_needs_every_placeholder():
+    template = object_template({"id": "$object_id", "classId": "$class_id", "state": "ACTIVE"})
+
+    with pytest.raises(KeyError, match='class_id'):
+        template.render(object_id='o')
+
+
+@pytest.mark.parametrize('document, message', [
+    ([], 'must be a JSON object'),
+    ({"id": "x", "classId": "c"}, 'missing required fields: state'),
+    ({"id": "$objectid", "classId": "c", "state": "ACTIVE"}, 'unknown placeholders: objectid'),
+    ({"id": "$", "classId": "c", "state": "ACTIVE"}, 'invalid placeholder'),
+])
+def test_unusable_templates_are_rejected(document, message):
+    with pytest.raises(ValueError, match=message):
+        object_template(document)
+
+
+def test_load_templates_reports_the_broken_file(tmp_path):
+    (tmp_path / 'loyalty_class.json').write_text('{not json')
+
+    with pytest.raises(ValueError, match='loyalty_class.json'):
+        load_templates(str(tmp_path))
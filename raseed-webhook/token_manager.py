@@ -0,0 +1,161 @@
+import datetime
+import os
+import threading
+import time
+from metrics import track_upstream
+from tracing import tracer
+
+# Refresh access tokens this many seconds before they expire. Keep it above
+# google-auth's own 225 second threshold so requests never refresh inline.
+WALLET_TOKEN_REFRESH_MARGIN = float(os.environ.get('WALLET_TOKEN_REFRESH_MARGIN', '300'))
+# Back-off bounds between failed background refresh attempts
+WALLET_TOKEN_RETRY_MIN_SECONDS = float(os.environ.get('WALLET_TOKEN_RETRY_MIN_SECONDS', '1'))
+WALLET_TOKEN_RETRY_MAX_SECONDS = float(os.environ.get('WALLET_TOKEN_RETRY_MAX_SECONDS', '60'))
+
+
+def _utcnow():
+    # google-auth stores expiry as a naive UTC datetime
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+class TokenManager:
+    """
+    Keep a service account's OAuth access token fresh from a background thread.
+
+    Every refresh, including the inline one google-auth would otherwise do
+    inside a Wallet request, goes through one lock, so concurrent callers
+    wait for a single token exchange instead of each starting their own.
+    """
+
+    def __init__(self, credentials, refresh_margin=WALLET_TOKEN_REFRESH_MARGIN):
+        self.credentials = credentials
+        self.refresh_margin = refresh_margin
+
+        self._refresh_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._started = False
+        self._stopping = threading.Event()
+
+        self.fetched_at = None
+        self.refreshes = 0
+        self.inline_refreshes = 0
+        self.refresh_failures = 0
+        self.last_refresh_ms = None
+        self.max_refresh_ms = 0.0
+        self.total_refresh_ms = 0.0
+        self.last_error = None
+
+        os.register_at_fork(after_in_child=self._after_fork)
+
+        # Route google-auth's own refreshes (from before_request) through the manager
+        self._refresh_credentials = credentials.refresh
+        credentials.refresh = self._inline_refresh
+
+    def start(self):
+        """Start the background refresh thread; safe to call more than once"""
+        with self._start_lock:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self._refresh_loop, name="wallet-token-refresh", daemon=True).start()
+
+    def stop(self):
+        """Stop the background refresh thread"""
+        self._stopping.set()
+
+    def expires_in(self):
+        """Seconds until the current token expires, or None if there is no token yet"""
+        expiry = self.credentials.expiry
+        if not self.credentials.token or expiry is None:
+            return None
+        return (expiry - _utcnow()).total_seconds()
+
+    def refresh(self, request=None, inline=False):
+        """Fetch a new token unless another thread already did while we waited"""
+        with self._refresh_lock:
+            if inline:
+                if self.credentials.valid:
+                    return
+            else:
+                expires_in = self.expires_in()
+                if expires_in is not None and expires_in > self.refresh_margin:
+                    return
+
+            started = time.perf_counter()
+            try:
+                with track_upstream('oauth_token', 'inline_refresh' if inline else 'refresh'):
+                    self._refresh_credentials(request or self._request())
+            except Exception as e:
+                with self._stats_lock:
+                    self.refresh_failures += 1
+                    self.last_error = str(e)
+                raise
+
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with self._stats_lock:
+                self.fetched_at = time.time()
+                self.refreshes += 1
+                if inline:
+                    self.inline_refreshes += 1
+                self.last_refresh_ms = round(elapsed_ms, 2)
+                self.max_refresh_ms = max(self.max_refresh_ms, elapsed_ms)
+                self.total_refresh_ms += elapsed_ms
+                self.last_error = None
+
+    def stats(self):
+        """Return token age, expiry and refresh latency metrics"""
+        expires_in = self.expires_in()
+        with self._stats_lock:
+            return {
+                "has_token": bool(self.credentials.token),
+                "token_age_seconds": round(time.time() - self.fetched_at, 1) if self.fetched_at else None,
+                "expires_in_seconds": round(expires_in, 1) if expires_in is not None else None,
+                "refreshes": self.refreshes,
+                "inline_refreshes": self.inline_refreshes,
+                "refresh_failures": self.refresh_failures,
+                "last_refresh_ms": self.last_refresh_ms,
+                "avg_refresh_ms": round(self.total_refresh_ms / self.refreshes, 2) if self.refreshes else None,
+                "max_refresh_ms": round(self.max_refresh_ms, 2),
+                "last_error": self.last_error
+            }
+
+    def _after_fork(self):
+        # The refresh thread doesn't survive a fork; start a new one in the worker
+        self._refresh_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        was_started, self._started = self._started, False
+        if was_started:
+            self.start()
+
+    def _inline_refresh(self, request):
+        # Includes waiting for a refresh another thread already started
+        with tracer.span('wallet wait_for_token'):
+            self.refresh(request, inline=True)
+
+    def _refresh_loop(self):
+        retry_delay = WALLET_TOKEN_RETRY_MIN_SECONDS
+        while not self._stopping.is_set():
+            expires_in = self.expires_in()
+            delay = 0 if expires_in is None else expires_in - self.refresh_margin
+            if delay > 0:
+                self._stopping.wait(delay)
+                continue
+
+            try:
+                self.refresh()
+                retry_delay = WALLET_TOKEN_RETRY_MIN_SECONDS
+                # Pace the loop even if the new token is already inside the margin
+                self._stopping.wait(WALLET_TOKEN_RETRY_MIN_SECONDS)
+            except Exception as e:
+                print(f"Wallet token refresh failed, retrying in {retry_delay:.0f}s: {e}")
+                self._stopping.wait(retry_delay)
+                retry_delay = min(retry_delay * 2, WALLET_TOKEN_RETRY_MAX_SECONDS)
+
+    @staticmethod
+    def _request():
+        from google.auth.transport.requests import Request
+        from http_client import upstream_client
+
+        return Request(session=upstream_client.session)
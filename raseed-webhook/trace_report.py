@@ -0,0 +1,157 @@
+"""
+Find the slow step of slow requests in spans exported by tracing.py.
+
+Lists the slowest traced requests with the step that took the most time of
+its own (time not covered by child spans), or prints one trace as a tree
+with offsets and durations. Reads TRACING_FILE output, or any OTLP JSON
+lines file such as the OpenTelemetry Collector's file exporter writes.
+
+Run with:
+    python trace_report.py traces.jsonl
+    python trace_report.py traces.jsonl --route /wallet/create-card --top 10
+    python trace_report.py traces.jsonl --trace 4bf92f3577b34da6a3ce929d0e0e4736
+
+The trace ID of a sampled request is returned in its X-Trace-Id response header.
+"""
+
+import argparse
+import json
+import sys
+
+
+def load_spans(paths):
+    """Read spans from OTLP JSON lines files, grouped by trace ID"""
+    traces = {}
+    skipped = 0
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    document = json.loads(line)
+                except ValueError:
+                    skipped += 1
+                    continue
+                for resource_spans in document.get("resourceSpans", []):
+                    for scope_spans in resource_spans.get("scopeSpans", []):
+                        for span in scope_spans.get("spans", []):
+                            traces.setdefault(span["traceId"], []).append(_flatten(span))
+    return traces, skipped
+
+
+def _flatten(span):
+    attributes = {}
+    for attribute in span.get("attributes", []):
+        value = attribute.get("value", {})
+        attributes[attribute["key"]] = next(iter(value.values()), None)
+    start = int(span["startTimeUnixNano"])
+    return {
+        "span_id": span["spanId"],
+        "parent_id": span.get("parentSpanId") or None,
+        "name": span["name"],
+        "start": start,
+        "duration_ms": (int(span["endTimeUnixNano"]) - start) / 1e6,
+        "attributes": attributes,
+        "error": span.get("status", {}).get("message") if span.get("status", {}).get("code") == 2 else None
+    }
+
+
+def build_tree(spans):
+    """Root spans of a trace and each span's children, in start order"""
+    by_id = {span["span_id"]: span for span in spans}
+    children = {}
+    roots = []
+    for span in sorted(spans, key=lambda span: span["start"]):
+        if span["parent_id"] in by_id:
+            children.setdefault(span["parent_id"], []).append(span)
+        else:
+            # The parent is remote (an upstream caller) or was not exported
+            roots.append(span)
+    return roots, children
+
+
+def self_time(span, children):
+    """Time spent in a span and not in any of its children"""
+    covered = sum(child["duration_ms"] for child in children.get(span["span_id"], []))
+    return max(span["duration_ms"] - covered, 0.0)
+
+
+def slowest_step(root, children):
+    """The span below root with the largest self time"""
+    slowest = None
+    pending = [root]
+    while pending:
+        span = pending.pop()
+        pending.extend(children.get(span["span_id"], []))
+        if slowest is None or self_time(span, children) > self_time(slowest, children):
+            slowest = span
+    return slowest
+
+
+def print_slowest(traces, route=None, top=20):
+    """List the slowest requests and the step that dominated each"""
+    requests = []
+    for trace_id, spans in traces.items():
+        roots, children = build_tree(spans)
+        for root in roots:
+            if route and root["attributes"].get("http.route") != route:
+                continue
+            requests.append((root["duration_ms"], trace_id, root, slowest_step(root, children), children))
+    requests.sort(key=lambda item: item[0], reverse=True)
+
+    print(f"{'trace id':<32}  {'ms':>9}  {'request':<36} slowest step")
+    for duration, trace_id, root, step, children in requests[:top]:
+        print(f"{trace_id:<32}  {duration:9.1f}  {root['name'][:36]:<36} "
+              f"{step['name']} ({self_time(step, children):.1f} ms self)")
+
+
+def print_trace(spans):
+    """Print one trace as an indented tree with start offsets and durations"""
+    roots, children = build_tree(spans)
+    origin = min(span["start"] for span in spans)
+    slowest = {slowest_step(root, children)["span_id"] for root in roots}
+
+    def show(span, depth):
+        offset = (span["start"] - origin) / 1e6
+        details = ', '.join(
+            f"{key}={value}" for key, value in span["attributes"].items()
+            if key not in ('http.method', 'http.route', 'upstream', 'operation')
+        )
+        marker = '  <- slowest step' if span["span_id"] in slowest else ''
+        error = f"  ERROR {span['error']}" if span["error"] else ''
+        print(f"{offset:9.1f} ms {span['duration_ms']:9.1f} ms  {'  ' * depth}{span['name']}"
+              f"{f' [{details}]' if details else ''}{error}{marker}")
+        for child in children.get(span["span_id"], []):
+            show(child, depth + 1)
+
+    print(f"{'start':>12} {'duration':>12}")
+    for root in roots:
+        show(root, 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report slow requests and their slowest step from exported spans")
+    parser.add_argument('files', nargs='+', help="Span files written by tracing.py (TRACING_FILE)")
+    parser.add_argument('--trace', help="Print this trace ID as a tree")
+    parser.add_argument('--route', help="Only list requests to this route, e.g. /wallet/create-card")
+    parser.add_argument('--top', type=int, default=20, help="Number of slow requests to list")
+    args = parser.parse_args()
+
+    traces, skipped = load_spans(args.files)
+    if skipped:
+        print(f"Skipped {skipped} unreadable lines")
+    if args.trace:
+        spans = traces.get(args.trace.lower())
+        if not spans:
+            print(f"Trace {args.trace} not found")
+            return 1
+        print_trace(spans)
+        return 0
+    if not traces:
+        print("No spans found")
+        return 1
+    print_slowest(traces, args.route, args.top)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
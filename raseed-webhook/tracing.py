@@ -0,0 +1,336 @@
+import atexit
+import contextvars
+import json
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+import requests
+
+# Append finished spans to this file as OTLP JSON lines; empty disables file export
+TRACING_FILE = os.environ.get('TRACING_FILE', '')
+# OTLP/HTTP JSON collector endpoint, e.g. http://localhost:4318/v1/traces; empty disables it
+TRACING_OTLP_ENDPOINT = os.environ.get('TRACING_OTLP_ENDPOINT', '')
+# Fraction of new traces recorded; requests arriving with a traceparent follow the caller's decision
+TRACING_SAMPLE_RATE = float(os.environ.get('TRACING_SAMPLE_RATE', '1.0'))
+# Reported as service.name on every span
+TRACING_SERVICE_NAME = os.environ.get('TRACING_SERVICE_NAME', 'raseed-webhook')
+# Path prefixes never traced
+TRACING_EXCLUDE = os.environ.get('TRACING_EXCLUDE', '/metrics')
+# Export batching; spans beyond the queue limit are dropped rather than slowing requests
+TRACING_EXPORT_INTERVAL = float(os.environ.get('TRACING_EXPORT_INTERVAL', '2'))
+TRACING_BATCH_SIZE = int(os.environ.get('TRACING_BATCH_SIZE', '512'))
+TRACING_MAX_QUEUE = int(os.environ.get('TRACING_MAX_QUEUE', '10000'))
+
+TRACEPARENT_HEADER = 'traceparent'
+TRACESTATE_HEADER = 'tracestate'
+TRACE_ID_HEADER = 'X-Trace-Id'
+
+_TRACEPARENT = re.compile(r'^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})(-.*)?$')
+_INVALID_TRACE_ID = '0' * 32
+_INVALID_SPAN_ID = '0' * 16
+
+# OTLP span kinds and status codes
+SPAN_KINDS = {'internal': 1, 'server': 2, 'client': 3}
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+_current_span = contextvars.ContextVar('raseed_current_span', default=None)
+
+
+class Span:
+    """One timed step of a trace; ended spans are handed to the tracer for export"""
+
+    __slots__ = ('tracer', 'trace_id', 'span_id', 'parent_id', 'name', 'kind', 'sampled', 'tracestate',
+                 'attributes', 'error', 'start_ns', '_started', 'end_ns', '_token')
+
+    def __init__(self, tracer, trace_id, parent_id, name, kind, sampled, tracestate=None, attributes=None):
+        self.tracer = tracer
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64) or 1:016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.sampled = sampled
+        self.tracestate = tracestate
+        self.attributes = dict(attributes) if attributes else {}
+        self.error = None
+        self.start_ns = time.time_ns()
+        self._started = time.perf_counter_ns()
+        self.end_ns = None
+        self._token = None
+
+    def set_attribute(self, key, value):
+        """Attach a value to the span; None is ignored"""
+        if value is not None:
+            self.attributes[key] = value
+
+    def set_error(self, error):
+        """Mark the span as failed, with an exception or a short description"""
+        self.error = error if isinstance(error, str) else f"{type(error).__name__}: {error}"
+
+    def traceparent(self):
+        """W3C traceparent header value naming this span as the parent"""
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def end(self):
+        """Stop the clock and queue the span for export"""
+        if self.end_ns is not None:
+            return
+        self.end_ns = self.start_ns + (time.perf_counter_ns() - self._started)
+        if self.sampled:
+            self.tracer._enqueue(self)
+
+
+class _NoopSpan:
+    """Stands in for a span when tracing is off, so callers never need to check"""
+
+    trace_id = None
+    sampled = False
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_error(self, error):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def parse_traceparent(value):
+    """(trace_id, parent_span_id, sampled) from a traceparent header, or None if it is malformed"""
+    match = _TRACEPARENT.match((value or '').strip().lower())
+    if not match:
+        return None
+    version, trace_id, span_id, flags, rest = match.groups()
+    if version == 'ff' or (version == '00' and rest) or trace_id == _INVALID_TRACE_ID or span_id == _INVALID_SPAN_ID:
+        return None
+    return trace_id, span_id, bool(int(flags, 16) & 1)
+
+
+def in_current_context(fn):
+    """Wrap fn so calls from other threads (e.g. a thread pool) stay inside the caller's span"""
+    context = contextvars.copy_context()
+    # Each call gets its own copy; one Context can't be entered by two threads at once
+    return lambda *args: context.copy().run(fn, *args)
+
+
+class Tracer:
+    """
+    Minimal in-process tracer. Spans live in a context variable, so they nest
+    across function calls and follow requests into asyncio tasks and into
+    threads started through in_current_context(). Outbound requests carry the
+    current span as a W3C traceparent header. Finished spans are batched by a
+    background thread and written as OTLP JSON, either appended to a local file
+    (one export request per line, readable by trace_report.py and by the
+    OpenTelemetry Collector's otlpjsonfile receiver) or posted to a collector.
+    """
+
+    def __init__(self, file_path=TRACING_FILE, endpoint=TRACING_OTLP_ENDPOINT, sample_rate=TRACING_SAMPLE_RATE,
+                 service_name=TRACING_SERVICE_NAME, exclude=TRACING_EXCLUDE, export_interval=TRACING_EXPORT_INTERVAL,
+                 batch_size=TRACING_BATCH_SIZE, max_queue=TRACING_MAX_QUEUE):
+        self.file_path = file_path
+        self.endpoint = endpoint
+        self.enabled = bool(file_path or endpoint)
+        self.sample_rate = sample_rate
+        self.service_name = service_name
+        self.exclude = tuple(prefix.strip() for prefix in exclude.split(',') if prefix.strip())
+        self.export_interval = export_interval
+        self.batch_size = batch_size
+        self.max_queue = max_queue
+        self._reset_state()
+
+        os.register_at_fork(after_in_child=self._after_fork)
+        if self.enabled:
+            atexit.register(self.flush)
+
+    def _reset_state(self):
+        self._lock = threading.Lock()
+        self._export_lock = threading.Lock()
+        self._queue = []
+        self._wake = threading.Event()
+        self._exporter = None
+        self._fd = None
+        self._session = None
+        self.exported = 0
+        self.dropped = 0
+        self.export_errors = 0
+
+    def current(self):
+        """The active span, or a no-op stand-in"""
+        return _current_span.get() or NOOP_SPAN
+
+    @contextmanager
+    def span(self, name, kind='internal', attributes=None):
+        """Time a block as a child of the active span (or as a new trace)"""
+        if not self.enabled:
+            yield NOOP_SPAN
+            return
+        span = self._start(name, kind, _current_span.get(), attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set_error(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+
+    def start_request(self, name, path, headers, attributes=None):
+        """Open the server span for an incoming request, continuing the caller's trace if it sent one"""
+        if not self.enabled or path.startswith(self.exclude):
+            return None
+        remote = parse_traceparent(headers.get(TRACEPARENT_HEADER))
+        if remote:
+            trace_id, parent_id, sampled = remote
+            span = Span(self, trace_id, parent_id, name, 'server', sampled,
+                        headers.get(TRACESTATE_HEADER), attributes)
+        else:
+            span = self._start(name, 'server', None, attributes)
+        span._token = _current_span.set(span)
+        return span
+
+    def end_request(self, span):
+        """Close a span opened by start_request()"""
+        try:
+            _current_span.reset(span._token)
+        except ValueError:
+            # Ended from a copy of the request's context (a task sending the body); the copy dies with it
+            pass
+        span.end()
+
+    def inject(self, headers=None):
+        """Headers with the active span's trace context added; the caller's dict is left untouched"""
+        span = _current_span.get()
+        if span is None:
+            return headers
+        headers = dict(headers or {})
+        headers[TRACEPARENT_HEADER] = span.traceparent()
+        if span.tracestate:
+            headers[TRACESTATE_HEADER] = span.tracestate
+        return headers
+
+    def flush(self):
+        """Export everything queued so far"""
+        while self._export_batch():
+            pass
+
+    def _start(self, name, kind, parent, attributes):
+        if parent is not None:
+            return Span(self, parent.trace_id, parent.span_id, name, kind, parent.sampled, parent.tracestate, attributes)
+        sampled = self.sample_rate >= 1 or random.random() < self.sample_rate
+        return Span(self, f"{random.getrandbits(128) or 1:032x}", None, name, kind, sampled, None, attributes)
+
+    def _enqueue(self, span):
+        with self._lock:
+            if len(self._queue) >= self.max_queue:
+                self.dropped += 1
+                if self.dropped == 1:
+                    print(f"Trace export is falling behind; dropping spans beyond {self.max_queue} queued")
+                return
+            self._queue.append(span)
+            queued = len(self._queue)
+            if self._exporter is None:
+                self._exporter = threading.Thread(target=self._export_loop, name="trace-exporter", daemon=True)
+                self._exporter.start()
+        if queued >= self.batch_size:
+            self._wake.set()
+
+    def _export_loop(self):
+        while True:
+            self._wake.wait(self.export_interval)
+            self._wake.clear()
+            self.flush()
+
+    def _export_batch(self):
+        with self._export_lock:
+            with self._lock:
+                batch = self._queue[:self.batch_size]
+                del self._queue[:self.batch_size]
+            if not batch:
+                return False
+            body = json.dumps(self._encode(batch), separators=(',', ':'), default=str)
+            try:
+                if self.file_path:
+                    # One write per line on an O_APPEND descriptor keeps lines whole across workers
+                    os.write(self._descriptor(), (body + '\n').encode('utf-8'))
+                if self.endpoint:
+                    response = self._collector().post(
+                        self.endpoint, data=body, headers={'Content-Type': 'application/json'}, timeout=10
+                    )
+                    response.raise_for_status()
+                self.exported += len(batch)
+            except (OSError, requests.exceptions.RequestException) as e:
+                self.export_errors += 1
+                if self.export_errors == 1:
+                    print(f"Trace export failed, dropping {len(batch)} spans: {e}")
+            return True
+
+    def _encode(self, spans):
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": _attributes({"service.name": self.service_name, "process.pid": os.getpid()})},
+                "scopeSpans": [{
+                    "scope": {"name": "raseed.tracing"},
+                    "spans": [_encode_span(span) for span in spans]
+                }]
+            }]
+        }
+
+    def _descriptor(self):
+        if self._fd is None:
+            directory = os.path.dirname(os.path.abspath(self.file_path))
+            os.makedirs(directory, exist_ok=True)
+            self._fd = os.open(self.file_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        return self._fd
+
+    def _collector(self):
+        # A session of its own: exports must not be traced or counted as upstream calls
+        if self._session is None:
+            self._session = requests.Session()
+        return self._session
+
+    def _after_fork(self):
+        # Each worker exports its own spans with its own thread, descriptor and connections
+        self._reset_state()
+
+
+def _encode_span(span):
+    encoded = {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": SPAN_KINDS[span.kind],
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns),
+        "attributes": _attributes(span.attributes),
+        "status": {"code": STATUS_ERROR, "message": span.error} if span.error else {"code": STATUS_OK}
+    }
+    if span.parent_id:
+        encoded["parentSpanId"] = span.parent_id
+    if span.tracestate:
+        encoded["traceState"] = span.tracestate
+    return encoded
+
+
+def _attributes(values):
+    encoded = []
+    for key, value in values.items():
+        if isinstance(value, bool):
+            typed = {"boolValue": value}
+        elif isinstance(value, int):
+            typed = {"intValue": str(value)}
+        elif isinstance(value, float):
+            typed = {"doubleValue": value}
+        else:
+            typed = {"stringValue": str(value)}
+        encoded.append({"key": key, "value": typed})
+    return encoded
+
+
+# Shared tracer used by every handler, service and upstream client
+tracer = Tracer()
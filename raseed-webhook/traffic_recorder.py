@@ -0,0 +1,280 @@
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Opt-in request recording for traffic_replay.py; empty disables it
+TRAFFIC_RECORD_PATH = os.environ.get('TRAFFIC_RECORD_PATH', '')
+# Fraction of requests recorded
+TRAFFIC_RECORD_SAMPLE_RATE = float(os.environ.get('TRAFFIC_RECORD_SAMPLE_RATE', '1.0'))
+# JSON and form bodies larger than this are recorded by size only
+TRAFFIC_RECORD_MAX_BODY_BYTES = int(os.environ.get('TRAFFIC_RECORD_MAX_BODY_BYTES', '65536'))
+# Mixed into every pseudonym so recorded emails can't be recovered by guessing
+TRAFFIC_RECORD_SALT = os.environ.get('TRAFFIC_RECORD_SALT', '')
+# Path prefixes never recorded
+TRAFFIC_RECORD_EXCLUDE = os.environ.get('TRAFFIC_RECORD_EXCLUDE', '/metrics')
+
+# Request headers that affect how the app answers; everything else is dropped
+RECORDED_HEADERS = ('Accept', 'Accept-Encoding', 'Cache-Control', 'Content-Type', 'If-None-Match')
+
+# Body and query fields holding personal data or free text, replaced by stable pseudonyms
+EMAIL_FIELDS = {'email', 'user_email'}
+TEXT_FIELDS = {'name', 'user_name', 'text', 'class_name', 'program_name', 'issuer_name'}
+# Fields never recorded at all
+SECRET_MARKERS = ('password', 'secret', 'token', 'key', 'authorization', 'credential')
+URL_FIELDS = {'image_url', 'image_urls'}
+# Bodies recorded field by field
+FORM_TYPES = ('multipart/form-data', 'application/x-www-form-urlencoded')
+
+
+class TrafficRecorder:
+    """
+    Writes one sanitized JSON line per sampled request to an append-only log.
+    Emails and free text become salted pseudonyms (the same input always maps
+    to the same output, so repeat customers and repeated questions still
+    repeat on replay), secrets are dropped and uploaded files are recorded as
+    their size, type and SHA-256 instead of their bytes.
+    """
+
+    def __init__(self, path=TRAFFIC_RECORD_PATH, sample_rate=TRAFFIC_RECORD_SAMPLE_RATE,
+                 max_body_bytes=TRAFFIC_RECORD_MAX_BODY_BYTES, salt=TRAFFIC_RECORD_SALT,
+                 exclude=TRAFFIC_RECORD_EXCLUDE):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.max_body_bytes = max_body_bytes
+        self.salt = salt.encode('utf-8')
+        self.exclude = tuple(prefix.strip() for prefix in exclude.split(',') if prefix.strip())
+        self._fd = None
+        self._fd_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.recorded = 0
+        self.write_errors = 0
+
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    @classmethod
+    def from_env(cls):
+        """A recorder configured from the environment, or None when recording is off"""
+        return cls() if TRAFFIC_RECORD_PATH else None
+
+    def wants(self, path):
+        """Decide whether to record this request"""
+        if path.startswith(self.exclude):
+            return False
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def record(self, entry):
+        """Append one entry to the log; failures are counted, never raised into the request"""
+        line = (json.dumps(entry, separators=(',', ':'), default=str) + '\n').encode('utf-8')
+        try:
+            # One write per line on an O_APPEND descriptor keeps lines whole across workers
+            os.write(self._descriptor(), line)
+        except OSError as e:
+            with self._stats_lock:
+                self.write_errors += 1
+                first_error = self.write_errors == 1
+            if first_error:
+                print(f"Traffic recording failed: {e}")
+            return
+        with self._stats_lock:
+            self.recorded += 1
+
+    def stats(self):
+        """Report where traffic is recorded and how many entries were written"""
+        with self._stats_lock:
+            return {
+                "path": self.path,
+                "sample_rate": self.sample_rate,
+                "recorded": self.recorded,
+                "write_errors": self.write_errors
+            }
+
+    def entry(self, started, method, path, route, query_string, headers, content_length,
+              json_body=None, form=None, files=None, status=None, response_bytes=None):
+        """Build the sanitized log entry for one request"""
+        entry = {
+            "ts": round(started, 4),
+            "method": method,
+            "path": path,
+            "route": route,
+            "status": status,
+            "ms": round((time.time() - started) * 1000, 2),
+            "request_bytes": content_length,
+            "response_bytes": response_bytes
+        }
+        if query_string:
+            entry["query"] = urlencode(self._sanitize_pairs(parse_qsl(query_string, keep_blank_values=True)))
+        kept_headers = {name: headers.get(name) for name in RECORDED_HEADERS if headers.get(name)}
+        if kept_headers:
+            entry["headers"] = kept_headers
+        fits = content_length is None or content_length <= self.max_body_bytes
+        if json_body is not None and fits:
+            entry["json"] = self.sanitize(json_body)
+        if form:
+            entry["form"] = self._sanitize_pairs(form)
+        if files:
+            entry["files"] = files
+        return entry
+
+    def describe_file(self, field, storage):
+        """Size, type and SHA-256 of an uploaded file, leaving its stream where it was"""
+        described = {
+            "field": field,
+            "ext": os.path.splitext(storage.filename or '')[1].lower(),
+            "type": storage.content_type
+        }
+        stream = storage.stream
+        try:
+            # The handler may already have read the upload
+            position = stream.tell()
+            stream.seek(0)
+            digest = hashlib.sha256()
+            size = 0
+            for chunk in iter(lambda: stream.read(65536), b''):
+                digest.update(chunk)
+                size += len(chunk)
+            stream.seek(position)
+            described.update(size=size, sha256=digest.hexdigest())
+        except (AttributeError, OSError, ValueError):
+            # Not seekable; record what we know without consuming the upload
+            pass
+        return described
+
+    def sanitize(self, value, field=None):
+        """Replace personal data and secrets in a JSON value"""
+        if isinstance(value, dict):
+            return {
+                key: self.sanitize(item, key.lower())
+                for key, item in value.items()
+                if not self._is_secret(key.lower())
+            }
+        if isinstance(value, list):
+            return [self.sanitize(item, field) for item in value]
+        if not isinstance(value, str) or field is None:
+            return value
+        if field in EMAIL_FIELDS:
+            return self.pseudonym_email(value)
+        if field in TEXT_FIELDS:
+            return self.pseudonym_text(value)
+        if field in URL_FIELDS:
+            return self._strip_query(value)
+        return value
+
+    def pseudonym_email(self, email):
+        """A stable, syntactically valid stand-in for an email address"""
+        return f"user-{self._hash(email.strip().lower())}@example.invalid"
+
+    def pseudonym_text(self, text):
+        """A stable stand-in the same length as the original text"""
+        pseudonym = f"redacted-{self._hash(text)}"
+        return (pseudonym + 'x' * len(text))[:max(len(text), len(pseudonym))]
+
+    def _sanitize_pairs(self, pairs):
+        # Form data arrives as a MultiDict, query strings as a list of pairs
+        items = pairs.items(multi=True) if hasattr(pairs, 'getlist') else pairs
+        return [
+            (key, self.sanitize(value, key.lower()))
+            for key, value in items
+            if not self._is_secret(key.lower())
+        ]
+
+    @staticmethod
+    def _is_secret(field):
+        return any(marker in field for marker in SECRET_MARKERS)
+
+    @staticmethod
+    def _strip_query(url):
+        # Signed URLs carry credentials in their query string
+        parts = urlsplit(url)
+        return urlunsplit((parts.scheme, parts.netloc, parts.path, '', ''))
+
+    def _hash(self, value):
+        return hashlib.sha256(self.salt + value.encode('utf-8')).hexdigest()[:16]
+
+    def _descriptor(self):
+        if self._fd is None:
+            with self._fd_lock:
+                if self._fd is None:
+                    directory = os.path.dirname(os.path.abspath(self.path))
+                    os.makedirs(directory, exist_ok=True)
+                    self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        return self._fd
+
+    def _after_fork(self):
+        # Each worker opens the log itself; the O_APPEND descriptor could be shared, but its lock can't
+        self._fd = None
+        self._fd_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+    def init_app(self, app):
+        """Record requests served by a Flask app"""
+        from flask import g, request
+        from werkzeug.exceptions import HTTPException
+
+        @app.before_request
+        def start_traffic_recording():
+            g.traffic_record = self.wants(request.path)
+            if g.traffic_record:
+                g.traffic_started = time.time()
+
+        @app.after_request
+        def record_traffic(response):
+            if g.get('traffic_record'):
+                # Bodies are read after the handler, which may have changed the upload limit,
+                # and a body the handler rejected is left out rather than failing the response
+                json_body, form, files = None, None, None
+                try:
+                    if request.is_json:
+                        json_body = request.get_json(silent=True)
+                    elif request.mimetype in FORM_TYPES:
+                        form = request.form
+                        if request.mimetype == 'multipart/form-data':
+                            files = [self.describe_file(field, storage) for field, storage in request.files.items(multi=True)]
+                except HTTPException:
+                    pass
+                self.record(self.entry(
+                    g.traffic_started, request.method, request.path,
+                    request.url_rule.rule if request.url_rule else None,
+                    request.query_string.decode('latin-1'), request.headers, request.content_length,
+                    json_body=json_body, form=form, files=files,
+                    status=response.status_code, response_bytes=response.content_length
+                ))
+            return response
+
+    def init_quart_app(self, app):
+        """Record requests served by a Quart app"""
+        from quart import g, request
+        from werkzeug.exceptions import HTTPException
+
+        @app.before_request
+        async def start_traffic_recording():
+            g.traffic_record = self.wants(request.path)
+            if g.traffic_record:
+                g.traffic_started = time.time()
+
+        @app.after_request
+        async def record_traffic(response):
+            if g.get('traffic_record'):
+                # As in init_app: read bodies only once the handler is done with them
+                json_body, form, files = None, None, None
+                try:
+                    if request.is_json:
+                        json_body = await request.get_json(silent=True)
+                    elif request.mimetype in FORM_TYPES:
+                        form = await request.form
+                        if request.mimetype == 'multipart/form-data':
+                            uploads = await request.files
+                            files = [self.describe_file(field, storage) for field, storage in uploads.items(multi=True)]
+                except HTTPException:
+                    pass
+                self.record(self.entry(
+                    g.traffic_started, request.method, request.path,
+                    request.url_rule.rule if request.url_rule else None,
+                    request.query_string.decode('latin-1'), request.headers, request.content_length,
+                    json_body=json_body, form=form, files=files,
+                    status=response.status_code, response_bytes=response.content_length
+                ))
+            return response
@@ -0,0 +1,230 @@
+"""
+Replay traffic recorded by traffic_recorder.py against any instance.
+
+Requests are re-issued on their recorded schedule, compressed by --speed
+(2 replays an hour of traffic in 30 minutes), and latency is reported per
+route. Save a run against one build and compare another build against it
+to see how the real request mix behaves after a change.
+
+Uploaded files were recorded as size, type and SHA-256 only. They are
+replayed as deterministic placeholder bytes of the same size, so identical
+uploads stay identical, or as the real file when --images points at a
+directory containing files named by their SHA-256 (with or without the
+original extension).
+
+Run with:
+    python traffic_replay.py traffic.log --target http://localhost:8080 --save build-a.json
+    python traffic_replay.py traffic.log --target http://localhost:8080 --speed 4 --baseline build-a.json
+
+IDs minted by the recorded instance (receipt jobs, bulk issuance jobs) don't
+exist on the replay target, so lookups of them answer 404 there.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from benchmark import compare, print_report, summarize
+
+
+def load_entries(paths, limit=None):
+    """Read recorded entries in time order, skipping lines cut short by a crash"""
+    entries = []
+    skipped = 0
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    skipped += 1
+    entries.sort(key=lambda entry: entry["ts"])
+    if limit:
+        entries = entries[:limit]
+    return entries, skipped
+
+
+class UploadSource:
+    """Bytes to send for a recorded upload"""
+
+    def __init__(self, image_dir=None, cache_bytes=256 * 1024 * 1024):
+        self.image_dir = image_dir
+        self.cache_bytes = cache_bytes
+        self._cache = {}
+        self._cached_bytes = 0
+        self._lock = threading.Lock()
+
+    def content(self, described):
+        digest = described.get("sha256") or ''
+        size = described.get("size") or 0
+        key = (digest, size)
+        with self._lock:
+            data = self._cache.get(key)
+        if data is not None:
+            return data
+
+        data = self._from_dir(digest, described.get("ext") or '')
+        if data is None:
+            # Seeded by the digest, so uploads that were identical stay identical
+            data = random.Random(digest or size).randbytes(size)
+        with self._lock:
+            if self._cached_bytes + len(data) <= self.cache_bytes:
+                self._cache[key] = data
+                self._cached_bytes += len(data)
+        return data
+
+    def _from_dir(self, digest, ext):
+        if not self.image_dir or not digest:
+            return None
+        for name in (digest + ext, digest):
+            try:
+                with open(os.path.join(self.image_dir, name), 'rb') as f:
+                    return f.read()
+            except OSError:
+                continue
+        return None
+
+
+def build_request(entry, uploads):
+    """Turn a recorded entry back into requests.request() arguments"""
+    kwargs = {}
+    # requests sets Content-Type (and the multipart boundary) from the body itself
+    headers = {key: value for key, value in (entry.get("headers") or {}).items() if key != 'Content-Type'}
+    if headers:
+        kwargs["headers"] = headers
+    if entry.get("query"):
+        kwargs["params"] = entry["query"]
+    if "json" in entry:
+        kwargs["json"] = entry["json"]
+    elif entry.get("files"):
+        kwargs["files"] = [
+            (described["field"], (f"upload{described.get('ext') or ''}", uploads.content(described),
+                                  described.get("type") or 'application/octet-stream'))
+            for described in entry["files"]
+        ]
+        kwargs["data"] = [tuple(pair) for pair in entry.get("form") or []]
+    elif entry.get("form"):
+        kwargs["data"] = [tuple(pair) for pair in entry["form"]]
+    return kwargs
+
+
+class Replayer:
+    """Sends recorded requests on a time-scaled schedule and collects latencies per route"""
+
+    def __init__(self, target, entries, speed, concurrency, uploads, timeout):
+        self.target = target.rstrip('/')
+        self.entries = entries
+        self.speed = speed
+        self.uploads = uploads
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='replay')
+        self.samples = {}
+        self.failures = {}
+        self.status_changed = {}
+        self.late_starts = 0
+        self.max_lag = 0.0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def run(self):
+        """Replay every entry and return the wall-clock duration in seconds"""
+        first_ts = self.entries[0]["ts"]
+        started = time.perf_counter()
+        for entry in self.entries:
+            due = started + (entry["ts"] - first_ts) / self.speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            self.executor.submit(self._send, entry, due)
+        self.executor.shutdown(wait=True)
+        return time.perf_counter() - started
+
+    def _send(self, entry, due):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+
+        group = f"{entry['method']} {entry.get('route') or entry['path']}"
+        kwargs = build_request(entry, self.uploads)
+        sent = time.perf_counter()
+        failure = None
+        status = None
+        try:
+            response = session.request(entry["method"], self.target + entry["path"], timeout=self.timeout, **kwargs)
+            status = response.status_code
+            if status >= 500:
+                failure = f"http_{status}"
+        except requests.exceptions.RequestException as e:
+            failure = type(e).__name__
+        elapsed = time.perf_counter() - sent
+
+        with self._lock:
+            # Sends that start well after their slot mean --concurrency is too low for --speed
+            lag = sent - due
+            self.max_lag = max(self.max_lag, lag)
+            if lag > 0.1:
+                self.late_starts += 1
+            self.samples.setdefault(group, []).append(elapsed)
+            failures = self.failures.setdefault(group, {})
+            if failure:
+                failures[failure] = failures.get(failure, 0) + 1
+            if status is not None and entry.get("status") is not None and status != entry["status"]:
+                changes = self.status_changed.setdefault(group, {})
+                change = f"{entry['status']}->{status}"
+                changes[change] = changes.get(change, 0) + 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded Raseed traffic and compare latency between builds")
+    parser.add_argument('logs', nargs='+', help="Files written by traffic_recorder.py (TRAFFIC_RECORD_PATH)")
+    parser.add_argument('--target', required=True, help="Base URL of the instance to replay against")
+    parser.add_argument('--speed', type=float, default=1.0, help="Replay speed multiple (1 = as recorded)")
+    parser.add_argument('--concurrency', type=int, default=256, help="Maximum requests in flight")
+    parser.add_argument('--limit', type=int, help="Replay only the first N requests")
+    parser.add_argument('--images', help="Directory of real upload files named by SHA-256")
+    parser.add_argument('--timeout', type=float, default=120, help="Per-request timeout in seconds")
+    parser.add_argument('--save', help="Write results as JSON to this file")
+    parser.add_argument('--baseline', help="Compare against results saved with --save")
+    parser.add_argument('--max-regression', type=float, default=0.10,
+                        help="Allowed p95 growth / throughput drop against the baseline (fraction)")
+    args = parser.parse_args()
+
+    if args.speed <= 0:
+        parser.error("--speed must be positive")
+    entries, skipped = load_entries(args.logs, args.limit)
+    if not entries:
+        parser.error("No recorded requests found")
+    span = entries[-1]["ts"] - entries[0]["ts"]
+    print(f"Replaying {len(entries)} requests recorded over {span:.1f}s at {args.speed:g}x "
+          f"(~{span / args.speed:.1f}s) against {args.target}"
+          + (f"; skipped {skipped} unreadable lines" if skipped else ''))
+
+    replayer = Replayer(args.target, entries, args.speed, args.concurrency, UploadSource(args.images), args.timeout)
+    elapsed = replayer.run()
+    results = summarize(replayer.samples, replayer.failures, elapsed)
+    print_report(results)
+    for group, changes in sorted(replayer.status_changed.items()):
+        print(f"  {group} status changed from recording: {changes}")
+    print(f"\nSchedule: {replayer.late_starts} requests started >100 ms late (max {replayer.max_lag * 1000:.0f} ms)")
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results saved to {args.save}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+        if regressions:
+            print(f"\nRegressed beyond {args.max_regression:.0%}: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,300 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from metrics import track_upstream
+
+# Bulk loyalty card issuance settings
+WALLET_BULK_DB = os.environ.get(
+    'WALLET_BULK_DB', os.path.join(tempfile.gettempdir(), 'raseed-wallet-bulk.db')
+)
+WALLET_BULK_BATCH_SIZE = int(os.environ.get('WALLET_BULK_BATCH_SIZE', '50'))
+WALLET_BULK_CONCURRENCY = int(os.environ.get('WALLET_BULK_CONCURRENCY', '4'))
+WALLET_BULK_MAX_ATTEMPTS = int(os.environ.get('WALLET_BULK_MAX_ATTEMPTS', '5'))
+WALLET_BULK_MAX_MEMBERS = int(os.environ.get('WALLET_BULK_MAX_MEMBERS', '100000'))
+
+# Statuses worth retrying in a later batch (quota exhaustion and server errors)
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS bulk_jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS bulk_members (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    email TEXT NOT NULL,
+    name TEXT NOT NULL,
+    points INTEGER NOT NULL,
+    object_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    PRIMARY KEY (job_id, idx)
+);
+CREATE INDEX IF NOT EXISTS bulk_members_pending ON bulk_members (job_id, status, idx);
+"""
+
+
+class BulkCardIssuer:
+    def __init__(self, wallet_service, db_path=WALLET_BULK_DB, batch_size=WALLET_BULK_BATCH_SIZE,
+                 concurrency=WALLET_BULK_CONCURRENCY, max_attempts=WALLET_BULK_MAX_ATTEMPTS):
+        self.wallet_service = wallet_service
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+
+        self._local = threading.local()
+        self._running = set()
+        self._running_lock = threading.Lock()
+
+        self._db().executescript(_SCHEMA)
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def submit(self, members):
+        """Record a bulk issuance job and start issuing cards in the background"""
+        if not self.wallet_service.service:
+            return {"error": "Wallet service not available"}
+        if not isinstance(members, list):
+            return {"error": "members must be a list"}
+        if not members:
+            return {"error": "At least one member is required"}
+        if len(members) > WALLET_BULK_MAX_MEMBERS:
+            return {"error": f"Too many members in one job (maximum is {WALLET_BULK_MAX_MEMBERS})"}
+
+        rows = []
+        job_id = uuid.uuid4().hex
+        config = self.wallet_service.config
+        class_id = f"{config.ISSUER_ID}.{config.CLASS_ID}"
+        for idx, member in enumerate(members):
+            if not isinstance(member, dict):
+                return {"error": f"Member {idx} must be an object"}
+            email = member.get('email')
+            if not email or not isinstance(email, str):
+                return {"error": f"Member {idx} is missing an email"}
+            name = member.get('name', 'User')
+            if not isinstance(name, str):
+                return {"error": f"Member {idx} has a name that isn't a string"}
+            try:
+                points = int(member.get('points', 0))
+            except (TypeError, ValueError):
+                return {"error": f"Member {idx} has non-integer points"}
+            # The same ID /wallet/create-card uses: re-sending a batch after a crash is idempotent,
+            # and a member who already has a card isn't issued a second one
+            card = self.wallet_service.card_index.get(email, class_id)
+            object_id = card["object_id"] if card else self.wallet_service.card_object_id(email)
+            rows.append((job_id, idx, email, name, points, object_id))
+
+        now = time.time()
+        db = self._db()
+        with db:
+            db.execute(
+                "INSERT INTO bulk_jobs (id, status, total, created_at, updated_at) VALUES (?, 'queued', ?, ?, ?)",
+                (job_id, len(rows), now, now)
+            )
+            db.executemany(
+                "INSERT INTO bulk_members (job_id, idx, email, name, points, object_id, status) "
+                "VALUES (?, ?, ?, ?, ?, ?, 'pending')",
+                rows
+            )
+
+        self.resume(job_id)
+        return {"success": True, "job_id": job_id, "total": len(rows)}
+
+    def resume(self, job_id):
+        """Continue issuing the pending cards of a job, e.g. after a crash or restart"""
+        job = self._db().execute("SELECT status FROM bulk_jobs WHERE id = ?", (job_id,)).fetchone()
+        if job is None:
+            return {"error": "Job not found"}
+
+        with self._running_lock:
+            if job_id in self._running:
+                return {"success": True, "job_id": job_id, "status": "running"}
+            self._running.add(job_id)
+
+        threading.Thread(target=self._run, args=(job_id,), name=f"wallet-bulk-{job_id[:8]}", daemon=True).start()
+        return {"success": True, "job_id": job_id, "status": "running"}
+
+    def status(self, job_id, offset=0, limit=100):
+        """Return job progress plus a page of per-member results"""
+        db = self._db()
+        job = db.execute(
+            "SELECT id, status, total, created_at, updated_at FROM bulk_jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if job is None:
+            return None
+
+        counts = dict(db.execute(
+            "SELECT status, COUNT(*) FROM bulk_members WHERE job_id = ? GROUP BY status", (job_id,)
+        ).fetchall())
+        members = db.execute(
+            "SELECT idx, email, object_id, status, attempts, error FROM bulk_members "
+            "WHERE job_id = ? ORDER BY idx LIMIT ? OFFSET ?",
+            (job_id, limit, offset)
+        ).fetchall()
+
+        with self._running_lock:
+            running_here = job_id in self._running
+
+        return {
+            "job_id": job[0],
+            "status": job[1],
+            "running": running_here,
+            "total": job[2],
+            "created_at": job[3],
+            "updated_at": job[4],
+            "counts": {
+                "pending": counts.get('pending', 0),
+                "issued": counts.get('issued', 0),
+                "failed": counts.get('failed', 0)
+            },
+            "members": [
+                {
+                    "index": idx,
+                    "email": email,
+                    "object_id": object_id,
+                    "status": member_status,
+                    "attempts": attempts,
+                    "error": error,
+                    "save_url": f"https://pay.google.com/gp/v/save/{object_id}" if member_status == 'issued' else None
+                }
+                for idx, email, object_id, member_status, attempts, error in members
+            ]
+        }
+
+    def _run(self, job_id):
+        try:
+            self._set_job_status(job_id, 'running')
+            executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='wallet-bulk-batch')
+            with executor:
+                round_number = 0
+                while True:
+                    pending = self._db().execute(
+                        "SELECT idx, email, name, points, object_id FROM bulk_members "
+                        "WHERE job_id = ? AND status = 'pending' ORDER BY idx",
+                        (job_id,)
+                    ).fetchall()
+                    if not pending:
+                        break
+
+                    if round_number:
+                        # Back off before retrying members that hit quota or server errors
+                        time.sleep(min(2 ** round_number, 60))
+                    round_number += 1
+
+                    batches = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+                    list(executor.map(lambda batch: self._send_batch(job_id, batch), batches))
+
+            self._set_job_status(job_id, 'completed')
+        except Exception as e:
+            print(f"Bulk issuance job {job_id} interrupted: {e}")
+            self._set_job_status(job_id, 'interrupted')
+        finally:
+            with self._running_lock:
+                self._running.discard(job_id)
+
+    def _send_batch(self, job_id, members):
+        from googleapiclient.errors import HttpError
+
+        outcomes = {}
+
+        def on_response(request_id, response, exception):
+            outcomes[int(request_id)] = exception
+
+        service = self.wallet_service.service
+        batch = service.new_batch_http_request(callback=on_response)
+        for idx, email, name, points, object_id in members:
+            loyalty_object = self.wallet_service.build_loyalty_object(email, name, points, object_id=object_id)
+            batch.add(service.loyaltyobject().insert(body=loyalty_object), request_id=str(idx))
+
+        try:
+            with track_upstream('wallet', 'batch_object_insert') as call:
+                batch.execute(http=self._http())
+        except Exception as e:
+            # The whole batch failed to send; every member gets another attempt
+            self._record(job_id, [(idx, 'retry', str(e)) for idx, *_ in members])
+            return
+
+        results = []
+        issued = []
+        for idx, email, name, points, object_id in members:
+            exception = outcomes.get(idx)
+            if exception is not None:
+                call.failed(exception)
+            if exception is None or (isinstance(exception, HttpError) and exception.status_code == 409):
+                # A conflict means the card exists already, from an interrupted attempt or /wallet/create-card
+                results.append((idx, 'issued', None))
+                issued.append((email, name, object_id))
+            elif isinstance(exception, HttpError) and exception.status_code in RETRYABLE_STATUSES:
+                results.append((idx, 'retry', str(exception)))
+            else:
+                results.append((idx, 'failed', str(exception)))
+        self._record(job_id, results)
+        self._index_cards(issued)
+
+    def _record(self, job_id, results):
+        db = self._db()
+        with db:
+            for idx, outcome, error in results:
+                if outcome == 'retry':
+                    db.execute(
+                        "UPDATE bulk_members SET attempts = attempts + 1, error = ?, "
+                        "status = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END "
+                        "WHERE job_id = ? AND idx = ?",
+                        (error, self.max_attempts, job_id, idx)
+                    )
+                else:
+                    db.execute(
+                        "UPDATE bulk_members SET attempts = attempts + 1, status = ?, error = ? "
+                        "WHERE job_id = ? AND idx = ?",
+                        (outcome, error, job_id, idx)
+                    )
+            db.execute("UPDATE bulk_jobs SET updated_at = ? WHERE id = ?", (time.time(), job_id))
+
+    def _index_cards(self, issued):
+        # Later /wallet/create-card calls for these members return the bulk-issued card
+        config = self.wallet_service.config
+        class_id = f"{config.ISSUER_ID}.{config.CLASS_ID}"
+        for email, name, object_id in issued:
+            self.wallet_service.card_index.put(
+                email, class_id, object_id, f"https://pay.google.com/gp/v/save/{object_id}", name, 'api'
+            )
+
+    def _set_job_status(self, job_id, status):
+        db = self._db()
+        with db:
+            db.execute("UPDATE bulk_jobs SET status = ?, updated_at = ? WHERE id = ?", (status, time.time(), job_id))
+
+    def _after_fork(self):
+        # Forked workers get their own SQLite connections; the parent's job threads aren't running here
+        self._local = threading.local()
+        self._running = set()
+        self._running_lock = threading.Lock()
+
+    def _http(self):
+        # httplib2 is not thread-safe, so each batch thread gets its own authorized transport
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            import google_auth_httplib2
+            import httplib2
+
+            http = google_auth_httplib2.AuthorizedHttp(self.wallet_service.credentials, http=httplib2.Http())
+            self._local.http = http
+        return http
+
+    def _db(self):
+        # SQLite connections can't be shared across threads; keep one per thread
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.db_path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+        return db
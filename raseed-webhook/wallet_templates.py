@@ -0,0 +1,108 @@
+import json
+import os
+from string import Template
+
+# Directory holding loyalty_class.json and loyalty_object.json
+WALLET_TEMPLATE_DIR = os.environ.get(
+    'WALLET_TEMPLATE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+)
+
+# Placeholders each template may use, and the fields the Wallet API requires
+TEMPLATE_FIELDS = {
+    'loyalty_class': {
+        'placeholders': {'class_id', 'class_name', 'issuer_name', 'program_name'},
+        'required': ('id', 'issuerName', 'programName', 'reviewStatus')
+    },
+    'loyalty_object': {
+        'placeholders': {'object_id', 'class_id', 'email', 'name', 'points'},
+        'required': ('id', 'classId', 'state')
+    }
+}
+
+
+class WalletTemplate:
+    """
+    A Wallet resource template compiled once into a builder. Parts without
+    placeholders are built at load time and shared between renders, so
+    rendered resources must be treated as read-only.
+    """
+
+    def __init__(self, name, document, placeholders, required):
+        if not isinstance(document, dict):
+            raise ValueError(f"Wallet template '{name}' must be a JSON object")
+        missing = [field for field in required if field not in document]
+        if missing:
+            raise ValueError(f"Wallet template '{name}' is missing required fields: {', '.join(missing)}")
+
+        self.name = name
+        self.placeholders = set()
+        self._build, _ = self._compile(document)
+
+        unknown = self.placeholders - placeholders
+        if unknown:
+            raise ValueError(f"Wallet template '{name}' uses unknown placeholders: {', '.join(sorted(unknown))}")
+
+    def render(self, **values):
+        """Fill the template's placeholders with the given values"""
+        missing = self.placeholders - values.keys()
+        if missing:
+            raise KeyError(f"Missing values for wallet template '{self.name}': {', '.join(sorted(missing))}")
+        return self._build({key: str(value) for key, value in values.items()})
+
+    def _compile(self, node):
+        # Returns (builder, is_static)
+        if isinstance(node, dict):
+            children = {key: self._compile(value) for key, value in node.items()}
+            if all(is_static for _, is_static in children.values()):
+                static = {key: build(None) for key, (build, _) in children.items()}
+                return (lambda values: static), True
+            builders = [(key, build) for key, (build, _) in children.items()]
+            return (lambda values: {key: build(values) for key, build in builders}), False
+
+        if isinstance(node, list):
+            children = [self._compile(value) for value in node]
+            if all(is_static for _, is_static in children):
+                static = [build(None) for build, _ in children]
+                return (lambda values: static), True
+            builders = [build for build, _ in children]
+            return (lambda values: [build(values) for build in builders]), False
+
+        if isinstance(node, str):
+            names = self._placeholders_in(node)
+            if not names:
+                # Still unescape $$, as strings with placeholders do
+                text = Template(node).substitute({}) if '$' in node else node
+                return (lambda values: text), True
+            self.placeholders.update(names)
+            if len(names) == 1 and node in (f"${names[0]}", f"${{{names[0]}}}"):
+                # The whole string is one placeholder; skip the Template machinery
+                name = names[0]
+                return (lambda values: values[name]), False
+            template = Template(node)
+            return (lambda values: template.substitute(values)), False
+
+        return (lambda values: node), True
+
+    def _placeholders_in(self, text):
+        names = []
+        for match in Template.pattern.finditer(text):
+            if match.group('invalid') is not None:
+                raise ValueError(f"Wallet template '{self.name}' has an invalid placeholder in: {text}")
+            name = match.group('named') or match.group('braced')
+            if name:
+                names.append(name)
+        return names
+
+
+def load_templates(template_dir=WALLET_TEMPLATE_DIR):
+    """Load and validate every Wallet template; raises ValueError if any is unusable"""
+    templates = {}
+    for name, fields in TEMPLATE_FIELDS.items():
+        path = os.path.join(template_dir, f"{name}.json")
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                document = json.load(f)
+        except (OSError, ValueError) as e:
+            raise ValueError(f"Could not load wallet template {path}: {e}")
+        templates[name] = WalletTemplate(name, document, fields['placeholders'], fields['required'])
+    return templates